@@ -0,0 +1,271 @@
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from agents.sqlite_connections import ThreadLocalConnections
+
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+# Mersenne prime used for the MinHash permutations (a * h + b) mod p
+_MINHASH_PRIME = (1 << 61) - 1
+
+
+def normalize_text(text: str) -> str:
+    """
+    Lowercases, strips punctuation and collapses whitespace, so trivially different tickets share a key.
+    """
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", text.lower())).strip()
+
+
+def _stable_hash(value: str) -> int:
+    # Python's hash() is salted per process; cache keys must be stable across workers
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class MinHasher:
+    """
+    MinHash signatures over word bigrams, with banded LSH keys for near-duplicate lookup.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self._perms = [
+            (_stable_hash(f"a{seed}:{i}") % (_MINHASH_PRIME - 1) + 1, _stable_hash(f"b{seed}:{i}") % _MINHASH_PRIME)
+            for i in range(num_perm)
+        ]
+
+    def shingles(self, normalized: str) -> set:
+        words = normalized.split()
+        if len(words) < 2:
+            return set(words)
+        return {f"{a} {b}" for a, b in zip(words, words[1:])}
+
+    def signature(self, normalized: str) -> tuple:
+        hashes = [_stable_hash(s) for s in self.shingles(normalized)] or [0]
+        return tuple(
+            min((a * h + b) % _MINHASH_PRIME for h in hashes)
+            for a, b in self._perms
+        )
+
+    def band_keys(self, signature: tuple) -> list:
+        keys = []
+        for band in range(self.bands):
+            rows = signature[band * self.rows:(band + 1) * self.rows]
+            keys.append(f"{band}:{_stable_hash(','.join(map(str, rows))):x}")
+        return keys
+
+    @staticmethod
+    def similarity(sig_a, sig_b) -> float:
+        return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+
+class InMemoryCacheBackend:
+    """
+    Process-local LRU cache with per-entry TTL and an LSH bucket index.
+    """
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry["expires_at"] < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, value, expires_at, signature=None, band_keys=()):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {"value": value, "expires_at": expires_at, "signature": signature, "band_keys": list(band_keys)}
+            for band_key in band_keys:
+                self._buckets.setdefault(band_key, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def candidates(self, band_keys):
+        with self._lock:
+            keys = set()
+            for band_key in band_keys:
+                keys |= self._buckets.get(band_key, set())
+            return keys
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        for band_key in entry["band_keys"]:
+            bucket = self._buckets.get(band_key)
+            if bucket:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """
+    Cache stored in a local SQLite file, so several worker processes on one
+    host can share entries. A local stand-in for a shared store such as Redis.
+    """
+
+    def __init__(self, path: str, max_entries: int = 100000):
+        self.path = path
+        self.max_entries = max_entries
+        self._connections = ThreadLocalConnections(path)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_entries (
+                    key TEXT PRIMARY KEY, value TEXT, expires_at REAL, last_access REAL, signature TEXT
+                )
+            """)
+            conn.execute("CREATE TABLE IF NOT EXISTS cache_buckets (band_key TEXT, key TEXT)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_buckets ON cache_buckets (band_key)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_access ON cache_entries (last_access)")
+
+    def _connect(self):
+        return self._connections.connect()
+
+    def get(self, key):
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT value, expires_at, signature FROM cache_entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] < time.time():
+            self._delete(conn, key)
+            return None
+        conn.execute("UPDATE cache_entries SET last_access = ? WHERE key = ?", (time.time(), key))
+        return {"value": json.loads(row[0]), "expires_at": row[1], "signature": json.loads(row[2]) if row[2] else None}
+
+    def put(self, key, value, expires_at, signature=None, band_keys=()):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._delete(conn, key)
+            conn.execute(
+                "INSERT INTO cache_entries VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, time.time(), json.dumps(signature) if signature else None)
+            )
+            conn.executemany("INSERT INTO cache_buckets VALUES (?, ?)", [(band_key, key) for band_key in band_keys])
+            overflow = conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                for (old_key,) in conn.execute(
+                    "SELECT key FROM cache_entries ORDER BY last_access LIMIT ?", (overflow,)
+                ).fetchall():
+                    self._delete(conn, old_key)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def candidates(self, band_keys):
+        band_keys = list(band_keys)
+        if not band_keys:
+            return set()
+        placeholders = ",".join("?" * len(band_keys))
+        rows = self._connect().execute(
+            f"SELECT DISTINCT key FROM cache_buckets WHERE band_key IN ({placeholders})", band_keys
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def _delete(self, conn, key):
+        conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+        conn.execute("DELETE FROM cache_buckets WHERE key = ?", (key,))
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+
+
+class ClassificationCache:
+    """
+    Response cache in front of the classifier, keyed by normalized ticket text.
+
+    Exact lookups hash the normalized text. With `near_duplicates` enabled,
+    misses fall back to a MinHash LSH search and reuse an entry whose
+    estimated Jaccard similarity is at least `similarity_threshold`. Every key
+    includes `version`, so changing the agent version or prompt invalidates
+    old entries.
+    """
+
+    def __init__(self, version: str, backend=None, ttl_seconds: float = 3600,
+                 near_duplicates: bool = False, similarity_threshold: float = 0.8, minhasher=None):
+        self.version = version
+        self.backend = backend if backend is not None else InMemoryCacheBackend()
+        self.ttl_seconds = ttl_seconds
+        self.near_duplicates = near_duplicates
+        self.similarity_threshold = similarity_threshold
+        self.minhasher = minhasher or MinHasher()
+        self.stats = {"exact_hits": 0, "near_hits": 0, "misses": 0, "stores": 0}
+        self._stats_lock = threading.Lock()
+
+    @staticmethod
+    def make_version(*parts) -> str:
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()[:16]
+
+    def _key(self, normalized):
+        return f"{self.version}:{hashlib.sha256(normalized.encode('utf-8')).hexdigest()}"
+
+    def _band_keys(self, signature):
+        return [f"{self.version}:{band_key}" for band_key in self.minhasher.band_keys(signature)]
+
+    def get(self, text: str):
+        """
+        Returns (result, hit_type) where hit_type is "exact", "near" or None on a miss.
+        """
+        normalized = normalize_text(text)
+        entry = self.backend.get(self._key(normalized))
+        if entry is not None:
+            self._count("exact_hits")
+            return dict(entry["value"]), "exact"
+
+        if self.near_duplicates:
+            signature = self.minhasher.signature(normalized)
+            best, best_score = None, self.similarity_threshold
+            for key in self.backend.candidates(self._band_keys(signature)):
+                candidate = self.backend.get(key)
+                if candidate is None or not candidate["signature"]:
+                    continue
+                score = MinHasher.similarity(signature, candidate["signature"])
+                if score >= best_score:
+                    best, best_score = candidate, score
+            if best is not None:
+                self._count("near_hits")
+                return dict(best["value"]), "near"
+
+        self._count("misses")
+        return None, None
+
+    def put(self, text: str, result: dict):
+        normalized = normalize_text(text)
+        signature, band_keys = None, ()
+        if self.near_duplicates:
+            signature = self.minhasher.signature(normalized)
+            band_keys = self._band_keys(signature)
+        self.backend.put(self._key(normalized), result, time.time() + self.ttl_seconds, signature, band_keys)
+        self._count("stores")
+
+    def hit_rate(self) -> float:
+        hits = self.stats["exact_hits"] + self.stats["near_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
@@ -0,0 +1,150 @@
+import time
+import threading
+
+
+class CandidateCache:
+    """
+    In-memory, per-category copy of knowledge_base, pre-sorted by success_rate.
+
+    `load_all()` returns every row; `load_changed(since)` returns rows whose
+    last_updated is newer than `since`. Refreshes merge changed rows and only
+    re-sort the categories they touch, swapping in the new tables in one
+    assignment so readers never see a partial update. Incremental refreshes
+    cannot see deletions, so every `full_reload_every`-th refresh (and any
+    explicit `invalidate()`) reloads the whole table.
+    """
+
+    def __init__(self, load_all, load_changed, refresh_interval_seconds=300, full_reload_every=12,
+                 background_refresh=True):
+        self._load_all = load_all
+        self._load_changed = load_changed
+        self.refresh_interval_seconds = refresh_interval_seconds
+        self.full_reload_every = full_reload_every
+        self.background_refresh = background_refresh
+        self._rows_by_id = None
+        self._by_category = {}
+        self._high_water_mark = None
+        self._loaded_at = None
+        self._refreshes_since_full = 0
+        self._lock = threading.Lock()
+        self._refresh_signal = threading.Event()
+        self._full_reload_requested = False
+        self._refresh_thread = None
+        self.stats = {"hits": 0, "misses": 0, "full_loads": 0, "incremental_refreshes": 0, "rows_changed": 0}
+
+    @property
+    def loaded(self) -> bool:
+        return self._rows_by_id is not None
+
+    def get(self, category, limit) -> list:
+        """
+        Returns copies of the top `limit` candidates for `category`, loading the cache if needed.
+        """
+        if self._stale():
+            self.stats["misses"] += 1
+            with self._lock:
+                if self._stale():
+                    self._refresh()
+        else:
+            self.stats["hits"] += 1
+        if self.background_refresh and self._refresh_thread is None:
+            self._start_refresh_thread()
+        # Callers get their own dicts so they can't mutate the shared rows
+        return [dict(row) for row in self._by_category.get(category, ())[:limit]]
+
+    def warm(self) -> int:
+        with self._lock:
+            self._full_load()
+        if self.background_refresh and self._refresh_thread is None:
+            self._start_refresh_thread()
+        return len(self._rows_by_id)
+
+    def invalidate(self):
+        """
+        Forces a full reload: immediately via the refresh thread, or on the next `get`.
+        """
+        self._full_reload_requested = True
+        if self._refresh_thread and self._refresh_thread.is_alive():
+            self._refresh_signal.set()
+        else:
+            self._loaded_at = None
+
+    def _stale(self):
+        if self._loaded_at is None:
+            return True
+        # With background refresh enabled the refresh thread owns reloading
+        if self.background_refresh:
+            return False
+        return time.monotonic() - self._loaded_at > self.refresh_interval_seconds
+
+    def _refresh(self):
+        needs_full = (
+            self._rows_by_id is None
+            or self._full_reload_requested
+            or self._refreshes_since_full >= self.full_reload_every
+        )
+        if needs_full:
+            self._full_load()
+        else:
+            self._incremental_load()
+
+    def _full_load(self):
+        self._full_reload_requested = False
+        rows = self._load_all()
+        rows_by_id = {row["solution_id"]: row for row in rows}
+        self._swap(rows_by_id, {row.get("category") for row in rows}, rebuild_all=True)
+        self._refreshes_since_full = 0
+        self.stats["full_loads"] += 1
+
+    def _incremental_load(self):
+        changed = self._load_changed(self._high_water_mark) if self._high_water_mark is not None else []
+        rows_by_id = dict(self._rows_by_id)
+        touched = set()
+        for row in changed:
+            previous = rows_by_id.get(row["solution_id"])
+            if previous is not None:
+                # A row can move between categories
+                touched.add(previous.get("category"))
+            rows_by_id[row["solution_id"]] = row
+            touched.add(row.get("category"))
+        self._swap(rows_by_id, touched, rebuild_all=False)
+        self._refreshes_since_full += 1
+        self.stats["incremental_refreshes"] += 1
+        self.stats["rows_changed"] += len(changed)
+
+    def _swap(self, rows_by_id, touched, rebuild_all):
+        by_category = {} if rebuild_all else dict(self._by_category)
+        for category in touched:
+            rows = [row for row in rows_by_id.values() if row.get("category") == category]
+            # Same order as the old ORDER BY success_rate DESC query; ties broken by id for stability
+            rows.sort(key=lambda row: (-(row.get("success_rate") or 0), row["solution_id"]))
+            if rows:
+                by_category[category] = rows
+            else:
+                by_category.pop(category, None)
+        stamps = [row["last_updated"] for row in rows_by_id.values() if row.get("last_updated") is not None]
+        self._high_water_mark = max(stamps) if stamps else self._high_water_mark
+        self._rows_by_id = rows_by_id
+        self._by_category = by_category
+        self._loaded_at = time.monotonic()
+
+    def _start_refresh_thread(self):
+        with self._lock:
+            if self._refresh_thread is not None:
+                return
+            self._refresh_thread = threading.Thread(
+                target=self._refresh_loop, name="knowledge-base-refresh", daemon=True
+            )
+            self._refresh_thread.start()
+
+    def _refresh_loop(self):
+        while True:
+            # Wakes up on the refresh interval or when invalidate() is called
+            self._refresh_signal.wait(self.refresh_interval_seconds)
+            self._refresh_signal.clear()
+            try:
+                with self._lock:
+                    self._refresh()
+            except Exception as e:
+                # Keep serving the last good copy until the next attempt
+                print(f"Error refreshing knowledge base candidates: {e}")
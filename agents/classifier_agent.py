@@ -3,41 +3,22 @@ import sys
 import json
 import uuid
 import time
-from datetime import datetime, timezone
-import google.generativeai as genai
-from google.cloud import bigquery
+from agents.resources import SharedResources
+from agents.concurrency import get_default_limits
+from agents.telemetry import TelemetrySink
+from agents.instrumentation import Tracer, current_span
+from agents.cache import ClassificationCache, normalize_text
+from agents.single_flight import SingleFlight
+from agents.fast_path import RuleBasedClassifier
+from agents.resilience import ResilientModel, get_default_resilience
+from agents.structured_output import (
+    StructuredOutput, StructuredOutputError, extract_json, response_text, response_tokens, validate
+)
 
-class TicketClassifierAgent:
-    def __init__(self, project_id, api_key=None, credentials=None):
-        self.project_id = project_id
-        if not api_key:
-            # Try to get from environment or handle appropriately
-            api_key = os.environ.get("GOOGLE_GENAI_API_KEY")
-        
-        if api_key:
-            genai.configure(api_key=api_key)
-        
-        self.model = genai.GenerativeModel("gemini-2.0-flash")
-
-        if credentials:
-            self.bq_client = bigquery.Client(project=project_id, credentials=credentials)
-        else:
-            self.bq_client = bigquery.Client(project=project_id)
-        self.dataset_id = "support_tickets_staging"
-        self.agent_version = "v1.0.0"
+CATEGORIES = ["billing", "technical", "account", "feature_request"]
+PRIORITIES = ["low", "medium", "high", "critical"]
 
-    def classify(self, ticket_description: str, ticket_id: str = None) -> dict:
-        """
-        Classifies a support ticket into category and priority using Gemini.
-        """
-        if not ticket_id:
-            ticket_id = str(uuid.uuid4())
-            
-        start_time = time.time()
-        
-        prompt = f"""
-        Classify the following support ticket description into:
-        - category: one of [billing, technical, account, feature_request]
+CLASSIFICATION_RULES = """        - category: one of [billing, technical, account, feature_request]
         - priority: one of [low, medium, high, critical]
         - reasoning: brief explanation
 
@@ -52,55 +33,336 @@ class TicketClassifierAgent:
         - high: major feature broken, multiple users affected
         - medium: single user issue, workaround available
         - low: cosmetic, enhancement, question
+"""
+
+CLASSIFICATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "category": {"type": "string", "format": "enum", "enum": CATEGORIES},
+        "priority": {"type": "string", "format": "enum", "enum": PRIORITIES},
+        "reasoning": {"type": "string"},
+    },
+    "required": ["category", "priority"],
+}
+
+# Streaming classification returns once these are complete; Gemini emits
+# properties alphabetically, so reasoning is generated last and never awaited
+STREAMED_FIELDS = ("category", "priority")
+
+BATCH_CLASSIFICATION_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": dict(CLASSIFICATION_SCHEMA["properties"], id={"type": "string"}),
+        "required": ["id", "category", "priority"],
+    },
+}
+
+# Rough token estimate (~4 characters per token) used for batch sizing
+CHARS_PER_TOKEN = 4
+BATCH_PROMPT_OVERHEAD_TOKENS = 250
+BATCH_TICKET_OVERHEAD_TOKENS = 40
+
+class TicketClassifierAgent:
+    def __init__(self, project_id, api_key=None, credentials=None, limits=None, tracer=None, cache=None,
+                 resources=None, fast_path=None, resilience=None, stream=False):
+        self.project_id = project_id
+        # Clients are created lazily and can be shared with the other agents
+        self.resources = resources or SharedResources(project_id, api_key=api_key, credentials=credentials)
+        self.model_name = self.resources.model_name
+        self.dataset_id = "support_tickets_staging"
+        self.agent_version = "v1.0.0"
+        self.limits = limits or get_default_limits()
+        self.resilience = resilience or get_default_resilience()
+        self.tracer = tracer or Tracer(
+            TelemetrySink(lambda: self.bq_client, f"{project_id}.{self.dataset_id}.agent_telemetry"),
+            agent_version=self.agent_version
+        )
+        self.cache = cache
+        self.output = StructuredOutput(CLASSIFICATION_SCHEMA)
+        # Optional RuleBasedClassifier consulted before the cache and Gemini
+        self.fast_path = fast_path
+        self._fallback_rules = None
+        # Stream the response and stop reading once category and priority are in (reasoning is left empty)
+        self.stream = stream
+        # Identical tickets arriving together (e.g. during an outage) share one Gemini call
+        self.inflight = SingleFlight("classifier")
+
+    @property
+    def model(self):
+        return self.resources.model
+
+    @property
+    def resilient_model(self):
+        # Deadlines, retries and the Gemini circuit breaker wrap every model call
+        return ResilientModel(self.model, self.resilience.gemini)
+
+    @property
+    def bq_client(self):
+        return self.resources.bq_client
+
+    def classify(self, ticket_description: str, ticket_id: str = None) -> dict:
+        """
+        Classifies a support ticket into category and priority using Gemini.
+
+        Unambiguous tickets are answered by the rule-based fast path when one is
+        configured. The result's `classification_path` is "rules", "cache", "llm"
+        or "fallback".
+        """
+        if not ticket_id:
+            ticket_id = str(uuid.uuid4())
+            
+        with self.tracer.span("classifier", ticket_id) as span:
+            ruled = self._fast_path_lookup(ticket_description)
+            if ruled is not None:
+                return ruled
+            cached = self._cache_lookup(ticket_description)
+            if cached is not None:
+                return cached
+            try:
+                flight = self.inflight.join(normalize_text(ticket_description))
+                result = flight.run(self._classify_with_model, ticket_description)
+                return dict(result, classification_path="llm")
+            except StructuredOutputError as e:
+                print(f"Unusable classification response after repair: {'; '.join(e.errors)}")
+                span.status = "error"
+                return self._fallback(ticket_description)
+            except Exception as e:
+                print(f"Error in classification: {e}")
+                span.status = "error"
+                return self._fallback(ticket_description)
+
+    async def aclassify(self, ticket_description: str, ticket_id: str = None) -> dict:
+        """
+        Async variant of `classify` that never blocks the event loop.
+        """
+        if not ticket_id:
+            ticket_id = str(uuid.uuid4())
+
+        with self.tracer.span("classifier", ticket_id) as span:
+            ruled = self._fast_path_lookup(ticket_description)
+            if ruled is not None:
+                return ruled
+            cached = self._cache_lookup(ticket_description)
+            if cached is not None:
+                return cached
+            try:
+                flight = self.inflight.ajoin(normalize_text(ticket_description))
+                result = await flight.arun(self._aclassify_with_model, ticket_description)
+                return dict(result, classification_path="llm")
+            except StructuredOutputError as e:
+                print(f"Unusable classification response after repair: {'; '.join(e.errors)}")
+                span.status = "error"
+                return self._fallback(ticket_description)
+            except Exception as e:
+                print(f"Error in classification: {e}")
+                span.status = "error"
+                return self._fallback(ticket_description)
 
+    def _classify_with_model(self, ticket_description):
+        """
+        The Gemini call shared by coalesced requests. Tokens are charged to the
+        leader's span only, since the others did not spend any.
+        """
+        span = current_span()
+        prompt = self._build_prompt(ticket_description)
+        try:
+            if self.stream:
+                value, token_count, _ = self.output.stream(self.resilient_model, prompt, STREAMED_FIELDS)
+            else:
+                value, token_count = self.output.generate(self.resilient_model, prompt)
+        except StructuredOutputError as e:
+            span.add_tokens(e.token_count)
+            raise
+        span.add_tokens(token_count)
+        result = self._to_classification(value)
+        self._cache_store(ticket_description, result)
+        return result
+
+    async def _aclassify_with_model(self, ticket_description):
+        span = current_span()
+        prompt = self._build_prompt(ticket_description)
+        try:
+            if self.stream:
+                value, token_count, _ = await self.output.astream(
+                    self.limits.call_gemini, self.resilient_model, prompt, STREAMED_FIELDS
+                )
+            else:
+                value, token_count = await self.output.agenerate(self.limits.call_gemini, self.resilient_model, prompt)
+        except StructuredOutputError as e:
+            span.add_tokens(e.token_count)
+            raise
+        span.add_tokens(token_count)
+        result = self._to_classification(value)
+        self._cache_store(ticket_description, result)
+        return result
+
+    @property
+    def cache_version(self) -> str:
+        """
+        Cache namespace; changes whenever the agent version, model or prompt text changes.
+
+        Streamed results stop before `reasoning` is generated, so they get their
+        own namespace and never reach callers expecting the full response.
+        """
+        parts = [self.agent_version, self.model_name, self._build_prompt("{ticket}")]
+        if self.stream:
+            parts.append("stream:" + ",".join(STREAMED_FIELDS))
+        return ClassificationCache.make_version(*parts)
+
+    def build_cache(self, **kwargs) -> ClassificationCache:
+        return ClassificationCache(self.cache_version, **kwargs)
+
+    def _cache_lookup(self, ticket_description):
+        if self.cache is None:
+            return None
+        try:
+            result, hit_type = self.cache.get(ticket_description)
+        except Exception as e:
+            # A broken cache backend must never fail classification
+            print(f"Classification cache lookup failed: {e}")
+            return None
+        current_span().cache_hit = hit_type is not None
+        return dict(result, classification_path="cache") if result is not None else None
+
+    def _fast_path_lookup(self, ticket_description):
+        if self.fast_path is None:
+            return None
+        result = self.fast_path.classify(ticket_description)
+        return dict(result, classification_path="rules") if result is not None else None
+
+    def _cache_store(self, ticket_description, result):
+        if self.cache is None:
+            return
+        try:
+            self.cache.put(ticket_description, result)
+        except Exception as e:
+            print(f"Classification cache store failed: {e}")
+
+    def _build_prompt(self, ticket_description):
+        return f"""
+        Classify the following support ticket description into:
+{CLASSIFICATION_RULES}
         Return ONLY a JSON object.
 
         Ticket Description: {ticket_description}
         """
 
+    def _to_classification(self, value):
+        return {
+            "category": value["category"],
+            "priority": value["priority"],
+            "reasoning": value.get("reasoning", ""),
+        }
+
+    def _fallback(self, ticket_description=None):
+        # Prefer a local best-effort rule match over a fixed answer
+        if ticket_description:
+            if self._fallback_rules is None:
+                self._fallback_rules = self.fast_path or RuleBasedClassifier()
+            guess = self._fallback_rules.best_guess(ticket_description)
+            if guess is not None:
+                return dict(guess, classification_path="fallback")
+        return {
+            "category": "technical",
+            "priority": "medium",
+            "reasoning": "Fallback due to error in classification.",
+            "classification_path": "fallback"
+        }
+
+    def classify_batch(self, ticket_descriptions: list, ticket_ids: list = None,
+                       max_batch_tokens: int = 8000) -> list:
+        """
+        Classifies many tickets with one Gemini call per token-budgeted sub-batch.
+
+        Results are returned in input order. A sub-batch whose response cannot
+        be parsed, or is missing tickets, is bisected and retried; a single
+        ticket that still fails goes through `classify`.
+        """
+        if not ticket_ids:
+            ticket_ids = [str(uuid.uuid4()) for _ in ticket_descriptions]
+        if len(ticket_ids) != len(ticket_descriptions):
+            raise ValueError("ticket_ids must be the same length as ticket_descriptions")
+
+        results = [None] * len(ticket_descriptions)
+        pending = []
+        for i, description in enumerate(ticket_descriptions):
+            results[i] = self._fast_path_lookup(description) or self._cache_lookup(description)
+            if results[i] is None:
+                pending.append(i)
+        for batch in self._split_by_token_budget(pending, ticket_descriptions, max_batch_tokens):
+            self._classify_sub_batch(batch, ticket_descriptions, ticket_ids, results)
+        return results
+
+    def _split_by_token_budget(self, indexes, ticket_descriptions, max_batch_tokens):
+        batch, batch_tokens = [], BATCH_PROMPT_OVERHEAD_TOKENS
+        for i in indexes:
+            tokens = len(ticket_descriptions[i]) // CHARS_PER_TOKEN + BATCH_TICKET_OVERHEAD_TOKENS
+            if batch and batch_tokens + tokens > max_batch_tokens:
+                yield batch
+                batch, batch_tokens = [], BATCH_PROMPT_OVERHEAD_TOKENS
+            batch.append(i)
+            batch_tokens += tokens
+        if batch:
+            yield batch
+
+    def _classify_sub_batch(self, batch, ticket_descriptions, ticket_ids, results):
+        if len(batch) == 1:
+            i = batch[0]
+            results[i] = self.classify(ticket_descriptions[i], ticket_ids[i])
+            return
+
+        # Short positional ids keep the prompt small; they map back to ticket_ids
+        tickets = [{"id": str(n), "description": ticket_descriptions[i]} for n, i in enumerate(batch)]
+        prompt = f"""
+        Classify each of the following support tickets. For every ticket return:
+        - id: the ticket id exactly as given
+{CLASSIFICATION_RULES}
+        Return ONLY a JSON array with one object per ticket.
+
+        Tickets:
+        {json.dumps(tickets, separators=(",", ":"))}
+        """
+
+        start_time = time.time()
+        parsed = {}
+        response = None
         try:
-            response = self.model.generate_content(prompt)
-            # Extract JSON from response text
-            text = response.text.strip()
-            if "```json" in text:
-                text = text.split("```json")[1].split("```")[0].strip()
-            elif "```" in text:
-                text = text.split("```")[1].split("```")[0].strip()
-            
-            result = json.loads(text)
-            
-            execution_time_ms = int((time.time() - start_time) * 1000)
-            token_count = response.usage_metadata.total_token_count
-            cost_usd = (token_count * 0.0001 / 1000)
-            
-            self._log_telemetry(ticket_id, execution_time_ms, token_count, cost_usd)
-            
-            return result
+            response = self.resilient_model.generate_content(
+                prompt, generation_config=self.output.generation_config(BATCH_CLASSIFICATION_SCHEMA)
+            )
+            # Items are validated one by one so a single bad entry only re-batches that ticket
+            for item in extract_json(response_text(response), list):
+                if isinstance(item, dict) and "id" in item:
+                    item["id"] = str(item["id"])
+                if not validate(item, BATCH_CLASSIFICATION_SCHEMA["items"]):
+                    parsed[str(item["id"])] = self._to_classification(item)
         except Exception as e:
-            print(f"Error in classification: {e}")
-            return {
-                "category": "technical",
-                "priority": "medium",
-                "reasoning": "Fallback due to error in classification."
-            }
-
-    def _log_telemetry(self, ticket_id, execution_time_ms, token_count, cost_usd):
-        table_id = f"{self.project_id}.{self.dataset_id}.agent_telemetry"
-        rows_to_insert = [
-            {
-                "run_id": str(uuid.uuid4()),
-                "agent_name": "classifier",
-                "ticket_id": ticket_id,
-                "execution_time_ms": execution_time_ms,
-                "token_count": token_count,
-                "cost_usd": cost_usd,
-                "agent_version": self.agent_version,
-                "timestamp": datetime.now(timezone.utc).isoformat()
-            }
-        ]
-        errors = self.bq_client.insert_rows_json(table_id, rows_to_insert)
-        if errors:
-            print(f"Telemetry logging errors: {errors}")
+            print(f"Error in batch classification of {len(batch)} tickets: {e}")
+
+        if response is not None:
+            execution_time_ms = int((time.time() - start_time) * 1000)
+            # Spread the shared prompt cost evenly over the tickets it classified; an
+            # unusable response is still paid for, so it is charged to the whole sub-batch
+            charged = [n for n in range(len(batch)) if str(n) in parsed] or list(range(len(batch)))
+            share, remainder = divmod(response_tokens(response), len(charged))
+            for position, n in enumerate(charged):
+                i = batch[n]
+                if str(n) in parsed:
+                    self._cache_store(ticket_descriptions[i], parsed[str(n)])
+                    results[i] = dict(parsed[str(n)], classification_path="llm")
+                ticket_tokens = share + (1 if position < remainder else 0)
+                self.tracer.record("classifier", ticket_ids[i], execution_time_ms, ticket_tokens)
+
+        missing = [batch[n] for n in range(len(batch)) if str(n) not in parsed]
+        if missing:
+            if len(missing) == len(batch):
+                # Nothing usable came back: bisect so one bad ticket cannot sink the rest
+                middle = len(batch) // 2
+                self._classify_sub_batch(batch[:middle], ticket_descriptions, ticket_ids, results)
+                self._classify_sub_batch(batch[middle:], ticket_descriptions, ticket_ids, results)
+            else:
+                self._classify_sub_batch(missing, ticket_descriptions, ticket_ids, results)
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
@@ -0,0 +1,63 @@
+import os
+import asyncio
+import functools
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+
+class DependencyLimits:
+    """
+    Concurrency limits for the async execution path.
+
+    Gemini calls use the SDK's native async API and are bounded by a
+    semaphore. BigQuery has no async client, so its blocking calls run on a
+    dedicated, sized thread pool and are bounded by their own semaphore.
+    """
+
+    def __init__(self, gemini_concurrency: int = 32, bigquery_concurrency: int = 16, executor_workers: int = 16):
+        self.gemini_concurrency = gemini_concurrency
+        self.bigquery_concurrency = bigquery_concurrency
+        self.executor_workers = executor_workers
+        self._semaphores = {
+            "gemini": asyncio.Semaphore(gemini_concurrency),
+            "bigquery": asyncio.Semaphore(bigquery_concurrency),
+        }
+        self.executor = ThreadPoolExecutor(max_workers=executor_workers, thread_name_prefix="blocking-io")
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            gemini_concurrency=int(os.environ.get("GEMINI_MAX_CONCURRENCY", "32")),
+            bigquery_concurrency=int(os.environ.get("BIGQUERY_MAX_CONCURRENCY", "16")),
+            executor_workers=int(os.environ.get("BLOCKING_EXECUTOR_WORKERS", "16")),
+        )
+
+    async def call_gemini(self, fn, *args, **kwargs):
+        """
+        Awaits an async Gemini call (e.g. `model.generate_content_async`) under the Gemini limit.
+        """
+        async with self._semaphores["gemini"]:
+            return await fn(*args, **kwargs)
+
+    async def run_blocking(self, dependency: str, fn, *args, **kwargs):
+        """
+        Runs a blocking call on the executor under the limit for `dependency`.
+
+        The caller's context is copied so telemetry spans stay linked.
+        """
+        async with self._semaphores[dependency]:
+            loop = asyncio.get_running_loop()
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(self.executor, functools.partial(context.run, fn, *args, **kwargs))
+
+
+_default_limits = None
+
+def get_default_limits() -> DependencyLimits:
+    """
+    Process-wide limits shared by all agents that were not given their own.
+    """
+    global _default_limits
+    if _default_limits is None:
+        _default_limits = DependencyLimits.from_env()
+    return _default_limits
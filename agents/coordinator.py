@@ -2,52 +2,373 @@ import os
 import sys
 import json
 import uuid
+import time
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from datetime import datetime, timezone
 from agents.classifier_agent import TicketClassifierAgent
 from agents.knowledge_retriever_agent import KnowledgeRetrieverAgent
 from agents.router_agent import RouterAgent
+from agents.concurrency import get_default_limits
+from agents.resources import get_shared_resources
+from agents.fast_path import RuleBasedClassifier
+from agents.resilience import get_default_resilience
+from agents.history import TicketHistorySink, history_row
+from agents.incidents import IncidentClusterer
+
+# Per-stage timeouts in seconds; None disables the timeout for that stage.
+DEFAULT_STAGE_TIMEOUTS = {
+    "classify": 30.0,
+    "retrieve": 20.0,
+    "route": 10.0,
+}
+
+FALLBACK_CLASSIFICATION = {
+    "category": "technical",
+    "priority": "medium",
+    "reasoning": "Fallback due to classification timeout.",
+    "classification_path": "fallback"
+}
+
+FALLBACK_RETRIEVAL = {
+    "solutions": [],
+    "retrieval_path": "fallback",
+    "llm_called": False,
+    "llm_tokens": 0,
+    "estimated_tokens_saved": 0,
+    "rerank_latency_ms": 0,
+}
+
+FALLBACK_ROUTING = {
+    "assigned_team": "general_support",
+    "sla_hours": 24,
+    "routing_reason": "Routing stage timed out, falling back to general support."
+}
 
 class TicketCoordinator:
-    def __init__(self, project_id, api_key=None, credentials=None):
+    def __init__(self, project_id, api_key=None, credentials=None, concurrent=True,
+                 stage_timeouts=None, max_workers=8, retrieval_mode="llm", limits=None,
+                 classification_cache=None, cache_classifications=True, resources=None,
+                 fast_path=False, resilience=None, cache_candidates=True, history_sink=None,
+                 persist_history=True, store=None, incident_clustering=False, stream_classification=False,
+                 embedder=None):
         self.project_id = project_id
         self.api_key = api_key
-        self.classifier = TicketClassifierAgent(project_id, api_key=api_key, credentials=credentials)
-        self.retriever = KnowledgeRetrieverAgent(project_id, api_key=api_key, credentials=credentials)
-        self.router = RouterAgent(project_id, credentials=credentials)
+        self.limits = limits or get_default_limits()
+        # Retry, deadline and circuit-breaker state per dependency, shared by all agents
+        self.resilience = resilience or get_default_resilience()
+        # One BigQuery client and one model handle for all agents, reused across requests
+        self.resources = resources or get_shared_resources(project_id, api_key=api_key, credentials=credentials)
+        self.classifier = TicketClassifierAgent(
+            project_id, api_key=api_key, credentials=credentials, limits=self.limits, resources=self.resources,
+            resilience=self.resilience, stream=stream_classification
+        )
+        if classification_cache is not None:
+            self.classifier.cache = classification_cache
+        elif cache_classifications:
+            self.classifier.cache = self.classifier.build_cache()
+        # Unambiguous tickets are classified locally; the rest escalate to Gemini
+        if fast_path:
+            self.classifier.fast_path = fast_path if isinstance(fast_path, RuleBasedClassifier) else RuleBasedClassifier()
+        # All agents write spans through one tracer and one telemetry sink
+        self.tracer = self.classifier.tracer
+        self.retriever = KnowledgeRetrieverAgent(
+            project_id, api_key=api_key, credentials=credentials, retrieval_mode=retrieval_mode, embedder=embedder,
+            limits=self.limits, tracer=self.tracer, resources=self.resources, resilience=self.resilience,
+            cache_candidates=cache_candidates, store=store
+        )
+        self.router = RouterAgent(
+            project_id, credentials=credentials, limits=self.limits, tracer=self.tracer, resources=self.resources,
+            resilience=self.resilience, store=store
+        )
+        self.concurrent = concurrent
+        self.stage_timeouts = dict(DEFAULT_STAGE_TIMEOUTS)
+        if stage_timeouts:
+            self.stage_timeouts.update(stage_timeouts)
+        # Processed tickets are buffered and written to ticket_history in batched load jobs
+        self.history = history_sink
+        if self.history is None and persist_history:
+            self.history = TicketHistorySink(
+                lambda: self.resources.bq_client, f"{project_id}.support_tickets_staging.ticket_history"
+            )
+        # Bursts of similar tickets join one incident and reuse its classification and solutions
+        if isinstance(incident_clustering, IncidentClusterer):
+            self.incidents = incident_clustering
+            self.incidents.on_close = self.incidents.on_close or self._log_incident
+        else:
+            self.incidents = IncidentClusterer(on_close=self._log_incident) if incident_clustering else None
+        # Shared across tickets so threads are reused between requests
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="coordinator")
+
+    def warm(self) -> dict:
+        """
+        Loads the routing table and the knowledge base candidates ahead of the first ticket.
+        """
+        warmed = {"routing_rules": self.router.load_rules()}
+        if self.retriever.retrieval_mode == "embedding":
+            warmed["vector_index"] = self.retriever.load_vector_index()
+        else:
+            warmed["knowledge_base"] = self.retriever.warm_candidates()
+        return warmed
+
+    def coalescing_stats(self) -> dict:
+        """
+        How many classify and retrieval calls were collapsed into another in-flight call.
+        """
+        return {"classifier": self.classifier.inflight.snapshot(), "retriever": self.retriever.inflight.snapshot()}
+
+    def close(self):
+        """
+        Flushes buffered telemetry and ticket history and releases the stage executor.
+        """
+        self.tracer.sink.close()
+        if self.history:
+            self.history.close()
+        self.executor.shutdown(wait=False)
+
+    def _submit(self, fn, *args):
+        # Copy the context so agent spans are parented to the coordinator span
+        return self.executor.submit(contextvars.copy_context().run, fn, *args)
+
+    def _run_stage(self, name, fallback, fn, *args):
+        """
+        Runs a single stage on the executor, returning the fallback on timeout or error.
+        """
+        future = self._submit(fn, *args)
+        return self._await_stage(name, fallback, future, time.monotonic())
+
+    def _run_parallel_stages(self, stages):
+        """
+        Submits independent stages together and collects their results.
+
+        Stages are awaited shortest deadline first so that a slow stage never
+        delays the timeout of a faster one.
+        """
+        submitted_at = time.monotonic()
+        futures = {
+            name: self._submit(fn, *args)
+            for name, (fallback, fn, *args) in stages.items()
+        }
+        order = sorted(stages, key=lambda name: self.stage_timeouts.get(name) or float("inf"))
+        return {
+            name: self._await_stage(name, stages[name][0], futures[name], submitted_at)
+            for name in order
+        }
+
+    def _await_stage(self, name, fallback, future, submitted_at):
+        timeout = self.stage_timeouts.get(name)
+        if timeout is not None:
+            # Deadlines are measured from submission, not from when we start waiting
+            timeout = max(0.0, timeout - (time.monotonic() - submitted_at))
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            # The worker thread cannot be interrupted; its result is discarded.
+            print(f"Stage '{name}' timed out after {self.stage_timeouts.get(name)}s, using fallback.")
+            return fallback
+        except Exception as e:
+            print(f"Stage '{name}' failed: {e}")
+            return fallback
 
     def process_ticket(self, ticket_description: str, ticket_id: str = None) -> dict:
         """
         Orchestrates the full ticket processing workflow.
+
+        Classification runs first. Retrieval and routing only depend on the
+        classification, so in concurrent mode they run in parallel.
         """
         if not ticket_id:
             ticket_id = str(uuid.uuid4())
             
-        print(f"\n--- Processing Ticket: {ticket_id} ---")
-        
-        # 1. Classify
-        print("Classifying ticket...")
-        classification = self.classifier.classify(ticket_description, ticket_id)
-        category = classification.get("category", "technical")
-        priority = classification.get("priority", "medium")
-        
-        # 2. Retrieve solutions
-        print(f"Retrieving solutions for {category}...")
-        solutions = self.retriever.retrieve_solutions(ticket_description, category)
+        with self.tracer.span("coordinator", ticket_id):
+            print(f"\n--- Processing Ticket: {ticket_id} ---")
+
+            incident = self._match_incident(ticket_id, ticket_description)
+            if incident is not None:
+                print(f"Joined incident {incident['incident_id']} ({incident['size']} tickets), skipping model calls...")
+                classification, retrieval = self._incident_stages(incident)
+                category, priority = classification["category"], classification["priority"]
+                if self.concurrent:
+                    routing = self._run_stage("route", dict(FALLBACK_ROUTING), self.router.route_ticket, category, priority)
+                else:
+                    routing = self.router.route_ticket(category, priority)
+                return self._build_result(ticket_id, ticket_description, classification, retrieval, routing, incident)
         
-        # 3. Route
-        print(f"Routing ticket with priority {priority}...")
-        routing = self.router.route_ticket(category, priority)
+            # 1. Classify
+            print("Classifying ticket...")
+            if self.concurrent:
+                classification = self._run_stage(
+                    "classify", dict(FALLBACK_CLASSIFICATION),
+                    self.classifier.classify, ticket_description, ticket_id
+                )
+            else:
+                classification = self.classifier.classify(ticket_description, ticket_id)
+            category = classification.get("category", "technical")
+            priority = classification.get("priority", "medium")
         
+            if self.concurrent:
+                # 2 + 3. Retrieve solutions and route at the same time
+                print(f"Retrieving solutions for {category} and routing with priority {priority}...")
+                stages = self._run_parallel_stages({
+                    "retrieve": (dict(FALLBACK_RETRIEVAL), self.retriever.retrieve, ticket_description, category),
+                    "route": (dict(FALLBACK_ROUTING), self.router.route_ticket, category, priority),
+                })
+                retrieval = stages["retrieve"]
+                routing = stages["route"]
+            else:
+                # 2. Retrieve solutions
+                print(f"Retrieving solutions for {category}...")
+                retrieval = self.retriever.retrieve(ticket_description, category)
+            
+                # 3. Route
+                print(f"Routing ticket with priority {priority}...")
+                routing = self.router.route_ticket(category, priority)
+
+            incident = self._open_incident(ticket_id, ticket_description, classification, retrieval)
+            return self._build_result(ticket_id, ticket_description, classification, retrieval, routing, incident)
+
+    async def aprocess_ticket(self, ticket_description: str, ticket_id: str = None, on_stage=None) -> dict:
+        """
+        Async variant of `process_ticket` for use inside an event loop.
+
+        Gemini calls are awaited natively and BigQuery calls run on the sized
+        blocking executor, so many tickets can be in flight on one worker.
+
+        `on_stage(name, fields)` is called as soon as each stage finishes, with
+        the result fields that stage produces ("classification", "solutions" or
+        "routing"), so callers can show partial results before the ticket is done.
+        """
+        if not ticket_id:
+            ticket_id = str(uuid.uuid4())
+
+        with self.tracer.span("coordinator", ticket_id):
+            incident = self._match_incident(ticket_id, ticket_description)
+            if incident is not None:
+                classification, retrieval = self._incident_stages(incident)
+                self._notify_stage(on_stage, "classify", classification)
+                self._notify_stage(on_stage, "retrieve", retrieval)
+                routing = await self._await_async_stage(
+                    "route", dict(FALLBACK_ROUTING),
+                    self.router.aroute_ticket(classification["category"], classification["priority"]), on_stage
+                )
+                return self._build_result(ticket_id, ticket_description, classification, retrieval, routing, incident)
+
+            classification = await self._await_async_stage(
+                "classify", dict(FALLBACK_CLASSIFICATION),
+                self.classifier.aclassify(ticket_description, ticket_id), on_stage
+            )
+            category = classification.get("category", "technical")
+            priority = classification.get("priority", "medium")
+
+            retrieval, routing = await asyncio.gather(
+                self._await_async_stage(
+                    "retrieve", dict(FALLBACK_RETRIEVAL), self.retriever.aretrieve(ticket_description, category),
+                    on_stage
+                ),
+                self._await_async_stage(
+                    "route", dict(FALLBACK_ROUTING), self.router.aroute_ticket(category, priority), on_stage
+                ),
+            )
+
+            incident = self._open_incident(ticket_id, ticket_description, classification, retrieval)
+            return self._build_result(ticket_id, ticket_description, classification, retrieval, routing, incident)
+
+    async def _await_async_stage(self, name, fallback, coro, on_stage=None):
+        try:
+            result = await asyncio.wait_for(coro, timeout=self.stage_timeouts.get(name))
+        except asyncio.TimeoutError:
+            print(f"Stage '{name}' timed out after {self.stage_timeouts.get(name)}s, using fallback.")
+            result = fallback
+        except Exception as e:
+            print(f"Stage '{name}' failed: {e}")
+            result = fallback
+        self._notify_stage(on_stage, name, result)
+        return result
+
+    def _notify_stage(self, on_stage, name, result):
+        if on_stage is None:
+            return
+        # Same keys as the final result so partial updates can simply be merged
+        if name == "classify":
+            event, fields = "classification", {
+                "classification": result, "fast_path": self._fast_path_info(result)
+            }
+        elif name == "retrieve":
+            event, fields = "solutions", {
+                "suggested_solutions": result["solutions"],
+                "retrieval": {k: v for k, v in result.items() if k != "solutions"},
+            }
+        else:
+            event, fields = "routing", {"routing": result}
+        try:
+            on_stage(event, fields)
+        except Exception as e:
+            print(f"Stage callback failed for '{name}': {e}")
+
+    def _fast_path_info(self, classification):
+        fast_path = getattr(self.classifier, "fast_path", None)
+        return {
+            "path": classification.get("classification_path", "llm"),
+            "escalation_rate": fast_path.escalation_rate if fast_path else None,
+        }
+
+    def _match_incident(self, ticket_id, ticket_description):
+        if self.incidents is None:
+            return None
+        return self.incidents.match(ticket_id, ticket_description)
+
+    def _open_incident(self, ticket_id, ticket_description, classification, retrieval):
+        if self.incidents is None:
+            return None
+        return self.incidents.open(ticket_id, ticket_description, classification, retrieval)
+
+    def _incident_stages(self, incident):
+        classification = dict(incident["classification"], classification_path="incident")
+        retrieval = dict(
+            incident["retrieval"], retrieval_path="incident", llm_called=False, llm_tokens=0, rerank_latency_ms=0
+        )
+        return classification, retrieval
+
+    def _log_incident(self, summary):
+        print(
+            f"Incident {summary['incident_id']} closed: {summary['size']} tickets, "
+            f"{summary['category']}/{summary['priority']}, {summary['tickets_reused']} served without model calls"
+        )
+
+    def incident_summaries(self) -> dict:
+        """
+        Open incidents (most recently active first) and recently closed ones.
+        """
+        if self.incidents is None:
+            return {"enabled": False, "open": [], "closed": []}
+        return {
+            "enabled": True,
+            "open": self.incidents.summaries(),
+            "closed": list(self.incidents.closed),
+            "stats": dict(self.incidents.stats),
+        }
+
+    def _build_result(self, ticket_id, ticket_description, classification, retrieval, routing, incident=None):
         result = {
             "ticket_id": ticket_id,
             "timestamp": datetime.now(timezone.utc).isoformat(),
             "ticket_description": ticket_description,
             "classification": classification,
-            "suggested_solutions": solutions,
+            "fast_path": self._fast_path_info(classification),
+            "suggested_solutions": retrieval["solutions"],
+            "retrieval": {k: v for k, v in retrieval.items() if k != "solutions"},
             "routing": routing,
             "status": "processed"
         }
-        
+        if self.incidents is not None:
+            result["incident"] = {
+                "incident_id": incident["incident_id"],
+                "size": incident["size"],
+                "joined": incident["size"] > 1,
+            } if incident else None
+        if self.history:
+            self.history.emit(history_row(result))
         return result
 
 if __name__ == "__main__":
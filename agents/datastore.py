@@ -0,0 +1,199 @@
+from datetime import datetime, timezone
+from agents.instrumentation import current_span
+from agents.resilience import run_query
+from agents.sqlite_connections import ThreadLocalConnections
+
+ROUTING_RULE_COLUMNS = ["category", "priority", "assigned_team", "sla_hours"]
+KNOWLEDGE_BASE_COLUMNS = [
+    "solution_id", "category", "problem_description", "solution_text", "success_rate", "embedding", "last_updated",
+]
+
+
+def to_timestamp(value):
+    """
+    Normalizes a TIMESTAMP (datetime or ISO string) to a UTC datetime.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+class BigQueryStore:
+    """
+    Reads routing_rules and knowledge_base from BigQuery; the default store.
+
+    `bq_client` is a zero-argument callable so the client is only built on the
+    first read. Every query goes through the BigQuery ResilientCall and its
+    bytes are recorded on the current span.
+    """
+
+    def __init__(self, bq_client, project_id, dataset_id="support_tickets_staging", caller=None):
+        self.bq_client = bq_client
+        self.project_id = project_id
+        self.dataset_id = dataset_id
+        self.caller = caller
+
+    def table(self, name) -> str:
+        return f"{self.project_id}.{self.dataset_id}.{name}"
+
+    def routing_rules(self) -> list:
+        query = f"""
+            SELECT category, priority, assigned_team, sla_hours
+            FROM `{self.table("routing_rules")}`
+        """
+        return self._run(query)
+
+    def knowledge_base(self, columns, since=None) -> list:
+        """
+        Returns every knowledge_base row, or only rows with last_updated after `since`.
+        """
+        query = f"""
+            SELECT {", ".join(columns)}
+            FROM `{self.table("knowledge_base")}`
+            {"WHERE last_updated > @since" if since is not None else ""}
+        """
+        if since is None:
+            return self._run(query)
+
+        from google.cloud import bigquery
+
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ScalarQueryParameter("since", "TIMESTAMP", since)]
+        )
+        return self._run(query, job_config)
+
+    def top_solutions(self, category, limit) -> list:
+        from google.cloud import bigquery
+
+        query = f"""
+            SELECT solution_id, problem_description, solution_text, success_rate
+            FROM `{self.table("knowledge_base")}`
+            WHERE category = @category
+            ORDER BY success_rate DESC
+            LIMIT {int(limit)}
+        """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ScalarQueryParameter("category", "STRING", category)]
+        )
+        return self._run(query, job_config)
+
+    def _run(self, query, job_config=None):
+        client = self.bq_client() if callable(self.bq_client) else self.bq_client
+        if self.caller is not None:
+            query_job, rows = self.caller.call(run_query, client, query, job_config)
+        else:
+            query_job, rows = run_query(client, query, job_config)
+        current_span().record_query(query_job)
+        return rows
+
+
+class SQLiteStore:
+    """
+    Local copy of routing_rules and knowledge_base in a SQLite file.
+
+    Reads are indexed point lookups that take well under a millisecond, so
+    the agents can serve per-request reads without a warehouse round trip and
+    the pipeline can run with no network at all. The file is filled by
+    `sync_from_bigquery` (see scripts/sync_local_store.py) or `replace_table`.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connections = ThreadLocalConnections(path)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS routing_rules (
+                    category TEXT, priority TEXT, assigned_team TEXT, sla_hours INTEGER,
+                    PRIMARY KEY (category, priority)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS knowledge_base (
+                    solution_id TEXT PRIMARY KEY, category TEXT, problem_description TEXT, solution_text TEXT,
+                    success_rate REAL, embedding TEXT, last_updated TEXT
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_knowledge_base_category ON knowledge_base (category, success_rate DESC)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_knowledge_base_updated ON knowledge_base (last_updated)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sync_state (table_name TEXT PRIMARY KEY, synced_at TEXT, row_count INTEGER)"
+            )
+
+    def _connect(self):
+        return self._connections.connect()
+
+    def routing_rules(self) -> list:
+        return self._select(f"SELECT {', '.join(ROUTING_RULE_COLUMNS)} FROM routing_rules")
+
+    def knowledge_base(self, columns, since=None) -> list:
+        query = f"SELECT {', '.join(columns)} FROM knowledge_base"
+        if since is None:
+            return self._select(query)
+        # Timestamps are stored as UTC ISO strings, which sort chronologically
+        return self._select(query + " WHERE last_updated > ?", (to_timestamp(since).isoformat(),))
+
+    def top_solutions(self, category, limit) -> list:
+        return self._select(
+            "SELECT solution_id, problem_description, solution_text, success_rate FROM knowledge_base"
+            " WHERE category = ? ORDER BY success_rate DESC LIMIT ?",
+            (category, int(limit)),
+        )
+
+    def replace_table(self, name, rows) -> int:
+        """
+        Replaces the whole contents of `name` in one transaction, so readers see
+        either the old copy or the new one.
+        """
+        columns = {"routing_rules": ROUTING_RULE_COLUMNS, "knowledge_base": KNOWLEDGE_BASE_COLUMNS}[name]
+        values = []
+        for row in rows:
+            row = dict(row)
+            if row.get("last_updated"):
+                row["last_updated"] = to_timestamp(row["last_updated"]).isoformat()
+            values.append(tuple(row.get(column) for column in columns))
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(f"DELETE FROM {name}")
+            conn.executemany(
+                f"INSERT INTO {name} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})", values
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?)",
+                (name, datetime.now(timezone.utc).isoformat(), len(values)),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(values)
+
+    def sync_state(self) -> dict:
+        rows = self._connect().execute("SELECT table_name, synced_at, row_count FROM sync_state").fetchall()
+        return {name: {"synced_at": synced_at, "row_count": count} for name, synced_at, count in rows}
+
+    def _select(self, query, params=()):
+        cursor = self._connect().execute(query, params)
+        names = [column[0] for column in cursor.description]
+        rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+        if "last_updated" in names:
+            # Same type BigQuery returns, so high-water marks compare consistently
+            for row in rows:
+                row["last_updated"] = to_timestamp(row["last_updated"])
+        return rows
+
+
+def sync_from_bigquery(source: BigQueryStore, target: SQLiteStore) -> dict:
+    """
+    Copies routing_rules and knowledge_base from BigQuery into the local store.
+    """
+    return {
+        "routing_rules": target.replace_table("routing_rules", source.routing_rules()),
+        "knowledge_base": target.replace_table("knowledge_base", source.knowledge_base(KNOWLEDGE_BASE_COLUMNS)),
+    }
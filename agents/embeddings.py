@@ -0,0 +1,229 @@
+import json
+import hashlib
+import numpy as np
+from agents.lexical import tokenize
+
+EMBEDDERS = ("hashing", "gemini")
+
+
+class EmbeddingMismatchError(ValueError):
+    """
+    Raised when stored knowledge_base embeddings came from a different embedder
+    than the one the retriever is configured with.
+    """
+
+
+class HashingEmbedder:
+    """
+    Deterministic local embedder using the hashing trick over words and word bigrams.
+
+    Needs no network or model, so it is suitable for tests and offline runs.
+    """
+    name = "hashing"
+    # Concurrency limit (see DependencyLimits) a query embedding runs under; None for local work
+    dependency = None
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    @property
+    def identity(self) -> str:
+        return f"{self.name}/{self.dim}"
+
+    def _features(self, text):
+        tokens = tokenize(text)
+        return tokens + [f"{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+
+    def embed(self, texts: list) -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                # Low bits pick the bucket, the top bit picks the sign
+                sign = 1.0 if value >> 63 else -1.0
+                matrix[i, value % self.dim] += sign
+        return normalize_rows(matrix)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed([text])[0]
+
+
+class GeminiEmbedder:
+    """
+    Embedder backed by the Gemini embedding API.
+    """
+    name = "gemini"
+    dependency = "gemini"
+
+    def __init__(self, model: str = "models/text-embedding-004", task_type: str = "retrieval_document",
+                 api_key=None):
+        self.model = model
+        self.task_type = task_type
+        self.api_key = api_key
+        self.dim = None
+
+    @property
+    def identity(self) -> str:
+        return f"{self.name}/{self.model}"
+
+    def embed(self, texts: list) -> np.ndarray:
+        import google.generativeai as genai
+        from agents.resources import configure_genai
+
+        configure_genai(self.api_key)
+        if not texts:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        response = genai.embed_content(model=self.model, content=list(texts), task_type=self.task_type)
+        matrix = np.asarray(response["embedding"], dtype=np.float32)
+        self.dim = matrix.shape[1]
+        return normalize_rows(matrix)
+
+    def embed_query(self, text: str) -> np.ndarray:
+        import google.generativeai as genai
+        from agents.resources import configure_genai
+
+        configure_genai(self.api_key)
+        response = genai.embed_content(model=self.model, content=text, task_type="retrieval_query")
+        vector = np.asarray(response["embedding"], dtype=np.float32)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+
+def build_embedder(name: str = "hashing", api_key=None):
+    """
+    Returns the embedder called `name` ("hashing" or "gemini").
+    """
+    if name == "gemini":
+        return GeminiEmbedder(api_key=api_key)
+    if name == "hashing":
+        return HashingEmbedder()
+    raise ValueError(f"embedder must be one of {EMBEDDERS}, got '{name}'")
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def serialize_embedding(vector, embedder) -> str:
+    """
+    Encodes a vector for the STRING `embedding` column of knowledge_base,
+    tagged with the embedder that produced it.
+    """
+    return json.dumps({"embedder": embedder.identity, "vector": [round(float(x), 6) for x in vector]})
+
+
+def parse_embedding(value):
+    """
+    Returns (vector, embedder identity). Untagged vectors written before the
+    tag existed have identity None; unreadable values give (None, None).
+    """
+    if not value:
+        return None, None
+    try:
+        payload = json.loads(value)
+        if isinstance(payload, dict):
+            return np.asarray(payload["vector"], dtype=np.float32), payload.get("embedder")
+        return np.asarray(payload, dtype=np.float32), None
+    except (TypeError, ValueError, KeyError):
+        return None, None
+
+
+def knowledge_text(row: dict) -> str:
+    """
+    Text that is embedded for a knowledge base row.
+    """
+    return f"{row['problem_description']}\n{row['solution_text']}"
+
+
+class VectorIndex:
+    """
+    Dense cosine-similarity index over the knowledge base rows of one category.
+    """
+
+    def __init__(self, rows: list, matrix: np.ndarray):
+        self.rows = rows
+        self.matrix = np.ascontiguousarray(normalize_rows(matrix.astype(np.float32, copy=False)))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def search(self, query_vector: np.ndarray, top_k: int = 3) -> list:
+        """
+        Returns (row, score) pairs for the top_k most similar rows.
+        """
+        if not self.rows or top_k <= 0:
+            return []
+        scores = self.matrix @ query_vector.astype(np.float32, copy=False)
+        k = min(top_k, len(self.rows))
+        # argpartition is O(n); only the k winners get fully sorted
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.rows[i], float(scores[i])) for i in top]
+
+    def save(self, path: str):
+        """
+        Persists the index as `<path>.npy` plus `<path>.json` so it can be memory-mapped later.
+        """
+        np.save(f"{path}.npy", self.matrix)
+        with open(f"{path}.json", "w") as f:
+            json.dump(self.rows, f)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True):
+        matrix = np.load(f"{path}.npy", mmap_mode="r" if mmap else None)
+        with open(f"{path}.json") as f:
+            rows = json.load(f)
+        index = cls.__new__(cls)
+        index.rows = rows
+        index.matrix = matrix
+        return index
+
+
+def build_category_indexes(rows: list, embedder) -> dict:
+    """
+    Groups knowledge base rows by category and builds one VectorIndex per category.
+
+    Rows with no stored embedding are embedded locally. A stored embedding
+    from a different embedder (or, for untagged vectors, of a different
+    dimension) raises EmbeddingMismatchError rather than being silently
+    recomputed, since it means the backfill and the retriever disagree.
+    """
+    by_category = {}
+    for row in rows:
+        by_category.setdefault(row["category"], []).append(row)
+
+    indexes = {}
+    for category, category_rows in by_category.items():
+        vectors = []
+        for row in category_rows:
+            vector, identity = parse_embedding(row.get("embedding"))
+            _check_embedding(row, vector, identity, embedder)
+            vectors.append(vector)
+        missing = [i for i, v in enumerate(vectors) if v is None]
+        if missing:
+            computed = embedder.embed([knowledge_text(category_rows[i]) for i in missing])
+            for i, vector in zip(missing, computed):
+                vectors[i] = vector
+        clean_rows = [{k: v for k, v in row.items() if k != "embedding"} for row in category_rows]
+        indexes[category] = VectorIndex(clean_rows, np.vstack(vectors))
+    return indexes
+
+
+def _check_embedding(row, vector, identity, embedder):
+    if vector is None:
+        return
+    if identity is not None and identity != embedder.identity:
+        raise EmbeddingMismatchError(
+            f"knowledge_base row {row.get('solution_id')} was embedded with {identity}, but the retriever "
+            f"uses {embedder.identity}; re-run scripts/backfill_embeddings.py --overwrite or set EMBEDDER"
+        )
+    if embedder.dim is None:
+        # Gemini's dimension is only known once it has embedded something
+        embedder.dim = vector.shape[0]
+    if vector.shape[0] != embedder.dim:
+        raise EmbeddingMismatchError(
+            f"knowledge_base row {row.get('solution_id')} has a {vector.shape[0]}-dimensional embedding, "
+            f"but {embedder.identity} produces {embedder.dim} dimensions"
+        )
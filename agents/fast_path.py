@@ -0,0 +1,187 @@
+import re
+import threading
+
+# Extra phrasings customers actually use, on top of the keywords parsed from
+# CLASSIFICATION_RULES. Keep entries lower case; plurals/-ed/-ing are matched automatically.
+EXTRA_CATEGORY_KEYWORDS = {
+    "billing": ["charge", "billing", "bill", "credit card", "receipt", "overcharge", "subscription",
+                "promo code", "tax", "price", "pricing"],
+    "technical": ["bug", "crash", "broken", "not working", "timeout", "slow", "slowdown", "outage",
+                  "api", "sync", "fail", "500", "system is down", "site is down"],
+    "account": ["log in", "sign in", "2fa", "two-factor", "username", "locked out", "account locked",
+                "profile", "email change"],
+    "feature_request": ["feature request", "would love", "would like", "please add", "add support",
+                        "it would be nice", "wish", "suggestion", "dark mode", "roadmap"],
+}
+
+EXTRA_PRIORITY_KEYWORDS = {
+    "critical": ["down", "outage", "data loss", "security", "breach", "urgent", "production",
+                 "hacked", "compromised", "unauthorized", "fraud", "fraudulent", "stolen", "data is gone",
+                 "lost all", "deleted all", "wiped"],
+    "high": ["all users", "multiple users", "everyone", "crash", "cannot access", "blocked",
+             "whole company", "entire company", "entire team", "locked out", "immediately", "asap"],
+    "medium": ["workaround", "single user", "only me"],
+    "low": ["cosmetic", "typo", "question", "enhancement", "would love", "wish", "nice to have"],
+}
+
+# Most severe first; used to resolve priority keywords that match at adjacent levels
+PRIORITY_ORDER = ["critical", "high", "medium", "low"]
+
+RULE_LINE_PATTERN = re.compile(r"^\s*-\s*(\w+):\s*(.+)$")
+
+
+def parse_rules(rules_text):
+    """
+    Extracts the keyword lists from the "Rules:" and "Priority rules:" sections
+    of the classification prompt, so the fast path and Gemini follow the same rules.
+    """
+    categories, priorities = {}, {}
+    section = None
+    for line in rules_text.splitlines():
+        stripped = line.strip()
+        if stripped == "Rules:":
+            section = categories
+        elif stripped == "Priority rules:":
+            section = priorities
+        elif section is not None:
+            match = RULE_LINE_PATTERN.match(line)
+            if match:
+                section[match.group(1)] = [k.strip().lower() for k in match.group(2).split(",") if k.strip()]
+    return categories, priorities
+
+
+def _stem(word):
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def _keyword_pattern(keyword):
+    words = [re.escape(_stem(w)) for w in keyword.split()]
+    return r"\s+".join(w + r"(?:s|es|d|ed|ing)?" for w in words) + r"\b"
+
+
+def compile_keywords(keywords_by_label):
+    """
+    Compiles one regex per label set. Each keyword is its own capture group so a
+    single `finditer` pass reports every label and keyword that matched.
+    """
+    patterns = {}
+    for label, keywords in keywords_by_label.items():
+        for keyword in keywords:
+            # "charge" and "charges" compile to the same pattern; keep the first
+            patterns.setdefault((label, _keyword_pattern(keyword)), keyword)
+
+    parts, group_labels = [], {}
+    # Longer phrases first so "data loss" wins over a shorter overlapping keyword
+    entries = sorted(patterns.items(), key=lambda entry: -len(entry[1]))
+    for index, ((label, pattern), keyword) in enumerate(entries):
+        group = f"k{index}"
+        group_labels[group] = (label, keyword)
+        parts.append(f"(?P<{group}>{pattern})")
+    # A single leading word boundary lets the engine skip mid-word positions up front
+    return re.compile(r"\b(?:" + "|".join(parts) + ")", re.IGNORECASE), group_labels
+
+
+class RuleBasedClassifier:
+    """
+    Classifies unambiguous tickets locally with precompiled keyword patterns.
+
+    A ticket is handled here only when its category leads every other category
+    by at least `min_margin` keywords (a lone category needs `min_margin` hits)
+    and it has priority keywords that do not conflict. Everything else returns
+    None so the caller can escalate to Gemini; set `default_priority` to
+    classify tickets with no priority signal anyway.
+    """
+
+    def __init__(self, rules_text=None, min_margin=2, default_priority=None, max_length=1000,
+                 extra_categories=None, extra_priorities=None):
+        if rules_text is None:
+            from agents.classifier_agent import CLASSIFICATION_RULES
+            rules_text = CLASSIFICATION_RULES
+        categories, priorities = parse_rules(rules_text)
+        for source, target in ((extra_categories or EXTRA_CATEGORY_KEYWORDS, categories),
+                               (extra_priorities or EXTRA_PRIORITY_KEYWORDS, priorities)):
+            for label, keywords in source.items():
+                target.setdefault(label, []).extend(keywords)
+        self.category_pattern, self._category_groups = compile_keywords(categories)
+        self.priority_pattern, self._priority_groups = compile_keywords(priorities)
+        self.min_margin = min_margin
+        self.default_priority = default_priority
+        self.max_length = max_length
+        self.stats = {"evaluated": 0, "matched": 0, "escalated": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def escalation_rate(self) -> float:
+        with self._lock:
+            evaluated = self.stats["evaluated"]
+            return round(self.stats["escalated"] / evaluated, 4) if evaluated else 0.0
+
+    def classify(self, ticket_description: str):
+        """
+        Returns a classification dict, or None when the ticket should go to Gemini.
+        """
+        result = self._match(ticket_description or "")
+        with self._lock:
+            self.stats["evaluated"] += 1
+            self.stats["matched" if result else "escalated"] += 1
+        return result
+
+    def best_guess(self, ticket_description: str):
+        """
+        Picks the strongest category and most severe priority without the
+        ambiguity checks. Used as a local fallback when the model is unavailable;
+        returns None only when no keyword matches at all.
+        """
+        text = ticket_description or ""
+        categories = self._scan(self.category_pattern, self._category_groups, text)
+        if not categories:
+            return None
+        category, category_keywords = max(categories.items(), key=lambda item: len(item[1]))
+        priorities = self._scan(self.priority_pattern, self._priority_groups, text)
+        priority = min(priorities, key=PRIORITY_ORDER.index) if priorities else self.default_priority or "medium"
+        return {
+            "category": category,
+            "priority": priority,
+            "reasoning": f"Best-effort rule match: {category} ({', '.join(sorted(category_keywords))}).",
+        }
+
+    def _scan(self, pattern, groups, text):
+        found = {}
+        for match in pattern.finditer(text):
+            label, keyword = groups[match.lastgroup]
+            found.setdefault(label, set()).add(keyword)
+        return found
+
+    def _match(self, text):
+        if not text.strip() or len(text) > self.max_length:
+            return None
+
+        categories = self._scan(self.category_pattern, self._category_groups, text)
+        if not categories:
+            return None
+        ranked = sorted(categories.items(), key=lambda item: -len(item[1]))
+        category, category_keywords = ranked[0]
+        runner_up = len(ranked[1][1]) if len(ranked) > 1 else 0
+        # A single keyword ("refund", "password") is too little evidence, even with no competing category
+        if len(category_keywords) - runner_up < self.min_margin:
+            return None
+
+        priorities = self._scan(self.priority_pattern, self._priority_groups, text)
+        if not priorities:
+            if self.default_priority is None:
+                return None
+            priority, priority_keywords = self.default_priority, set()
+        else:
+            levels = sorted(PRIORITY_ORDER.index(p) for p in priorities)
+            # Signals for levels more than one step apart (e.g. "urgent" and "question") are a conflict
+            if levels[-1] - levels[0] > 1:
+                return None
+            priority = PRIORITY_ORDER[levels[0]]
+            priority_keywords = priorities[priority]
+
+        reasoning = f"Rule match: {category} ({', '.join(sorted(category_keywords))})"
+        if priority_keywords:
+            reasoning += f"; {priority} ({', '.join(sorted(priority_keywords))})"
+        return {"category": category, "priority": priority, "reasoning": reasoning + "."}
@@ -0,0 +1,112 @@
+import io
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+from agents.telemetry import TelemetrySink
+
+# Column order of ticket_history (see scripts/create_tables.py)
+HISTORY_COLUMNS = [
+    ("ticket_id", "STRING"),
+    ("category", "STRING"),
+    ("priority", "STRING"),
+    ("description", "STRING"),
+    ("resolution", "STRING"),
+    ("assigned_team", "STRING"),
+    ("created_at", "TIMESTAMP"),
+    ("resolved_at", "TIMESTAMP"),
+]
+
+# created_at is the partition column and stays as first written
+MERGE_UPDATE_COLUMNS = ["category", "priority", "description", "resolution", "assigned_team", "resolved_at"]
+
+
+def history_row(result: dict) -> dict:
+    """
+    Maps a coordinator result onto a ticket_history row.
+    """
+    classification = result.get("classification") or {}
+    routing = result.get("routing") or {}
+    return {
+        "ticket_id": result["ticket_id"],
+        "category": classification.get("category") or "technical",
+        "priority": classification.get("priority") or "medium",
+        "description": result.get("ticket_description") or "",
+        "resolution": None,
+        "assigned_team": routing.get("assigned_team") or "general_support",
+        "created_at": result.get("timestamp") or datetime.now(timezone.utc).isoformat(),
+        "resolved_at": None,
+    }
+
+
+def to_ndjson(rows) -> io.BytesIO:
+    return io.BytesIO("".join(json.dumps(row, default=str) + "\n" for row in rows).encode("utf-8"))
+
+
+class TicketHistorySink(TelemetrySink):
+    """
+    Buffers processed tickets and writes them to ticket_history with batch load jobs.
+
+    Each batch is loaded as NDJSON into a throwaway staging table and MERGEd
+    into ticket_history on ticket_id, so a retried batch or a re-processed
+    ticket updates its row instead of adding a duplicate. Load jobs are free
+    and leave no streaming buffer behind, unlike `insert_rows_json`. The MERGE
+    only looks `merge_lookback_days` back from the batch's oldest row so it
+    scans a few partitions rather than the whole table.
+
+    Batches are large and infrequent by default: every flush costs a load job
+    and a MERGE, which BigQuery rate-limits far more tightly than streaming rows.
+    """
+
+    thread_name = "ticket-history-flusher"
+
+    def __init__(self, bq_client, table_id, max_queue_size: int = 20000, batch_size: int = 5000,
+                 flush_interval_seconds: float = 60.0, merge_lookback_days: int = 7):
+        super().__init__(bq_client, table_id, max_queue_size=max_queue_size, batch_size=batch_size,
+                         flush_interval_seconds=flush_interval_seconds)
+        self.merge_lookback_days = merge_lookback_days
+        self.stats.update(load_jobs=0, merged_rows=0)
+
+    def merge_sql(self, staging_table_id) -> str:
+        columns = [name for name, _ in HISTORY_COLUMNS]
+        updates = ", ".join(f"{name} = S.{name}" for name in MERGE_UPDATE_COLUMNS)
+        return f"""
+            MERGE `{self.table_id}` T
+            USING `{staging_table_id}` S
+            ON T.ticket_id = S.ticket_id AND T.created_at >= @since
+            WHEN MATCHED THEN UPDATE SET {updates}
+            WHEN NOT MATCHED THEN INSERT ({", ".join(columns)}) VALUES ({", ".join("S." + c for c in columns)})
+        """
+
+    def _send(self, batch):
+        # MERGE rejects several source rows for one target row; the latest result wins
+        rows = list({row["ticket_id"]: row for row in batch}.values())
+        with self._flush_lock:
+            self._count("load_jobs")
+            try:
+                client = self.bq_client() if callable(self.bq_client) else self.bq_client
+                self._load_and_merge(client, rows)
+            except Exception as e:
+                print(f"Ticket history flush failed for {len(batch)} rows: {e}")
+                self._count("failed_rows", len(batch))
+                return
+            self._count("flushed_rows", len(batch))
+            self._count("merged_rows", len(rows))
+
+    def _load_and_merge(self, client, rows):
+        from google.cloud import bigquery
+
+        staging_table_id = f"{self.table_id}_staging_{uuid.uuid4().hex[:12]}"
+        load_config = bigquery.LoadJobConfig(
+            source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
+            schema=[bigquery.SchemaField(name, field_type) for name, field_type in HISTORY_COLUMNS],
+            write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+        )
+        oldest = min(datetime.fromisoformat(str(row["created_at"])) for row in rows)
+        query_config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ScalarQueryParameter("since", "TIMESTAMP", oldest - timedelta(days=self.merge_lookback_days)),
+        ])
+        try:
+            client.load_table_from_file(to_ndjson(rows), staging_table_id, job_config=load_config).result()
+            client.query(self.merge_sql(staging_table_id), job_config=query_config).result()
+        finally:
+            client.delete_table(staging_table_id, not_found_ok=True)
@@ -0,0 +1,190 @@
+import time
+import uuid
+import threading
+from collections import OrderedDict, deque
+from agents.cache import MinHasher, normalize_text
+
+# Classification/retrieval paths that are not trustworthy enough to hand to other tickets
+UNSHAREABLE_PATHS = ("fallback",)
+
+
+class Incident:
+    """
+    A group of similar tickets that share one classification and one set of solutions.
+    """
+
+    def __init__(self, description, signature, band_keys, classification, retrieval, now):
+        self.incident_id = str(uuid.uuid4())
+        self.description = description
+        self.signature = signature
+        self.band_keys = band_keys
+        self.classification = classification
+        self.retrieval = retrieval
+        self.first_seen = now
+        self.last_seen = now
+        self.size = 0
+        self.ticket_ids = []
+
+    def add(self, ticket_id, now, max_ticket_ids):
+        self.size += 1
+        self.last_seen = now
+        if len(self.ticket_ids) < max_ticket_ids:
+            self.ticket_ids.append(ticket_id)
+
+    def summary(self) -> dict:
+        duration = self.last_seen - self.first_seen
+        return {
+            "incident_id": self.incident_id,
+            "size": self.size,
+            "category": self.classification.get("category"),
+            "priority": self.classification.get("priority"),
+            "solution_ids": [s.get("solution_id") for s in self.retrieval.get("solutions", [])],
+            "sample_description": self.description,
+            "first_seen": self.first_seen,
+            "last_seen": self.last_seen,
+            "tickets_per_minute": round(self.size / (duration / 60), 2) if duration > 0 else None,
+            # Every ticket after the first reused the incident's classification and solutions
+            "tickets_reused": self.size - 1,
+            "ticket_ids": list(self.ticket_ids),
+        }
+
+
+class IncidentClusterer:
+    """
+    Groups bursts of similar tickets into incidents over a sliding time window.
+
+    New tickets are compared against each open incident's first ticket with
+    MinHash LSH (the same signatures the classification cache uses for near
+    duplicates). A ticket whose estimated Jaccard similarity reaches
+    `similarity_threshold` joins that incident and reuses its classification
+    and solutions, so a surge costs one model round trip per incident instead
+    of one per ticket. Incidents with no new ticket for `window_seconds` are
+    closed; their summaries are kept in `closed` and passed to `on_close`.
+    """
+
+    def __init__(self, window_seconds=900.0, similarity_threshold=0.7, max_incidents=5000, max_ticket_ids=100,
+                 max_closed=100, minhasher=None, on_close=None, clock=time.time):
+        self.window_seconds = window_seconds
+        self.similarity_threshold = similarity_threshold
+        self.max_incidents = max_incidents
+        self.max_ticket_ids = max_ticket_ids
+        self.minhasher = minhasher or MinHasher()
+        self.on_close = on_close
+        self.clock = clock
+        # Ordered by last_seen, oldest first, so expiry only looks at the front
+        self._incidents = OrderedDict()
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.closed = deque(maxlen=max_closed)
+        self.stats = {"tickets": 0, "clustered": 0, "incidents_opened": 0, "incidents_closed": 0}
+
+    def match(self, ticket_id, ticket_description):
+        """
+        Adds the ticket to the most similar open incident and returns that
+        incident's summary, or returns None when no incident is close enough.
+        """
+        signature = self.minhasher.signature(normalize_text(ticket_description))
+        with self._lock:
+            closed = self._expire()
+            self.stats["tickets"] += 1
+            incident = self._best_match(signature)
+            if incident is not None:
+                self._attach(incident, ticket_id)
+                self.stats["clustered"] += 1
+                result = self._shared(incident)
+            else:
+                result = None
+        self._emit(closed)
+        return result
+
+    def open(self, ticket_id, ticket_description, classification, retrieval):
+        """
+        Starts an incident from a freshly processed ticket. If a similar incident
+        was opened while this ticket was being processed, the ticket joins it
+        instead. Returns the incident summary, or None if the result is not shareable.
+        """
+        if classification.get("classification_path") in UNSHAREABLE_PATHS:
+            return None
+        if retrieval.get("retrieval_path") in UNSHAREABLE_PATHS:
+            return None
+        signature = self.minhasher.signature(normalize_text(ticket_description))
+        with self._lock:
+            closed = self._expire()
+            incident = self._best_match(signature)
+            if incident is None:
+                incident = Incident(
+                    ticket_description, signature, self.minhasher.band_keys(signature),
+                    dict(classification), dict(retrieval), self.clock()
+                )
+                self._incidents[incident.incident_id] = incident
+                for band_key in incident.band_keys:
+                    self._buckets.setdefault(band_key, set()).add(incident.incident_id)
+                self.stats["incidents_opened"] += 1
+                while len(self._incidents) > self.max_incidents:
+                    closed.append(self._close(next(iter(self._incidents))))
+            self._attach(incident, ticket_id)
+            summary = incident.summary()
+        self._emit(closed)
+        return summary
+
+    def summaries(self) -> list:
+        with self._lock:
+            closed = self._expire()
+            summaries = [incident.summary() for incident in reversed(self._incidents.values())]
+        self._emit(closed)
+        return summaries
+
+    def _best_match(self, signature):
+        best, best_score = None, self.similarity_threshold
+        candidates = set()
+        for band_key in self.minhasher.band_keys(signature):
+            candidates |= self._buckets.get(band_key, set())
+        for incident_id in candidates:
+            incident = self._incidents[incident_id]
+            score = MinHasher.similarity(signature, incident.signature)
+            if score >= best_score:
+                best, best_score = incident, score
+        return best
+
+    def _attach(self, incident, ticket_id):
+        incident.add(ticket_id, self.clock(), self.max_ticket_ids)
+        self._incidents.move_to_end(incident.incident_id)
+
+    def _shared(self, incident):
+        summary = incident.summary()
+        summary["classification"] = dict(incident.classification)
+        solutions = [dict(s) for s in incident.retrieval.get("solutions", [])]
+        summary["retrieval"] = dict(incident.retrieval, solutions=solutions)
+        return summary
+
+    def _expire(self):
+        cutoff = self.clock() - self.window_seconds
+        closed = []
+        while self._incidents:
+            incident = next(iter(self._incidents.values()))
+            if incident.last_seen >= cutoff:
+                break
+            closed.append(self._close(incident.incident_id))
+        return closed
+
+    def _close(self, incident_id):
+        incident = self._incidents.pop(incident_id)
+        for band_key in incident.band_keys:
+            bucket = self._buckets.get(band_key)
+            if bucket:
+                bucket.discard(incident_id)
+                if not bucket:
+                    del self._buckets[band_key]
+        self.stats["incidents_closed"] += 1
+        return incident.summary()
+
+    def _emit(self, closed):
+        self.closed.extend(closed)
+        # Called outside the lock so a slow callback never blocks matching
+        if self.on_close is None:
+            return
+        for summary in closed:
+            try:
+                self.on_close(summary)
+            except Exception as e:
+                print(f"Incident summary callback failed: {e}")
@@ -0,0 +1,156 @@
+import time
+import uuid
+import asyncio
+import functools
+import contextvars
+from datetime import datetime, timezone
+
+# Gemini 2.0 Flash blended price used for cost estimates
+COST_PER_1K_TOKENS_USD = 0.0001
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class _NullSpan:
+    """
+    Stand-in returned by `current_span()` outside any span, so callers never need to check.
+    """
+    run_id = None
+    ticket_id = None
+    status = "ok"
+    cache_hit = None
+
+    def add_tokens(self, count):
+        pass
+
+    def add_bytes(self, count):
+        pass
+
+    def record_query(self, query_job):
+        pass
+
+    def __setattr__(self, name, value):
+        pass
+
+_NULL_SPAN = _NullSpan()
+
+
+def current_span():
+    return _current_span.get() or _NULL_SPAN
+
+
+def traced(agent_name):
+    """
+    Wraps an agent method (sync or async) in a span from `self.tracer`.
+
+    Code inside the method annotates the span through `current_span()`.
+    """
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(self, *args, **kwargs):
+                with self.tracer.span(agent_name, kwargs.get("ticket_id")):
+                    return await fn(self, *args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            with self.tracer.span(agent_name, kwargs.get("ticket_id")):
+                return fn(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Span:
+    """
+    One timed unit of work (an agent stage or a whole ticket) written as a row of agent_telemetry.
+    """
+
+    def __init__(self, tracer, agent_name, ticket_id=None, parent=None):
+        self.tracer = tracer
+        self.agent_name = agent_name
+        self.parent = parent
+        self.ticket_id = ticket_id or (parent.ticket_id if parent else None)
+        self.run_id = str(uuid.uuid4())
+        self.token_count = 0
+        self.bytes_processed = 0
+        self.cache_hit = None
+        self.status = "ok"
+        # Prompt tokens avoided by lexical ranking or prompt compaction
+        self.tokens_saved = 0
+        self._start = None
+        self._token = None
+        self.execution_time_ms = None
+
+    def add_tokens(self, count):
+        self.token_count += int(count or 0)
+
+    def add_bytes(self, count):
+        self.bytes_processed += int(count or 0)
+
+    def record_query(self, query_job):
+        """
+        Adds the bytes a finished BigQuery job processed (0 for cached or fake jobs).
+        """
+        self.add_bytes(getattr(query_job, "total_bytes_processed", 0) or 0)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.execution_time_ms = int((time.perf_counter() - self._start) * 1000)
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.status = "error"
+        self.tracer.export(self)
+        return False
+
+
+class Tracer:
+    """
+    Creates spans for agent stages and hands finished spans to a TelemetrySink.
+
+    Spans nest through a context variable, so a stage started while the
+    coordinator's span is active is linked to it via parent_run_id. Work
+    submitted to thread pools must be run with `contextvars.copy_context()`
+    to keep that link.
+    """
+
+    def __init__(self, sink=None, agent_version="v1.0.0"):
+        self.sink = sink
+        self.agent_version = agent_version
+
+    def span(self, agent_name, ticket_id=None):
+        return Span(self, agent_name, ticket_id=ticket_id, parent=_current_span.get())
+
+    def record(self, agent_name, ticket_id, execution_time_ms, token_count, **fields):
+        """
+        Writes a row for work that was timed elsewhere, e.g. a share of a batch call.
+        """
+        span = Span(self, agent_name, ticket_id=ticket_id, parent=_current_span.get())
+        span.execution_time_ms = execution_time_ms
+        span.token_count = token_count
+        for key, value in fields.items():
+            setattr(span, key, value)
+        self.export(span)
+
+    def export(self, span):
+        if self.sink is None:
+            return
+        self.sink.emit({
+            "run_id": span.run_id,
+            "parent_run_id": span.parent.run_id if span.parent else None,
+            "agent_name": span.agent_name,
+            "ticket_id": span.ticket_id or "",
+            "execution_time_ms": span.execution_time_ms,
+            "token_count": span.token_count,
+            "cost_usd": span.token_count * COST_PER_1K_TOKENS_USD / 1000,
+            "bytes_processed": span.bytes_processed,
+            "cache_hit": span.cache_hit,
+            "status": span.status,
+            "tokens_saved": span.tokens_saved,
+            "agent_version": self.agent_version,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        })
@@ -1,79 +1,384 @@
 import os
 import sys
 import json
-import google.generativeai as genai
-from google.cloud import bigquery
+import time
+import threading
+from agents.resources import SharedResources
+from agents.lexical import BM25Scorer, RerankPolicy
+from agents.rerank_prompt import RerankPromptBuilder
+from agents.candidate_cache import CandidateCache
+from agents.single_flight import SingleFlight
+from agents.cache import normalize_text
+from agents.concurrency import get_default_limits
+from agents.telemetry import TelemetrySink
+from agents.instrumentation import Tracer, traced, current_span
+from agents.structured_output import StructuredOutput, StructuredOutputError
+from agents.resilience import ResilientModel, get_default_resilience
+from agents.datastore import BigQueryStore
+
+RETRIEVAL_MODES = ("llm", "embedding")
+
+CACHE_ONLY_FIELDS = ("category", "last_updated")
+
+CANDIDATE_COLUMNS = ["solution_id", "category", "problem_description", "solution_text", "success_rate", "last_updated"]
+VECTOR_INDEX_COLUMNS = ["solution_id", "category", "problem_description", "solution_text", "success_rate", "embedding"]
+
+RERANK_SCHEMA = {"type": "array", "items": {"type": "string"}}
 
 class KnowledgeRetrieverAgent:
-    def __init__(self, project_id, api_key=None, credentials=None):
+    def __init__(self, project_id, api_key=None, credentials=None, retrieval_mode="llm", embedder=None,
+                 rerank_policy=None, limits=None, tracer=None, resources=None, resilience=None,
+                 prompt_builder=None, cache_candidates=True, candidate_refresh_seconds=300, store=None):
         self.project_id = project_id
-        if not api_key:
-            api_key = os.environ.get("GOOGLE_GENAI_API_KEY")
-        if api_key:
-            genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel("gemini-2.0-flash")
-        if credentials:
-            self.bq_client = bigquery.Client(project=project_id, credentials=credentials)
-        else:
-            self.bq_client = bigquery.Client(project=project_id)
+        self.resources = resources or SharedResources(project_id, api_key=api_key, credentials=credentials)
         self.dataset_id = "support_tickets_staging"
 
+        if retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"retrieval_mode must be one of {RETRIEVAL_MODES}, got '{retrieval_mode}'")
+        self.retrieval_mode = retrieval_mode
+        self.embedder = embedder
+        self._vector_indexes = None
+        self._index_loaded_at = None
+        # The vector index is rebuilt on the same schedule the candidate cache refreshes on
+        self.index_refresh_seconds = candidate_refresh_seconds
+        self._index_lock = threading.Lock()
+
+        self.rerank_policy = rerank_policy or RerankPolicy()
+        self.rerank_output = StructuredOutput(RERANK_SCHEMA)
+        self.prompt_builder = prompt_builder or RerankPromptBuilder()
+        # knowledge_base is small and slow-changing, so candidates are served from memory
+        self.candidates = CandidateCache(
+            self._load_candidate_rows, self._load_changed_candidate_rows,
+            refresh_interval_seconds=candidate_refresh_seconds
+        ) if cache_candidates else None
+        # Concurrent identical retrievals share one candidate query and one re-rank call
+        self.inflight = SingleFlight("retriever")
+        self.rerank_stats = {"requests": 0, "llm_calls": 0, "llm_tokens": 0, "estimated_tokens_saved": 0}
+        self._stats_lock = threading.Lock()
+        self.limits = limits or get_default_limits()
+        self.resilience = resilience or get_default_resilience()
+        # Where knowledge_base is read from: BigQuery by default, or a local SQLiteStore
+        self.store = store or BigQueryStore(
+            lambda: self.bq_client, project_id, self.dataset_id, caller=self.resilience.bigquery
+        )
+        self.tracer = tracer or Tracer(
+            TelemetrySink(lambda: self.bq_client, f"{project_id}.{self.dataset_id}.agent_telemetry")
+        )
+
+    @property
+    def model(self):
+        return self.resources.model
+
+    @property
+    def bq_client(self):
+        return self.resources.bq_client
+
+    @property
+    def resilient_model(self):
+        return ResilientModel(self.model, self.resilience.gemini)
+
+    def load_vector_index(self) -> int:
+        """
+        Loads the whole knowledge base and builds one in-memory vector index per category.
+        """
+        from agents.embeddings import HashingEmbedder, build_category_indexes
+
+        if self.embedder is None:
+            self.embedder = HashingEmbedder()
+        rows = self.store.knowledge_base(VECTOR_INDEX_COLUMNS)
+        self._vector_indexes = build_category_indexes(rows, self.embedder)
+        self._index_loaded_at = time.monotonic()
+        return len(rows)
+
+    def _index_stale(self):
+        if self._vector_indexes is None or self._index_loaded_at is None:
+            return True
+        return time.monotonic() - self._index_loaded_at > self.index_refresh_seconds
+
+    def _retrieve_by_embedding(self, ticket_description, category, top_k):
+        self._ensure_vector_index()
+        return self._search_index(category, top_k, self.embedder.embed_query(ticket_description))
+
+    def _ensure_vector_index(self):
+        stale = self._index_stale()
+        current_span().cache_hit = not stale
+        if stale:
+            with self._index_lock:
+                if self._index_stale():
+                    self._refresh_vector_index()
+
+    def _refresh_vector_index(self):
+        if self._vector_indexes is None:
+            self.load_vector_index()
+            return
+        try:
+            self.load_vector_index()
+        except Exception as e:
+            # Keep serving the previous index; try again after another interval
+            print(f"Vector index refresh failed, keeping the previous index: {e}")
+            self._index_loaded_at = time.monotonic()
+
+    def _search_index(self, category, top_k, query_vector):
+        index = self._vector_indexes.get(category)
+        if index is None:
+            return []
+        return [
+            {k: v for k, v in row.items() if k != "category"}
+            for row, score in index.search(query_vector, top_k)
+        ]
+
     def retrieve_solutions(self, ticket_description: str, category: str, top_k: int = 3) -> list:
         """
-        Retrieves relevant solutions from BigQuery and ranks them using Gemini.
+        Retrieves relevant solutions for a ticket. See `retrieve` for the ranking details.
         """
-        # 1. Query BigQuery for candidates
-        query = f"""
-            SELECT solution_id, problem_description, solution_text, success_rate
-            FROM `{self.project_id}.{self.dataset_id}.knowledge_base`
-            WHERE category = @category
-            ORDER BY success_rate DESC
-            LIMIT {top_k * 3}
+        return self.retrieve(ticket_description, category, top_k)["solutions"]
+
+    @traced("retriever")
+    def retrieve(self, ticket_description: str, category: str, top_k: int = 3) -> dict:
         """
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("category", "STRING", category),
-            ]
-        )
-        
+        Retrieves relevant solutions from BigQuery and ranks them.
+
+        Candidates are scored with BM25 first; Gemini is only asked to re-rank
+        when the rerank policy finds the lexical ranking ambiguous. In embedding
+        mode the candidates come from an in-memory cosine search instead.
+
+        Returns the solutions together with the path taken ("embedding",
+        "lexical", "llm_rerank", "no_candidates" or, when the dependencies are
+        failing, "lexical_fallback", "embedding_fallback" or "fallback") and the
+        token and latency accounting.
+        """
+        info = self._new_info()
+
+        if self.retrieval_mode == "embedding":
+            return self._retrieve_embedding_info(ticket_description, category, top_k, info)
+
         try:
-            query_job = self.bq_client.query(query, job_config=job_config)
-            candidates = [dict(row) for row in query_job]
-            
-            if not candidates:
-                return []
-                
-            # 2. Use Gemini to rank candidates
-            prompt = f"""
-            Rank the following solutions by relevance to this support ticket:
-            Ticket: {ticket_description}
-
-            Solutions:
-            {json.dumps(candidates, indent=2)}
-
-            Return ONLY a JSON list of solution_ids in order of relevance, 
-            limited to the top {top_k} results.
-            """
-            
-            response = self.model.generate_content(prompt)
-            text = response.text.strip()
-            if "```json" in text:
-                text = text.split("```json")[1].split("```")[0].strip()
-            elif "```" in text:
-                text = text.split("```")[1].split("```")[0].strip()
-            
-            ordered_ids = json.loads(text)
-            
-            # Map back to full dictionary
-            id_to_solution = {c["solution_id"]: c for c in candidates}
-            results = [id_to_solution[sid] for sid in ordered_ids if sid in id_to_solution]
-
-            
-            return results[:top_k]
-            
+            # 1. Query BigQuery for candidates
+            candidates = self._fetch_candidates(category, top_k)
+
+            # 2. Lexical ranking decides whether Gemini is needed at all
+            prompt = self._rank_lexically(ticket_description, candidates, top_k, info)
+            if prompt is None:
+                return info
+
+            # 3. Ambiguous: use Gemini to rank candidates
+            rerank_start = time.time()
+            flight = self.inflight.join(self._rerank_key(ticket_description, category, top_k, prompt))
+            ordered_ids, token_count = flight.run(
+                self.rerank_output.generate, self.resilient_model, prompt.text, prompt.schema
+            )
+            self._apply_llm_ranking(ordered_ids, token_count, prompt, top_k, info, rerank_start, flight.shared)
+            return info
+
+        except StructuredOutputError as e:
+            self._keep_lexical_ranking(e, info, rerank_start, flight.shared)
+            return info
         except Exception as e:
             print(f"Error in retrieval: {e}")
-            return []
+            current_span().status = "error"
+            return self._degrade(ticket_description, category, top_k, info)
+        finally:
+            self._record_rerank_stats(info)
+
+    @traced("retriever")
+    async def aretrieve(self, ticket_description: str, category: str, top_k: int = 3) -> dict:
+        """
+        Async variant of `retrieve`: BigQuery runs on the blocking executor and
+        the re-rank uses Gemini's async API.
+        """
+        info = self._new_info()
+
+        if self.retrieval_mode == "embedding":
+            return await self._aretrieve_embedding_info(ticket_description, category, top_k, info)
+
+        try:
+            candidates = await self.limits.run_blocking("bigquery", self._fetch_candidates, category, top_k)
+
+            prompt = self._rank_lexically(ticket_description, candidates, top_k, info)
+            if prompt is None:
+                return info
+
+            rerank_start = time.time()
+            flight = self.inflight.ajoin(self._rerank_key(ticket_description, category, top_k, prompt))
+            ordered_ids, token_count = await flight.arun(
+                self.rerank_output.agenerate, self.limits.call_gemini, self.resilient_model, prompt.text,
+                prompt.schema
+            )
+            self._apply_llm_ranking(ordered_ids, token_count, prompt, top_k, info, rerank_start, flight.shared)
+            return info
+
+        except StructuredOutputError as e:
+            self._keep_lexical_ranking(e, info, rerank_start, flight.shared)
+            return info
+        except Exception as e:
+            print(f"Error in retrieval: {e}")
+            current_span().status = "error"
+            return self._degrade(ticket_description, category, top_k, info)
+        finally:
+            self._record_rerank_stats(info)
+
+    def _new_info(self):
+        return {
+            "solutions": [],
+            "retrieval_path": self.retrieval_mode,
+            "llm_called": False,
+            "llm_tokens": 0,
+            "estimated_tokens_saved": 0,
+            "rerank_latency_ms": 0,
+        }
+
+    def _retrieve_embedding_info(self, ticket_description, category, top_k, info):
+        info["retrieval_path"] = "embedding"
+        try:
+            info["solutions"] = self._retrieve_by_embedding(ticket_description, category, top_k)
+        except Exception as e:
+            self._embedding_failed(e)
+        return info
+
+    async def _aretrieve_embedding_info(self, ticket_description, category, top_k, info):
+        """
+        Reloading the index reads BigQuery, so it runs under the BigQuery limit.
+        The query is embedded under the limit of the embedder's own dependency
+        (Gemini for GeminiEmbedder), or inline for a local embedder.
+        """
+        info["retrieval_path"] = "embedding"
+        try:
+            if self._index_stale():
+                await self.limits.run_blocking("bigquery", self._ensure_vector_index)
+            else:
+                current_span().cache_hit = True
+            dependency = getattr(self.embedder, "dependency", None)
+            if dependency is None:
+                query_vector = self.embedder.embed_query(ticket_description)
+            else:
+                query_vector = await self.limits.run_blocking(dependency, self.embedder.embed_query, ticket_description)
+            info["solutions"] = self._search_index(category, top_k, query_vector)
+        except Exception as e:
+            self._embedding_failed(e)
+        return info
+
+    def _embedding_failed(self, e):
+        from agents.embeddings import EmbeddingMismatchError
+        if isinstance(e, EmbeddingMismatchError):
+            # A configuration error, not an outage: don't hide it behind empty results
+            raise e
+        print(f"Error in embedding retrieval: {e}")
+        current_span().status = "error"
+
+    def warm_candidates(self) -> int:
+        """
+        Loads the candidate cache now so the first ticket does not pay for it.
+        """
+        return self.candidates.warm() if self.candidates is not None else 0
+
+    def invalidate_candidates(self):
+        """
+        Signals that knowledge_base changed and should be fully reloaded.
+        """
+        if self.candidates is not None:
+            self.candidates.invalidate()
+        self._index_loaded_at = None
+
+    def _fetch_candidates(self, category, top_k):
+        if self.candidates is not None:
+            current_span().cache_hit = self.candidates.loaded
+            # Same fields the per-category query returned
+            return [
+                {k: v for k, v in row.items() if k not in CACHE_ONLY_FIELDS}
+                for row in self.candidates.get(category, top_k * 3)
+            ]
+        rows = self.inflight.do(("candidates", category, top_k), self._query_candidates, category, top_k)
+        # The row list may be shared with other requests
+        return [dict(row) for row in rows]
+
+    def _load_candidate_rows(self):
+        return self.store.knowledge_base(CANDIDATE_COLUMNS)
+
+    def _load_changed_candidate_rows(self, since):
+        return self.store.knowledge_base(CANDIDATE_COLUMNS, since=since)
+
+    def _query_candidates(self, category, top_k):
+        return self.store.top_solutions(category, top_k * 3)
+
+    def _rank_lexically(self, ticket_description, candidates, top_k, info):
+        """
+        Ranks candidates with BM25. Returns the RerankPrompt when Gemini should
+        be consulted, or None when `info` already holds the final solutions.
+        """
+        if not candidates:
+            info["retrieval_path"] = "no_candidates"
+            return None
+
+        # Stable sort keeps success_rate order on ties
+        scores = BM25Scorer.from_rows(candidates).score(ticket_description)
+        ranked = [c for _, c in sorted(zip(scores, candidates), key=lambda pair: -pair[0])]
+        info["lexical_margin"] = round(RerankPolicy.margin(scores), 4)
+
+        # Built from the lexical order so the token budget drops the weakest candidates
+        prompt = self.prompt_builder.build(ticket_description, ranked, top_k)
+        if not self.rerank_policy.needs_llm(scores):
+            info["retrieval_path"] = "lexical"
+            info["estimated_tokens_saved"] = prompt.estimated_tokens
+            current_span().tokens_saved = prompt.estimated_tokens
+            info["solutions"] = ranked[:top_k]
+            return None
+
+        info["retrieval_path"] = "llm_rerank"
+        info["llm_called"] = True
+        info["prompt_tokens_estimate"] = prompt.estimated_tokens
+        info["candidates_sent"] = prompt.candidates_sent
+        info["estimated_tokens_saved"] = prompt.tokens_saved
+        current_span().tokens_saved = prompt.tokens_saved
+        # Served as-is if the re-rank response turns out to be unusable
+        info["solutions"] = ranked[:top_k]
+        return prompt
+
+    def _rerank_key(self, ticket_description, category, top_k, prompt):
+        # Includes the candidate ids so a shared answer's aliases always map to the same rows
+        solution_ids = tuple(row.get("solution_id") for row in prompt.aliases.values())
+        return category, top_k, normalize_text(ticket_description), solution_ids
+
+    def _apply_llm_ranking(self, ordered_aliases, token_count, prompt, top_k, info, rerank_start, shared=False):
+        info["rerank_latency_ms"] = int((time.time() - rerank_start) * 1000)
+        # Coalesced requests reuse another request's answer and spend no tokens of their own
+        token_count = 0 if shared else token_count
+        info["coalesced"] = shared
+        info["llm_tokens"] = token_count
+        current_span().add_tokens(token_count)
+
+        # Map the short aliases back to the full candidate rows
+        info["solutions"] = prompt.resolve(ordered_aliases)[:top_k]
+
+    def _keep_lexical_ranking(self, error, info, rerank_start, shared=False):
+        print(f"Unusable re-rank response after repair, keeping lexical order: {'; '.join(error.errors)}")
+        token_count = 0 if shared else error.token_count
+        info["rerank_latency_ms"] = int((time.time() - rerank_start) * 1000)
+        info["llm_tokens"] = token_count
+        info["retrieval_path"] = "lexical_fallback"
+        current_span().add_tokens(token_count)
+
+    def _degrade(self, ticket_description, category, top_k, info):
+        """
+        Serves the best local answer when Gemini or BigQuery is failing or its circuit is open.
+        """
+        if info["solutions"]:
+            # Candidates were fetched and BM25-ranked before the model call failed
+            info["retrieval_path"] = "lexical_fallback"
+        elif self._vector_indexes is not None:
+            info["solutions"] = self._search_index(category, top_k, self.embedder.embed_query(ticket_description))
+            info["retrieval_path"] = "embedding_fallback"
+        else:
+            # Nothing to serve; must not be reported as an LLM retrieval
+            info["retrieval_path"] = "fallback"
+            info["llm_called"] = False
+        return info
+
+    def _record_rerank_stats(self, info):
+        with self._stats_lock:
+            self.rerank_stats["requests"] += 1
+            self.rerank_stats["llm_calls"] += int(info["llm_called"] and not info.get("coalesced"))
+            self.rerank_stats["llm_tokens"] += info["llm_tokens"]
+            self.rerank_stats["estimated_tokens_saved"] += info["estimated_tokens_saved"]
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
@@ -0,0 +1,82 @@
+import re
+import math
+from collections import Counter
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Scorer:
+    """
+    Okapi BM25 over knowledge base rows (problem_description + solution_text).
+    """
+
+    def __init__(self, documents: list, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_terms = [Counter(tokenize(doc)) for doc in documents]
+        self.doc_lengths = [sum(terms.values()) for terms in self.doc_terms]
+        self.avg_length = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+        doc_freq = Counter()
+        for terms in self.doc_terms:
+            doc_freq.update(terms.keys())
+        n = len(documents)
+        self.idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in doc_freq.items()
+        }
+
+    @classmethod
+    def from_rows(cls, rows: list, **kwargs):
+        return cls([f"{row['problem_description']} {row['solution_text']}" for row in rows], **kwargs)
+
+    def score(self, query: str) -> list:
+        query_terms = set(tokenize(query))
+        scores = []
+        for terms, length in zip(self.doc_terms, self.doc_lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / (self.avg_length or 1.0))
+            total = 0.0
+            for term in query_terms:
+                tf = terms.get(term)
+                if tf:
+                    total += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            scores.append(total)
+        return scores
+
+
+class RerankPolicy:
+    """
+    Decides whether the lexical ranking is confident enough to skip the Gemini re-rank.
+
+    mode "auto" calls the LLM only when the top lexical score is weak or the
+    margin to the runner-up is small; "always" and "never" force one path.
+    """
+    MODES = ("auto", "always", "never")
+
+    def __init__(self, mode: str = "auto", min_margin: float = 0.15, min_top_score: float = 0.0):
+        if mode not in self.MODES:
+            raise ValueError(f"mode must be one of {self.MODES}, got '{mode}'")
+        self.mode = mode
+        self.min_margin = min_margin
+        self.min_top_score = min_top_score
+
+    def needs_llm(self, scores: list) -> bool:
+        if self.mode != "auto":
+            return self.mode == "always"
+        if len(scores) < 2:
+            return False
+        ranked = sorted(scores, reverse=True)
+        top, runner_up = ranked[0], ranked[1]
+        if top <= self.min_top_score:
+            return True
+        return (top - runner_up) / top < self.min_margin
+
+    @staticmethod
+    def margin(scores: list) -> float:
+        if len(scores) < 2:
+            return 1.0
+        ranked = sorted(scores, reverse=True)
+        return (ranked[0] - ranked[1]) / ranked[0] if ranked[0] > 0 else 0.0
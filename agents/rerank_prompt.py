@@ -0,0 +1,112 @@
+import json
+
+# Same rough estimate the classifier uses for batch sizing (~4 characters per token)
+CHARS_PER_TOKEN = 4
+
+RERANK_HEADER = (
+    "Rank these candidate solutions by relevance to the support ticket.\n"
+    "Ticket: {ticket}\n"
+    "Candidates (id | problem | solution):\n"
+)
+RERANK_FOOTER = "Return ONLY a JSON array of candidate ids (strings), most relevant first, at most {top_k}."
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate(text, max_chars):
+    text = " ".join(str(text or "").split())
+    if len(text) <= max_chars:
+        return text
+    # Cut at a word boundary and mark the elision
+    cut = text[:max_chars - 1].rsplit(" ", 1)[0]
+    return cut + "…"
+
+
+class RerankPrompt:
+    """
+    A built re-rank prompt plus what is needed to map the answer back.
+    """
+
+    def __init__(self, text, aliases, estimated_tokens, baseline_tokens, candidates_sent, candidates_dropped):
+        self.text = text
+        # Short alias ("1", "2", ...) -> full candidate row
+        self.aliases = aliases
+        self.estimated_tokens = estimated_tokens
+        self.baseline_tokens = baseline_tokens
+        self.candidates_sent = candidates_sent
+        self.candidates_dropped = candidates_dropped
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.baseline_tokens - self.estimated_tokens)
+
+    @property
+    def schema(self) -> dict:
+        # Constrain the answer to aliases we actually sent
+        return {"type": "array", "items": {"type": "string", "format": "enum", "enum": list(self.aliases)}}
+
+    def resolve(self, ordered_aliases) -> list:
+        seen, rows = set(), []
+        for alias in ordered_aliases:
+            alias = str(alias)
+            if alias in self.aliases and alias not in seen:
+                seen.add(alias)
+                rows.append(self.aliases[alias])
+        return rows
+
+
+class RerankPromptBuilder:
+    """
+    Builds a compact, token-budgeted re-rank prompt.
+
+    Candidates are written one per line with integer aliases instead of UUIDs,
+    whitespace-collapsed and truncated text, and no success_rate. They are
+    added in the given (lexical) order until `max_prompt_tokens` is reached,
+    so the budget drops the weakest candidates first.
+    """
+
+    def __init__(self, max_prompt_tokens=600, max_problem_chars=120, max_solution_chars=160,
+                 max_ticket_chars=600):
+        self.max_prompt_tokens = max_prompt_tokens
+        self.max_problem_chars = max_problem_chars
+        self.max_solution_chars = max_solution_chars
+        self.max_ticket_chars = max_ticket_chars
+
+    def build(self, ticket_description, candidates, top_k) -> RerankPrompt:
+        header = RERANK_HEADER.format(ticket=truncate(ticket_description, self.max_ticket_chars))
+        footer = RERANK_FOOTER.format(top_k=top_k)
+        used = len(header) + len(footer)
+        budget_chars = self.max_prompt_tokens * CHARS_PER_TOKEN
+
+        lines, aliases = [], {}
+        for candidate in candidates:
+            alias = str(len(aliases) + 1)
+            line = (
+                f"{alias} | {truncate(candidate.get('problem_description'), self.max_problem_chars)}"
+                f" | {truncate(candidate.get('solution_text'), self.max_solution_chars)}\n"
+            )
+            # Always send at least top_k candidates so the model has something to rank
+            if used + len(line) > budget_chars and len(aliases) >= top_k:
+                break
+            lines.append(line)
+            aliases[alias] = candidate
+            used += len(line)
+
+        text = header + "".join(lines) + footer
+        return RerankPrompt(
+            text=text,
+            aliases=aliases,
+            estimated_tokens=estimate_tokens(text),
+            baseline_tokens=self.baseline_tokens(ticket_description, candidates, top_k),
+            candidates_sent=len(aliases),
+            candidates_dropped=len(candidates) - len(aliases),
+        )
+
+    def baseline_tokens(self, ticket_description, candidates, top_k) -> int:
+        """
+        Estimated size of the previous prompt, which embedded the rows as indented JSON.
+        """
+        rows = json.dumps(candidates, indent=2, default=str)
+        return estimate_tokens(ticket_description) + estimate_tokens(rows) + 60
@@ -0,0 +1,335 @@
+import os
+import time
+import random
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# HTTP status codes worth retrying; google.api_core exceptions expose these as `.code`
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised without calling the dependency while its circuit breaker is open.
+    """
+
+
+class DeadlineExceededError(TimeoutError):
+    """
+    Raised when a single attempt runs past its per-call deadline.
+    """
+
+
+def is_transient(exc) -> bool:
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    code = getattr(exc, "code", None)
+    # grpc-style codes are enums; only plain HTTP integers are compared here
+    return isinstance(code, int) and code in TRANSIENT_STATUS_CODES
+
+
+class CircuitBreaker:
+    """
+    Classic closed / open / half-open breaker.
+
+    Opens after `failure_threshold` consecutive transient failures, rejects
+    calls for `reset_timeout_seconds`, then lets `half_open_max_calls` trial
+    calls through; one success closes it again, one failure reopens it.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout_seconds=30.0, half_open_max_calls=1):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self.state = "closed"
+        self.opened_count = 0
+        self._failures = 0
+        self._opened_at = None
+        self._half_open_calls = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.reset_timeout_seconds:
+                    return False
+                self.state = "half_open"
+                self._half_open_calls = 0
+            if self.state == "half_open":
+                if self._half_open_calls >= self.half_open_max_calls:
+                    return False
+                self._half_open_calls += 1
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self.state = "closed"
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.opened_count += 1
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with full jitter, bounded by attempts and a total latency budget.
+    """
+
+    def __init__(self, max_attempts=3, base_delay_seconds=0.2, max_delay_seconds=2.0, budget_seconds=20.0,
+                 rng=None):
+        self.max_attempts = max_attempts
+        self.base_delay_seconds = base_delay_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.budget_seconds = budget_seconds
+        self._rng = rng or random.Random()
+
+    def backoff(self, attempt) -> float:
+        return self._rng.uniform(0, min(self.max_delay_seconds, self.base_delay_seconds * 2 ** (attempt - 1)))
+
+    def should_retry(self, attempt, elapsed, delay) -> bool:
+        return attempt < self.max_attempts and elapsed + delay < self.budget_seconds
+
+
+class ResilientCall:
+    """
+    Wraps calls to one dependency with a per-attempt deadline, jittered retry
+    of transient errors, optional hedging and a circuit breaker.
+
+    Deadlines and hedges on the sync path need a worker thread per attempt; a
+    timed-out attempt keeps running in the background and its result is dropped.
+    Hedging should only be enabled for idempotent calls.
+    """
+
+    _executor = ThreadPoolExecutor(max_workers=64, thread_name_prefix="resilience")
+
+    def __init__(self, name, retry=None, breaker=None, deadline_seconds=None, hedge_after_seconds=None):
+        self.name = name
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.deadline_seconds = deadline_seconds
+        self.hedge_after_seconds = hedge_after_seconds
+        self.stats = {
+            "calls": 0, "successes": 0, "failures": 0, "retries": 0, "timeouts": 0,
+            "hedges": 0, "hedge_wins": 0, "short_circuited": 0,
+        }
+        self._lock = threading.Lock()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["breaker_state"] = self.breaker.state
+        stats["breaker_opened"] = self.breaker.opened_count
+        return stats
+
+    def call(self, fn, *args, **kwargs):
+        self._admit()
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = self._attempt(fn, args, kwargs)
+            except Exception as e:
+                delay = self._on_failure(e, attempt, start)
+                time.sleep(delay)
+                continue
+            return self._on_success(result)
+
+    async def acall(self, fn, *args, **kwargs):
+        """
+        Async variant of `call`; `fn` must return an awaitable.
+        """
+        self._admit()
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                result = await self._aattempt(fn, args, kwargs)
+            except Exception as e:
+                delay = self._on_failure(e, attempt, start)
+                await asyncio.sleep(delay)
+                continue
+            return self._on_success(result)
+
+    def _admit(self):
+        self._count("calls")
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+    def _on_success(self, result):
+        self.breaker.record_success()
+        self._count("successes")
+        return result
+
+    def _on_failure(self, exc, attempt, start):
+        """
+        Returns the delay before the next attempt, or re-raises when giving up.
+        """
+        if isinstance(exc, TimeoutError):
+            self._count("timeouts")
+        if not is_transient(exc):
+            # The dependency answered (e.g. a 400), so it counts as healthy for the breaker
+            self.breaker.record_success()
+            self._count("failures")
+            raise exc
+        self.breaker.record_failure()
+        delay = self.retry.backoff(attempt)
+        if self.breaker.state == "open" or not self.retry.should_retry(attempt, time.monotonic() - start, delay):
+            self._count("failures")
+            raise exc
+        self._count("retries")
+        return delay
+
+    def _attempt(self, fn, args, kwargs):
+        if self.deadline_seconds is None and self.hedge_after_seconds is None:
+            return fn(*args, **kwargs)
+
+        deadline = time.monotonic() + self.deadline_seconds if self.deadline_seconds else None
+        # Each attempt gets its own context copy so spans stay linked to the caller
+        primary = self._executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+        futures = [primary]
+        if self.hedge_after_seconds is not None:
+            done, _ = wait(futures, timeout=self._remaining(deadline, self.hedge_after_seconds))
+            if not done and self._remaining(deadline) != 0:
+                self._count("hedges")
+                futures.append(self._executor.submit(contextvars.copy_context().run, fn, *args, **kwargs))
+
+        while futures:
+            done, pending = wait(futures, timeout=self._remaining(deadline), return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceededError(f"{self.name} call exceeded {self.deadline_seconds}s")
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        self._count("hedge_wins")
+                    return future.result()
+            futures = list(pending)
+            if not futures:
+                raise done.pop().exception()
+
+    async def _aattempt(self, fn, args, kwargs):
+        if self.hedge_after_seconds is None:
+            if self.deadline_seconds is None:
+                return await fn(*args, **kwargs)
+            try:
+                return await asyncio.wait_for(fn(*args, **kwargs), self.deadline_seconds)
+            except asyncio.TimeoutError:
+                raise DeadlineExceededError(f"{self.name} call exceeded {self.deadline_seconds}s")
+
+        deadline = time.monotonic() + self.deadline_seconds if self.deadline_seconds else None
+        primary = asyncio.ensure_future(fn(*args, **kwargs))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self._remaining(deadline, self.hedge_after_seconds))
+            if not done and self._remaining(deadline) != 0:
+                self._count("hedges")
+                tasks.add(asyncio.ensure_future(fn(*args, **kwargs)))
+            while tasks:
+                done, tasks = await asyncio.wait(
+                    tasks, timeout=self._remaining(deadline), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    raise DeadlineExceededError(f"{self.name} call exceeded {self.deadline_seconds}s")
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self._count("hedge_wins")
+                        return task.result()
+                if not tasks:
+                    raise done.pop().exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _remaining(self, deadline, cap=None):
+        if deadline is None:
+            return cap
+        remaining = max(0.0, deadline - time.monotonic())
+        return remaining if cap is None else min(cap, remaining)
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+
+class ResilientModel:
+    """
+    Gemini model proxy that routes both generate calls through a ResilientCall.
+    """
+
+    def __init__(self, model, caller):
+        self.model = model
+        self.caller = caller
+
+    def generate_content(self, *args, **kwargs):
+        return self.caller.call(self.model.generate_content, *args, **kwargs)
+
+    async def generate_content_async(self, *args, **kwargs):
+        return await self.caller.acall(self.model.generate_content_async, *args, **kwargs)
+
+
+def run_query(client, query, job_config=None):
+    """
+    Runs a query and materializes the rows, so retries and deadlines cover the
+    whole round trip rather than just job submission. Returns (job, rows).
+    """
+    query_job = client.query(query, job_config=job_config) if job_config else client.query(query)
+    return query_job, [dict(row) for row in query_job]
+
+
+class Resilience:
+    """
+    One ResilientCall per external dependency, shared by every agent in the process.
+    """
+
+    def __init__(self, gemini=None, bigquery=None):
+        self.gemini = gemini or ResilientCall("gemini", deadline_seconds=20.0)
+        self.bigquery = bigquery or ResilientCall(
+            "bigquery", retry=RetryPolicy(budget_seconds=15.0), deadline_seconds=10.0
+        )
+
+    @classmethod
+    def from_env(cls):
+        def build(name, deadline, budget):
+            prefix = name.upper()
+            hedge = os.environ.get(f"{prefix}_HEDGE_AFTER_SECONDS")
+            return ResilientCall(
+                name,
+                retry=RetryPolicy(
+                    max_attempts=int(os.environ.get(f"{prefix}_RETRY_MAX_ATTEMPTS", "3")),
+                    budget_seconds=float(os.environ.get(f"{prefix}_RETRY_BUDGET_SECONDS", str(budget))),
+                ),
+                breaker=CircuitBreaker(
+                    failure_threshold=int(os.environ.get(f"{prefix}_BREAKER_FAILURE_THRESHOLD", "5")),
+                    reset_timeout_seconds=float(os.environ.get(f"{prefix}_BREAKER_RESET_SECONDS", "30")),
+                ),
+                deadline_seconds=float(os.environ.get(f"{prefix}_DEADLINE_SECONDS", str(deadline))),
+                hedge_after_seconds=float(hedge) if hedge else None,
+            )
+
+        return cls(gemini=build("gemini", 20.0, 20.0), bigquery=build("bigquery", 10.0, 15.0))
+
+    def stats(self) -> dict:
+        return {"gemini": self.gemini.snapshot(), "bigquery": self.bigquery.snapshot()}
+
+
+_default_resilience = None
+
+def get_default_resilience() -> Resilience:
+    """
+    Process-wide resilience policies shared by all agents that were not given their own.
+    """
+    global _default_resilience
+    if _default_resilience is None:
+        _default_resilience = Resilience.from_env()
+    return _default_resilience
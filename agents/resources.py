@@ -0,0 +1,121 @@
+import os
+import time
+import threading
+from agents.startup import profiler
+
+DEFAULT_MODEL_NAME = "gemini-2.0-flash"
+
+_configured_api_key = None
+_configure_lock = threading.Lock()
+
+
+def configure_genai(api_key):
+    """
+    Calls the process-global `genai.configure` once per API key.
+    """
+    global _configured_api_key
+    if not api_key or api_key == _configured_api_key:
+        return
+    with _configure_lock:
+        if api_key != _configured_api_key:
+            profiler.import_module("google.generativeai").configure(api_key=api_key)
+            _configured_api_key = api_key
+
+
+class SharedResources:
+    """
+    Clients shared by all agents: one pooled BigQuery client and one Gemini model handle.
+
+    Both are created lazily on first use and then reused for every request
+    served by the process, so a cold start pays for each client once instead
+    of once per agent. `init_timings_ms` records how long each one took.
+
+    The Gemini and BigQuery SDKs are only imported when their client is first
+    needed, which keeps them out of the import path of the API module.
+    """
+
+    def __init__(self, project_id, api_key=None, credentials=None, model_name=DEFAULT_MODEL_NAME,
+                 pool_maxsize: int = 32):
+        self.project_id = project_id
+        self.api_key = api_key or os.environ.get("GOOGLE_GENAI_API_KEY")
+        self.credentials = credentials
+        self.model_name = model_name
+        self.pool_maxsize = pool_maxsize
+        self.init_timings_ms = {}
+        self._bq_client = None
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def bq_client(self):
+        if self._bq_client is None:
+            with self._lock:
+                if self._bq_client is None:
+                    start = time.perf_counter()
+                    self._bq_client = self._build_bq_client()
+                    self.init_timings_ms["bq_client"] = round((time.perf_counter() - start) * 1000, 2)
+        return self._bq_client
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    start = time.perf_counter()
+                    self._model = self._build_model()
+                    self.init_timings_ms["model"] = round((time.perf_counter() - start) * 1000, 2)
+        return self._model
+
+    def _build_model(self):
+        genai = profiler.import_module("google.generativeai")
+        configure_genai(self.api_key)
+        return genai.GenerativeModel(self.model_name)
+
+    def _build_bq_client(self):
+        bigquery = profiler.import_module("google.cloud.bigquery")
+        http = self._build_http_session(bigquery)
+        if http is None:
+            if self.credentials:
+                return bigquery.Client(project=self.project_id, credentials=self.credentials)
+            return bigquery.Client(project=self.project_id)
+        return bigquery.Client(project=self.project_id, credentials=self.credentials, _http=http)
+
+    def _build_http_session(self, bigquery):
+        """
+        Authorized session whose connection pool matches our request concurrency
+        (requests defaults to 10 pooled connections per host).
+        """
+        try:
+            import google.auth
+            from google.auth.transport.requests import AuthorizedSession
+            from requests.adapters import HTTPAdapter
+
+            credentials = self.credentials
+            if credentials is None:
+                credentials, _ = google.auth.default(scopes=bigquery.Client.SCOPE)
+            elif getattr(credentials, "requires_scopes", False):
+                credentials = credentials.with_scopes(bigquery.Client.SCOPE)
+            session = AuthorizedSession(credentials)
+            # No transport retries: ResilientCall owns retries, so they stay inside its attempt and deadline budget
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_maxsize, max_retries=0)
+            session.mount("https://", adapter)
+            return session
+        except Exception as e:
+            # Fall back to the client's own default session
+            print(f"Could not build pooled BigQuery session: {e}")
+            return None
+
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def get_shared_resources(project_id, api_key=None, credentials=None, **kwargs) -> SharedResources:
+    """
+    Returns the process-wide SharedResources for these settings, creating it on first use.
+    """
+    key = (project_id, api_key, id(credentials) if credentials is not None else None)
+    with _shared_lock:
+        if key not in _shared:
+            _shared[key] = SharedResources(project_id, api_key=api_key, credentials=credentials, **kwargs)
+        return _shared[key]
@@ -1,59 +1,148 @@
 import os
 import sys
 import json
-from google.cloud import bigquery
+import time
+import threading
+from agents.resources import SharedResources
+from agents.concurrency import get_default_limits
+from agents.telemetry import TelemetrySink
+from agents.instrumentation import Tracer, traced, current_span
+from agents.resilience import get_default_resilience
+from agents.datastore import BigQueryStore
 
 class RouterAgent:
-    def __init__(self, project_id, credentials=None):
+    def __init__(self, project_id, credentials=None, rules_ttl_seconds=300, background_refresh=True,
+                 limits=None, tracer=None, resources=None, resilience=None, store=None):
         self.project_id = project_id
-        if credentials:
-            self.bq_client = bigquery.Client(project=project_id, credentials=credentials)
-        else:
-            self.bq_client = bigquery.Client(project=project_id)
+        self.resources = resources or SharedResources(project_id, credentials=credentials)
         self.dataset_id = "support_tickets_staging"
 
-    def route_ticket(self, category: str, priority: str) -> dict:
+        # routing_rules is tiny (categories x priorities), so it is held in
+        # memory keyed by (category, priority) and refreshed in the background.
+        self.rules_ttl_seconds = rules_ttl_seconds
+        self.background_refresh = background_refresh
+        self._rules = None
+        self._rules_loaded_at = None
+        self._load_lock = threading.Lock()
+        self._refresh_signal = threading.Event()
+        self._refresh_thread = None
+        self.limits = limits or get_default_limits()
+        self.resilience = resilience or get_default_resilience()
+        # Where routing_rules is read from: BigQuery by default, or a local SQLiteStore
+        self.store = store or BigQueryStore(
+            lambda: self.bq_client, project_id, self.dataset_id, caller=self.resilience.bigquery
+        )
+        self.tracer = tracer or Tracer(
+            TelemetrySink(lambda: self.bq_client, f"{project_id}.{self.dataset_id}.agent_telemetry")
+        )
+
+    @property
+    def bq_client(self):
+        return self.resources.bq_client
+
+    def load_rules(self) -> int:
         """
-        Routes tickets to teams using BigQuery routing rules.
+        Loads the full routing_rules table into memory, replacing the current table.
+        """
+        rules = {}
+        for row in self.store.routing_rules():
+            rules[(row["category"], row["priority"])] = {
+                "assigned_team": row["assigned_team"],
+                "sla_hours": row["sla_hours"],
+            }
+        # Swap in the new table in one assignment so readers never see a partial load
+        self._rules = rules
+        self._rules_loaded_at = time.monotonic()
+        return len(rules)
+
+    def invalidate_rules(self):
         """
-        query = f"""
-            SELECT assigned_team, sla_hours
-            FROM `{self.project_id}.{self.dataset_id}.routing_rules`
-            WHERE category = @category AND priority = @priority
-            LIMIT 1
+        Signals that routing_rules changed and should be reloaded now.
         """
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("category", "STRING", category),
-                bigquery.ScalarQueryParameter("priority", "STRING", priority),
-            ]
-        )
-        
+        if self._refresh_thread and self._refresh_thread.is_alive():
+            self._refresh_signal.set()
+        else:
+            self._rules_loaded_at = None
+
+    def _rules_stale(self):
+        if self._rules_loaded_at is None:
+            return True
+        # With background refresh enabled the refresh thread owns reloading
+        if self.background_refresh:
+            return False
+        return time.monotonic() - self._rules_loaded_at > self.rules_ttl_seconds
+
+    def _ensure_rules(self):
+        if self._rules_stale():
+            with self._load_lock:
+                if self._rules_stale():
+                    self.load_rules()
+        if self.background_refresh and self._refresh_thread is None:
+            self._start_refresh_thread()
+
+    def _start_refresh_thread(self):
+        with self._load_lock:
+            if self._refresh_thread is not None:
+                return
+            self._refresh_thread = threading.Thread(
+                target=self._refresh_loop, name="routing-rules-refresh", daemon=True
+            )
+            self._refresh_thread.start()
+
+    def _refresh_loop(self):
+        while True:
+            # Wakes up on TTL expiry or when invalidate_rules() is called
+            self._refresh_signal.wait(self.rules_ttl_seconds)
+            self._refresh_signal.clear()
+            try:
+                self.load_rules()
+            except Exception as e:
+                # Keep serving the last good table until the next attempt
+                print(f"Error refreshing routing rules: {e}")
+
+    @traced("router")
+    def route_ticket(self, category: str, priority: str) -> dict:
+        """
+        Routes tickets to teams using the in-memory copy of the BigQuery routing rules.
+        """
+        span = current_span()
+        span.cache_hit = not self._rules_stale()
         try:
-            query_job = self.bq_client.query(query, job_config=job_config)
-            results = list(query_job)
-            
-            if not results:
+            self._ensure_rules()
+        except Exception as e:
+            print(f"Error in routing: {e}")
+            span.status = "error"
+            # Keep routing with the last good table while BigQuery is unavailable
+            if self._rules is None:
                 return {
                     "assigned_team": "general_support",
                     "sla_hours": 24,
-                    "routing_reason": "No specific rule found, falling back to general support."
+                    "routing_reason": "Error during routing lookup."
                 }
-            
-            row = results[0]
-            return {
-                "assigned_team": row.assigned_team,
-                "sla_hours": row.sla_hours,
-                "routing_reason": f"Matched routing rule for category '{category}' and priority '{priority}'."
-            }
-        except Exception as e:
-            print(f"Error in routing: {e}")
+
+        rule = self._rules.get((category, priority))
+        if rule is None:
             return {
                 "assigned_team": "general_support",
                 "sla_hours": 24,
-                "routing_reason": "Error during routing lookup."
+                "routing_reason": "No specific rule found, falling back to general support."
             }
 
+        return {
+            "assigned_team": rule["assigned_team"],
+            "sla_hours": rule["sla_hours"],
+            "routing_reason": f"Matched routing rule for category '{category}' and priority '{priority}'."
+        }
+
+    async def aroute_ticket(self, category: str, priority: str) -> dict:
+        """
+        Async variant of `route_ticket`. Lookups are served inline once the rules
+        are loaded; only a (re)load goes through the blocking executor.
+        """
+        if self._rules_stale():
+            return await self.limits.run_blocking("bigquery", self.route_ticket, category, priority)
+        return self.route_ticket(category, priority)
+
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print("Usage: python router_agent.py <project_id>")
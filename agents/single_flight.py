@@ -0,0 +1,116 @@
+import asyncio
+import threading
+
+
+class _Call:
+    """
+    One in-flight execution that any number of callers can wait on.
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.task = None
+        self.value = None
+        self.error = None
+
+
+class Flight:
+    """
+    A caller's handle on a SingleFlight key. The leader runs the function;
+    everyone else (`shared` is True) waits for the leader's value or exception.
+    """
+
+    def __init__(self, group, key, call, leader):
+        self.group = group
+        self.key = key
+        self.leader = leader
+        self._call = call
+
+    @property
+    def shared(self) -> bool:
+        return not self.leader
+
+    def run(self, fn, *args, **kwargs):
+        call = self._call
+        if self.leader:
+            try:
+                call.value = fn(*args, **kwargs)
+            except BaseException as e:
+                call.error = e
+            finally:
+                self.group._release(self.key, call)
+                call.done.set()
+        else:
+            call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.value
+
+    async def arun(self, fn, *args, **kwargs):
+        """
+        Async variant of `run`; `fn` must return an awaitable.
+        """
+        call = self._call
+        if self.leader:
+            call.task = asyncio.ensure_future(fn(*args, **kwargs))
+            call.task.add_done_callback(lambda _: self.group._release(self.key, call))
+        # Shielded so a caller that times out or is cancelled doesn't cancel the shared call for the rest
+        return await asyncio.shield(call.task)
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one execution.
+
+    The first caller for a key becomes the leader and runs the call; callers
+    that arrive while it is in flight wait and get the same result (or the same
+    exception). Nothing is kept once the call finishes, so this only merges
+    duplicates that overlap in time; it is not a cache. Shared results are the
+    same object for every caller and must not be mutated.
+
+    Sync callers (threads) and async callers are tracked separately, and async
+    calls per event loop, because a task can only be awaited on its own loop.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "executions": 0, "collapsed": 0}
+
+    def join(self, key) -> Flight:
+        return self._join(("sync", key))
+
+    def ajoin(self, key) -> Flight:
+        # Must be followed by `arun` without an await in between, so the leader's task exists for followers
+        return self._join((id(asyncio.get_running_loop()), key))
+
+    def do(self, key, fn, *args, **kwargs):
+        return self.join(key).run(fn, *args, **kwargs)
+
+    async def ado(self, key, fn, *args, **kwargs):
+        return await self.ajoin(key).arun(fn, *args, **kwargs)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["in_flight"] = len(self._calls)
+        stats["collapse_rate"] = round(stats["collapsed"] / stats["calls"], 4) if stats["calls"] else 0.0
+        return stats
+
+    def _join(self, key):
+        with self._lock:
+            self.stats["calls"] += 1
+            call = self._calls.get(key)
+            if call is not None:
+                self.stats["collapsed"] += 1
+                return Flight(self, key, call, leader=False)
+            call = self._calls[key] = _Call()
+            self.stats["executions"] += 1
+            return Flight(self, key, call, leader=True)
+
+    def _release(self, key, call):
+        with self._lock:
+            # Later arrivals start a fresh call instead of reusing a finished one
+            if self._calls.get(key) is call:
+                del self._calls[key]
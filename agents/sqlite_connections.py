@@ -0,0 +1,26 @@
+import sqlite3
+import threading
+
+
+class ThreadLocalConnections:
+    """
+    One SQLite connection per thread for a single database file.
+
+    sqlite3 connections cannot be shared across threads, so each thread opens
+    its own on first use and keeps it. Connections are in autocommit mode
+    (callers issue BEGIN IMMEDIATE themselves) and use WAL so readers never
+    block the writer.
+    """
+
+    def __init__(self, path: str, timeout: float = 5):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
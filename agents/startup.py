@@ -0,0 +1,51 @@
+import sys
+import time
+import importlib
+import threading
+from contextlib import contextmanager
+
+
+class StartupProfiler:
+    """
+    Records how long cold-start work takes: importing each heavy module and
+    each initialization phase (client construction, credential parsing...).
+    """
+
+    def __init__(self):
+        self.created_at = time.perf_counter()
+        self.imports_ms = {}
+        self.phases_ms = {}
+        self._lock = threading.Lock()
+
+    def import_module(self, name):
+        """
+        Imports `name`, timing it the first time it is loaded in this process.
+        """
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+        start = time.perf_counter()
+        module = importlib.import_module(name)
+        with self._lock:
+            self.imports_ms.setdefault(name, round((time.perf_counter() - start) * 1000, 2))
+        return module
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.phases_ms[name] = round((time.perf_counter() - start) * 1000, 2)
+
+    def report(self) -> dict:
+        with self._lock:
+            return {
+                "uptime_ms": round((time.perf_counter() - self.created_at) * 1000, 2),
+                "imports_ms": dict(self.imports_ms),
+                "phases_ms": dict(self.phases_ms),
+            }
+
+
+profiler = StartupProfiler()
@@ -0,0 +1,306 @@
+import re
+import json
+import threading
+
+# Hard cap on how much of a bad response is echoed back in the repair prompt
+MAX_REPAIR_ECHO_CHARS = 4000
+
+JSON_START_PATTERN = re.compile(r"[\[{]")
+TRAILING_COMMA_PATTERN = re.compile(r",\s*([\]}])")
+
+_decoder = json.JSONDecoder()
+
+SCHEMA_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+}
+
+
+class StructuredOutputError(Exception):
+    """
+    Raised when a model response cannot be turned into schema-valid JSON.
+
+    `token_count` carries the tokens already spent so callers can still account for them.
+    """
+
+    def __init__(self, message, errors=None, text="", token_count=0):
+        super().__init__(message)
+        self.errors = errors or [message]
+        self.text = text
+        self.token_count = token_count
+
+
+def _first_json_value(text, expected_type):
+    for match in JSON_START_PATTERN.finditer(text):
+        if expected_type is dict and match.group() != "{":
+            continue
+        if expected_type is list and match.group() != "[":
+            continue
+        try:
+            value, _ = _decoder.raw_decode(text, match.start())
+        except json.JSONDecodeError:
+            continue
+        if expected_type is None or isinstance(value, expected_type):
+            return value, True
+    return None, False
+
+
+def extract_json(text, expected_type=None):
+    """
+    Returns the first JSON value in `text`, tolerating code fences and prose around it.
+
+    Decodes in place from each candidate opening bracket instead of slicing
+    substrings, so well-formed output is parsed in a single pass. Trailing commas
+    are stripped as a last resort.
+    """
+    value, found = _first_json_value(text, expected_type)
+    if not found:
+        cleaned = TRAILING_COMMA_PATTERN.sub(r"\1", text)
+        if cleaned != text:
+            value, found = _first_json_value(cleaned, expected_type)
+    if not found:
+        raise StructuredOutputError("No JSON value found in model response", text=text)
+    return value
+
+
+def string_fields(text, keys) -> dict:
+    """
+    Returns the string fields among `keys` whose value is already complete in a
+    partial JSON object, e.g. one still being streamed. Fields that are missing
+    or whose closing quote has not arrived yet are left out.
+    """
+    fields = {}
+    for key in keys:
+        match = re.search(rf'"{re.escape(key)}"\s*:\s*("(?:[^"\\]|\\.)*")', text)
+        if match:
+            fields[key] = json.loads(match.group(1))
+    return fields
+
+
+def validate(value, schema, path="$"):
+    """
+    Checks `value` against the subset of OpenAPI schema that Gemini's
+    response_schema supports. Returns a list of error strings (empty when valid).
+    """
+    errors = []
+    expected = SCHEMA_TYPES.get(schema.get("type"))
+    # bool is an int subclass; don't let True pass as an integer
+    if expected and (not isinstance(value, expected) or (isinstance(value, bool) and schema["type"] != "boolean")):
+        return [f"{path}: expected {schema['type']}, got {type(value).__name__}"]
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append(f"{path}: {value!r} is not one of {schema['enum']}")
+    if schema.get("type") == "object":
+        for key in schema.get("required", []):
+            if key not in value:
+                errors.append(f"{path}.{key}: missing required field")
+        for key, subschema in schema.get("properties", {}).items():
+            if key in value:
+                errors.extend(validate(value[key], subschema, f"{path}.{key}"))
+    elif schema.get("type") == "array" and "items" in schema:
+        for index, item in enumerate(value):
+            errors.extend(validate(item, schema["items"], f"{path}[{index}]"))
+    return errors
+
+
+def response_text(response):
+    # .text raises ValueError when the candidate was blocked or empty
+    try:
+        return response.text
+    except ValueError:
+        return ""
+
+
+def response_tokens(response):
+    usage = getattr(response, "usage_metadata", None)
+    return getattr(usage, "total_token_count", 0) or 0
+
+
+def cancel_stream(response):
+    """
+    Cancels a `stream=True` response. The SDK keeps the transport stream (gRPC
+    call or REST iterator, both with `cancel()`) in `_iterator`; a no-op once
+    the stream has ended.
+    """
+    stream = getattr(response, "_iterator", response)
+    cancel = getattr(stream, "cancel", None)
+    if callable(cancel):
+        cancel()
+
+
+class StructuredOutput:
+    """
+    Requests schema-constrained JSON from Gemini and turns it into validated Python values.
+
+    A response that fails to parse or validate gets `repair_attempts` short
+    follow-up calls that send back only the broken output, the validation
+    errors and the schema, instead of discarding the call that was already paid for.
+    """
+
+    def __init__(self, schema, repair_attempts=1, use_response_schema=True):
+        self.schema = schema
+        self.repair_attempts = repair_attempts
+        self.use_response_schema = use_response_schema
+        self.stats = {"calls": 0, "parsed": 0, "repaired": 0, "failed": 0, "repair_calls": 0}
+        self._lock = threading.Lock()
+
+    def generation_config(self, schema=None):
+        config = {"response_mime_type": "application/json"}
+        if self.use_response_schema:
+            config["response_schema"] = schema or self.schema
+        return config
+
+    def parse(self, text, schema=None):
+        schema = schema or self.schema
+        value = extract_json(text or "", SCHEMA_TYPES.get(schema.get("type")))
+        errors = validate(value, schema)
+        if errors:
+            raise StructuredOutputError("Model response does not match schema", errors=errors, text=text)
+        return value
+
+    def repair_prompt(self, error, schema=None):
+        return (
+            "The response below was supposed to be JSON matching the schema, but it is invalid.\n"
+            f"Problems: {'; '.join(error.errors)}\n"
+            f"Schema: {json.dumps(schema or self.schema, separators=(',', ':'))}\n"
+            f"Response: {error.text[:MAX_REPAIR_ECHO_CHARS]}\n"
+            "Return ONLY the corrected JSON."
+        )
+
+    def generate(self, model, prompt, schema=None):
+        """
+        Returns (value, token_count). Raises StructuredOutputError if the repair also fails.
+        """
+        config = self.generation_config(schema)
+        response = model.generate_content(prompt, generation_config=config)
+        value, error, tokens = self._attempt(response, schema, 0)
+        return self._repair(model, value, error, tokens, schema, config)
+
+    async def agenerate(self, call, model, prompt, schema=None):
+        """
+        Async variant of `generate`; `call` wraps the coroutine, e.g. `limits.call_gemini`.
+        """
+        config = self.generation_config(schema)
+        response = await call(model.generate_content_async, prompt, generation_config=config)
+        value, error, tokens = self._attempt(response, schema, 0)
+        return await self._arepair(call, model, value, error, tokens, schema, config)
+
+    def stream(self, model, prompt, early_fields, schema=None):
+        """
+        Streaming variant of `generate` that stops reading the response as soon
+        as every field in `early_fields` has a complete, schema-valid string value.
+
+        Returns (value, token_count, complete). When the stream is cut short,
+        `complete` is False, `value` holds only `early_fields` and the stream is
+        cancelled so Gemini stops generating (and billing) the rest. If the stream
+        ends before they are all available, the full text is parsed (and
+        repaired) exactly like `generate`.
+        """
+        config = self.generation_config(schema)
+        response = model.generate_content(prompt, generation_config=config, stream=True)
+        text, tokens, early = self._read_stream(response, early_fields, schema)
+        if early is not None:
+            return self._finish(early, None, tokens, 0) + (False,)
+        value, error, tokens = self._attempt_text(text, schema, tokens)
+        return self._repair(model, value, error, tokens, schema, config) + (True,)
+
+    async def astream(self, call, model, prompt, early_fields, schema=None):
+        """
+        Async variant of `stream`; `call` wraps opening and reading the stream,
+        so a limiter such as `limits.call_gemini` is held until it is consumed.
+        """
+        config = self.generation_config(schema)
+
+        async def read():
+            response = await model.generate_content_async(prompt, generation_config=config, stream=True)
+            return await self._aread_stream(response, early_fields, schema)
+
+        text, tokens, early = await call(read)
+        if early is not None:
+            return self._finish(early, None, tokens, 0) + (False,)
+        value, error, tokens = self._attempt_text(text, schema, tokens)
+        return await self._arepair(call, model, value, error, tokens, schema, config) + (True,)
+
+    def _read_stream(self, response, early_fields, schema):
+        """
+        Returns (text, tokens, early value or None). Tokens are the usage
+        reported by the last chunk read; nothing is generated after the cancel.
+        """
+        text, tokens = "", 0
+        try:
+            for chunk in response:
+                text, tokens = text + response_text(chunk), max(tokens, response_tokens(chunk))
+                early = self._early_value(text, early_fields, schema)
+                if early is not None:
+                    return text, tokens, early
+        finally:
+            cancel_stream(response)
+        return text, tokens, None
+
+    async def _aread_stream(self, response, early_fields, schema):
+        text, tokens = "", 0
+        try:
+            async for chunk in response:
+                text, tokens = text + response_text(chunk), max(tokens, response_tokens(chunk))
+                early = self._early_value(text, early_fields, schema)
+                if early is not None:
+                    return text, tokens, early
+        finally:
+            cancel_stream(response)
+        return text, tokens, None
+
+    def _early_value(self, text, early_fields, schema):
+        fields = string_fields(text, early_fields)
+        if len(fields) < len(early_fields):
+            return None
+        properties = (schema or self.schema).get("properties", {})
+        subschema = {
+            "type": "object",
+            "properties": {key: properties[key] for key in early_fields if key in properties},
+            "required": list(early_fields),
+        }
+        # An out-of-enum value is left for the full parse, which can repair it
+        return None if validate(fields, subschema) else fields
+
+    def _repair(self, model, value, error, tokens, schema, config):
+        repairs = 0
+        while error is not None and repairs < self.repair_attempts:
+            repairs += 1
+            response = model.generate_content(self.repair_prompt(error, schema), generation_config=config)
+            value, error, tokens = self._attempt(response, schema, tokens)
+        return self._finish(value, error, tokens, repairs)
+
+    async def _arepair(self, call, model, value, error, tokens, schema, config):
+        repairs = 0
+        while error is not None and repairs < self.repair_attempts:
+            repairs += 1
+            response = await call(
+                model.generate_content_async, self.repair_prompt(error, schema), generation_config=config
+            )
+            value, error, tokens = self._attempt(response, schema, tokens)
+        return self._finish(value, error, tokens, repairs)
+
+    def _attempt(self, response, schema, tokens):
+        return self._attempt_text(response_text(response), schema, tokens + response_tokens(response))
+
+    def _attempt_text(self, text, schema, tokens):
+        try:
+            return self.parse(text, schema), None, tokens
+        except StructuredOutputError as e:
+            return None, e, tokens
+
+    def _finish(self, value, error, tokens, repairs):
+        with self._lock:
+            self.stats["calls"] += 1
+            self.stats["repair_calls"] += repairs
+            if error is not None:
+                self.stats["failed"] += 1
+            else:
+                self.stats["repaired" if repairs else "parsed"] += 1
+        if error is not None:
+            error.token_count = tokens
+            raise error
+        return value, tokens
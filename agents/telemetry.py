@@ -0,0 +1,127 @@
+import queue
+import atexit
+import threading
+import time
+
+
+class TelemetrySink:
+    """
+    Buffers telemetry rows in memory and streams them to BigQuery in batches.
+
+    `emit` never blocks: rows go onto a bounded queue and a background thread
+    sends them with one `insert_rows_json` call per batch, flushing when the
+    batch is full or `flush_interval_seconds` has passed. When BigQuery falls
+    behind and the queue is full, new rows are dropped and counted rather
+    than slowing down the request path. Remaining rows are flushed on close
+    and at interpreter exit.
+
+    `bq_client` may be a zero-argument callable, so the client is only
+    created when the first batch is sent.
+    """
+
+    thread_name = "telemetry-flusher"
+
+    def __init__(self, bq_client, table_id, max_queue_size: int = 10000, batch_size: int = 500,
+                 flush_interval_seconds: float = 2.0):
+        self.bq_client = bq_client
+        self.table_id = table_id
+        self.batch_size = batch_size
+        self.flush_interval_seconds = flush_interval_seconds
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stop = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._thread = None
+        self.stats = {
+            "emitted": 0,
+            "dropped": 0,
+            "flushed_rows": 0,
+            "failed_rows": 0,
+            "insert_calls": 0,
+        }
+        atexit.register(self.close)
+
+    def emit(self, row: dict) -> bool:
+        """
+        Queues a row for the next batch. Returns False if it was dropped.
+        """
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self._count("dropped")
+            return False
+        self._count("emitted")
+        return True
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def flush(self):
+        """
+        Sends everything currently queued, in batches, from the calling thread.
+        """
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                return
+            self._send(batch)
+
+    def close(self, timeout: float = 5.0):
+        """
+        Stops the background flusher and sends any remaining rows.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def _start(self):
+        with self._flush_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = []
+            deadline = time.monotonic() + self.flush_interval_seconds
+            while len(batch) < self.batch_size and not self._stop.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=min(remaining, 0.5)))
+                except queue.Empty:
+                    continue
+            if batch:
+                self._send(batch)
+
+    def _drain(self, limit):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _send(self, batch):
+        with self._flush_lock:
+            self._count("insert_calls")
+            try:
+                client = self.bq_client() if callable(self.bq_client) else self.bq_client
+                errors = client.insert_rows_json(self.table_id, batch)
+            except Exception as e:
+                print(f"Telemetry flush failed for {len(batch)} rows: {e}")
+                self._count("failed_rows", len(batch))
+                return
+            if errors:
+                print(f"Telemetry logging errors: {errors}")
+                self._count("failed_rows", len(errors))
+            self._count("flushed_rows", len(batch) - len(errors or []))
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self.stats[key] += amount
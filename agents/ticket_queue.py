@@ -0,0 +1,362 @@
+import json
+import time
+import uuid
+import heapq
+import threading
+from collections import deque
+from urllib.parse import urlparse
+from agents.sqlite_connections import ThreadLocalConnections
+
+# Lane 0 is drained first; unknown priorities go to the "medium" lane
+PRIORITY_LANES = {"critical": 0, "high": 1, "medium": 2, "low": 3}
+DEFAULT_LANE = PRIORITY_LANES["medium"]
+
+
+class QueueFullError(Exception):
+    """
+    Raised by `enqueue` when the queue already holds `max_depth` pending tickets.
+    """
+
+
+class CallbackNotAllowedError(ValueError):
+    """
+    Raised for a callback_url that is not http(s) or whose host is not allow-listed.
+    """
+
+
+def lane_for(priority) -> int:
+    return PRIORITY_LANES.get(str(priority or "").lower(), DEFAULT_LANE)
+
+
+def check_callback_url(callback_url, allowed_hosts):
+    """
+    Callbacks are refused unless the host is explicitly allowed, so an anonymous
+    caller cannot make the workers POST to loopback, private or link-local
+    addresses such as the 169.254.169.254 metadata service.
+    """
+    parsed = urlparse(callback_url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise CallbackNotAllowedError("callback_url must be an absolute http(s) URL")
+    if not allowed_hosts:
+        raise CallbackNotAllowedError("Callbacks are disabled: no callback hosts are allowed")
+    if parsed.hostname.lower() not in allowed_hosts:
+        raise CallbackNotAllowedError(f"callback_url host {parsed.hostname} is not allowed")
+
+
+class InMemoryQueueBackend:
+    """
+    Process-local queue: one heap ordered by (lane, arrival) plus a job table.
+
+    Finished jobs are kept for polling until `max_finished` is exceeded, then
+    the oldest are dropped.
+    """
+
+    def __init__(self, max_finished=10000):
+        self.max_finished = max_finished
+        self._heap = []
+        self._jobs = {}
+        self._finished = deque(maxlen=max_finished)
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def put(self, job, max_depth):
+        """
+        Inserts the job unless its ticket_id is already known. Returns
+        (record, created); raises QueueFullError when `max_depth` jobs are waiting.
+        """
+        with self._lock:
+            existing = self._jobs.get(job["ticket_id"])
+            if existing is not None:
+                return dict(existing), False
+            if len(self._heap) >= max_depth:
+                raise QueueFullError(f"Ticket queue is full ({max_depth} pending)")
+            self._seq += 1
+            self._jobs[job["ticket_id"]] = job
+            heapq.heappush(self._heap, (job["lane"], self._seq, job["ticket_id"]))
+            return dict(job), True
+
+    def claim(self):
+        with self._lock:
+            if not self._heap:
+                return None
+            _, _, ticket_id = heapq.heappop(self._heap)
+            job = self._jobs[ticket_id]
+            job["status"] = "processing"
+            job["started_at"] = time.time()
+            return dict(job)
+
+    def finish(self, ticket_id, status, result=None, error=None):
+        with self._lock:
+            job = self._jobs.get(ticket_id)
+            if job is None:
+                return
+            job.update(status=status, result=result, error=error, finished_at=time.time())
+            if len(self._finished) == self._finished.maxlen:
+                # The deque drops its oldest entry on append; forget that job too
+                self._jobs.pop(self._finished[0], None)
+            self._finished.append(ticket_id)
+
+    def get(self, ticket_id):
+        with self._lock:
+            job = self._jobs.get(ticket_id)
+            return dict(job) if job else None
+
+    def depth(self) -> int:
+        with self._lock:
+            return len(self._heap)
+
+    def depth_by_lane(self) -> dict:
+        with self._lock:
+            counts = {}
+            for lane, _, _ in self._heap:
+                counts[lane] = counts.get(lane, 0) + 1
+            return counts
+
+    def recover(self) -> int:
+        # Nothing survives a restart in memory
+        return 0
+
+
+class SQLiteQueueBackend:
+    """
+    Queue stored in a local SQLite file, so pending tickets survive a restart
+    and several worker processes on one host can drain the same queue.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connections = ThreadLocalConnections(path)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ticket_queue (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    ticket_id TEXT UNIQUE, description TEXT, lane INTEGER, priority TEXT,
+                    callback_url TEXT, status TEXT, enqueued_at REAL, started_at REAL,
+                    finished_at REAL, result TEXT, error TEXT
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_ticket_queue_pending ON ticket_queue (status, lane, seq)")
+
+    def _connect(self):
+        return self._connections.connect()
+
+    def put(self, job, max_depth):
+        conn = self._connect()
+        # IMMEDIATE takes the write lock up front so the duplicate check, depth check and insert are atomic
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            known = conn.execute("SELECT 1 FROM ticket_queue WHERE ticket_id = ?", (job["ticket_id"],)).fetchone()
+            if known is None:
+                depth = conn.execute("SELECT COUNT(*) FROM ticket_queue WHERE status = 'queued'").fetchone()[0]
+                if depth >= max_depth:
+                    raise QueueFullError(f"Ticket queue is full ({max_depth} pending)")
+                conn.execute(
+                    "INSERT INTO ticket_queue (ticket_id, description, lane, priority, callback_url, status,"
+                    " enqueued_at) VALUES (?, ?, ?, ?, ?, 'queued', ?) ON CONFLICT (ticket_id) DO NOTHING",
+                    (job["ticket_id"], job["description"], job["lane"], job["priority"], job["callback_url"],
+                     job["enqueued_at"]),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return self.get(job["ticket_id"]), known is None
+
+    def claim(self):
+        conn = self._connect()
+        row = conn.execute(
+            "UPDATE ticket_queue SET status = 'processing', started_at = ?"
+            " WHERE seq = (SELECT seq FROM ticket_queue WHERE status = 'queued' ORDER BY lane, seq LIMIT 1)"
+            " RETURNING ticket_id",
+            (time.time(),),
+        ).fetchone()
+        return self.get(row[0]) if row else None
+
+    def finish(self, ticket_id, status, result=None, error=None):
+        self._connect().execute(
+            "UPDATE ticket_queue SET status = ?, result = ?, error = ?, finished_at = ? WHERE ticket_id = ?",
+            (status, json.dumps(result, default=str) if result is not None else None, error, time.time(), ticket_id),
+        )
+
+    def get(self, ticket_id):
+        conn = self._connect()
+        cursor = conn.execute("SELECT * FROM ticket_queue WHERE ticket_id = ?", (ticket_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        job = dict(zip([column[0] for column in cursor.description], row))
+        job.pop("seq")
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def depth(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM ticket_queue WHERE status = 'queued'").fetchone()[0]
+
+    def depth_by_lane(self) -> dict:
+        rows = self._connect().execute(
+            "SELECT lane, COUNT(*) FROM ticket_queue WHERE status = 'queued' GROUP BY lane"
+        ).fetchall()
+        return dict(rows)
+
+    def recover(self) -> int:
+        """
+        Re-queues tickets a previous process claimed but never finished. Only
+        safe while no other process is draining the same file.
+        """
+        cursor = self._connect().execute(
+            "UPDATE ticket_queue SET status = 'queued', started_at = NULL WHERE status = 'processing'"
+        )
+        return cursor.rowcount
+
+
+class TicketQueue:
+    """
+    Accepts tickets without waiting for them and drains them through the
+    coordinator on a pool of worker threads.
+
+    Tickets are ordered by priority lane: the caller's hint when given,
+    otherwise the fast-path rule guess, so critical tickets skip ahead of the
+    backlog without an extra model call. `enqueue` raises QueueFullError once
+    `max_depth` tickets are waiting. Results are kept for polling and, when a
+    `callback_url` on one of `callback_hosts` was given, POSTed there as JSON.
+
+    Workers are in-process threads: this suits a long-running server, not a
+    serverless function that is frozen between requests.
+    """
+
+    def __init__(self, coordinator, backend=None, workers=4, max_depth=1000, poll_interval_seconds=0.5,
+                 callback_timeout_seconds=10.0, callback_hosts=(), post_callback=None):
+        self.coordinator = coordinator
+        self.backend = backend or InMemoryQueueBackend()
+        self.workers = workers
+        self.max_depth = max_depth
+        self.poll_interval_seconds = poll_interval_seconds
+        self.callback_timeout_seconds = callback_timeout_seconds
+        self.callback_hosts = frozenset(host.lower() for host in callback_hosts)
+        self._post_callback = post_callback or self._post_json
+        self._wakeup = threading.Condition()
+        self._stopping = threading.Event()
+        self._threads = []
+        self.stats = {"enqueued": 0, "rejected": 0, "processed": 0, "failed": 0,
+                      "callbacks_sent": 0, "callbacks_failed": 0}
+        self._stats_lock = threading.Lock()
+
+    def start(self):
+        if self._threads:
+            return
+        recovered = self.backend.recover()
+        if recovered:
+            print(f"Re-queued {recovered} tickets left in progress by a previous worker")
+        self._stopping.clear()
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"ticket-queue-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=5.0):
+        self._stopping.set()
+        with self._wakeup:
+            self._wakeup.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def enqueue(self, description, ticket_id=None, priority=None, callback_url=None) -> dict:
+        """
+        Stores the ticket and returns its queue record straight away.
+        Re-submitting a known ticket_id returns the existing record.
+        """
+        if callback_url:
+            check_callback_url(callback_url, self.callback_hosts)
+        ticket_id = ticket_id or str(uuid.uuid4())
+        priority = priority or self._guess_priority(description)
+        job = {
+            "ticket_id": ticket_id,
+            "description": description,
+            "lane": lane_for(priority),
+            "priority": priority,
+            "callback_url": callback_url,
+            "status": "queued",
+            "enqueued_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None,
+        }
+        try:
+            record, created = self.backend.put(job, self.max_depth)
+        except QueueFullError:
+            self._count("rejected")
+            raise
+        if created:
+            self._count("enqueued")
+            with self._wakeup:
+                self._wakeup.notify()
+        return record
+
+    def get(self, ticket_id):
+        return self.backend.get(ticket_id)
+
+    def snapshot(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        lanes = {lane: 0 for lane in PRIORITY_LANES}
+        names = {index: name for name, index in PRIORITY_LANES.items()}
+        for lane, count in self.backend.depth_by_lane().items():
+            lanes[names.get(lane, "medium")] += count
+        stats.update(depth=sum(lanes.values()), depth_by_lane=lanes, max_depth=self.max_depth,
+                     workers=len(self._threads))
+        return stats
+
+    def _guess_priority(self, description):
+        fast_path = getattr(getattr(self.coordinator, "classifier", None), "fast_path", None)
+        if fast_path is None:
+            return None
+        guess = fast_path.best_guess(description)
+        return guess["priority"] if guess else None
+
+    def _work(self):
+        while not self._stopping.is_set():
+            job = self.backend.claim()
+            if job is None:
+                # SQLite may be fed by other processes, so poll as well as waiting for a notify
+                with self._wakeup:
+                    self._wakeup.wait(self.poll_interval_seconds)
+                continue
+            self._process(job)
+
+    def _process(self, job):
+        try:
+            result = self.coordinator.process_ticket(job["description"], job["ticket_id"])
+        except Exception as e:
+            print(f"Queued ticket {job['ticket_id']} failed: {e}")
+            self.backend.finish(job["ticket_id"], "error", error=str(e))
+            self._count("failed")
+        else:
+            self.backend.finish(job["ticket_id"], "done", result=result)
+            self._count("processed")
+        if job.get("callback_url"):
+            self._send_callback(job)
+
+    def _send_callback(self, job):
+        record = self.backend.get(job["ticket_id"])
+        try:
+            # Checked again here: the record may come from a SQLite file written under another config
+            check_callback_url(job["callback_url"], self.callback_hosts)
+            self._post_callback(job["callback_url"], record)
+            self._count("callbacks_sent")
+        except Exception as e:
+            # Callers can still poll for the result
+            print(f"Callback for ticket {job['ticket_id']} failed: {e}")
+            self._count("callbacks_failed")
+
+    def _post_json(self, url, payload):
+        import httpx
+        response = httpx.post(url, content=json.dumps(payload, default=str),
+                              headers={"content-type": "application/json"},
+                              timeout=self.callback_timeout_seconds)
+        response.raise_for_status()
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
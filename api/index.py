@@ -1,19 +1,82 @@
+import time
+_module_start = time.perf_counter()
+
 from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
+from typing import List, Optional
 import os
+import io
+import re
+import csv
 import json
-from google.oauth2 import service_account
-from agents.coordinator import TicketCoordinator
+import hmac
+import asyncio
+import functools
+import threading
+# Heavy SDKs (google-generativeai, google-cloud-bigquery, google.oauth2) are
+# imported lazily on first use so they stay out of the cold-start import path.
+from agents.startup import profiler
 
 app = FastAPI()
 
 # --- Configuration & Credentials ---
 # Lazy initialization of the coordinator
-# Lazy initialization of the coordinator
 coordinator = None
 init_error = None
+ticket_queue = None
+
+# Remove control characters but keep newlines
+CONTROL_CHARS_PATTERN = re.compile(r'[\x00-\x09\x0b-\x1f\x7f-\x9f]')
+# Match "private_key": "VALUE" across newlines
+PRIVATE_KEY_FIELD_PATTERN = re.compile(r'("private_key":\s*")(.*?)(")', flags=re.DOTALL)
+
+class CredentialsError(Exception):
+    pass
+
+@functools.lru_cache(maxsize=4)
+def parse_gcp_sa_key(gcp_sa_key: str):
+    """
+    Builds service account credentials from the raw GCP_SA_KEY value.
+
+    Cached on the raw string, so warm invocations skip the cleanup passes and
+    the JSON parse entirely.
+    """
+    # Check for obvious truncation
+    gcp_sa_key = gcp_sa_key.strip()
+    if not gcp_sa_key.endswith("}"):
+        raise CredentialsError(
+            f"GCP_SA_KEY appears truncated (Length: {len(gcp_sa_key)}, Ends with: '{gcp_sa_key[-20:]}'). It must end with '}}'"
+        )
+
+    # Handle escaped newlines from Vercel env vars
+    if "\\n" in gcp_sa_key:
+        gcp_sa_key = gcp_sa_key.replace("\\n", "\n")
+    
+    # Clean possible invalid control characters
+    gcp_sa_key = CONTROL_CHARS_PATTERN.sub('', gcp_sa_key)
+
+    # Fix unescaped newlines specifically in the private_key field
+    # This handles both standard keys and keys with newlines pasted directly
+    def fix_private_key_field(match):
+        # match.group(2) is the value content
+        fixed_value = match.group(2).replace("\n", "\\n")
+        return f'{match.group(1)}{fixed_value}{match.group(3)}'
+    
+    gcp_sa_key = PRIVATE_KEY_FIELD_PATTERN.sub(fix_private_key_field, gcp_sa_key)
+
+    try:
+        service_account_info = json.loads(gcp_sa_key, strict=False)
+    except json.JSONDecodeError as e:
+        raise CredentialsError(f"JSON Parse Error in GCP_SA_KEY: {e.msg} at line {e.lineno} col {e.colno}")
+
+    # Create credentials object directly
+    try:
+        service_account = profiler.import_module("google.oauth2.service_account")
+        return service_account.Credentials.from_service_account_info(service_account_info)
+    except Exception as e:
+        raise CredentialsError(f"Error initializing GCP credentials: {str(e)}")
 
 def get_coordinator():
     global coordinator, init_error
@@ -35,71 +98,215 @@ def get_coordinator():
         
     # Parse Credentials
     gcp_sa_key = os.environ.get("GCP_SA_KEY")
-    credentials = None
-    
-    if gcp_sa_key:
-        try:
-            # Check for obvious truncation
-            gcp_sa_key = gcp_sa_key.strip()
-            if not gcp_sa_key.endswith("}"):
-                init_error = f"GCP_SA_KEY appears truncated (Length: {len(gcp_sa_key)}, Ends with: '{gcp_sa_key[-20:]}'). It must end with '}}'"
-                print(init_error)
-                raise HTTPException(status_code=500, detail=init_error)
-
-            # Handle escaped newlines from Vercel env vars
-            if "\\n" in gcp_sa_key:
-                gcp_sa_key = gcp_sa_key.replace("\\n", "\n")
-            
-            # Clean possible invalid control characters
-            import re
-            # Remove control characters but keep newlines
-            gcp_sa_key = re.sub(r'[\x00-\x09\x0b-\x1f\x7f-\x9f]', '', gcp_sa_key)
-
-            # Fix unescaped newlines specifically in the private_key field
-            # This handles both standard keys and keys with newlines pasted directly
-            def fix_private_key_field(match):
-                # match.group(2) is the value content
-                fixed_value = match.group(2).replace("\n", "\\n")
-                return f'{match.group(1)}{fixed_value}{match.group(3)}'
-            
-            # Match "private_key": "VALUE" across newlines
-            gcp_sa_key = re.sub(
-                r'("private_key":\s*")(.*?)(")', 
-                fix_private_key_field, 
-                gcp_sa_key, 
-                flags=re.DOTALL
-            )
+    if not gcp_sa_key:
+        init_error = "GCP_SA_KEY environment variable not found."
+        print(init_error)
+        raise HTTPException(status_code=500, detail=init_error)
 
-            # Create credentials object directly
-            service_account_info = json.loads(gcp_sa_key, strict=False)
-            from google.oauth2 import service_account
-            credentials = service_account.Credentials.from_service_account_info(service_account_info)
-        except json.JSONDecodeError as e:
-            init_error = f"JSON Parse Error in GCP_SA_KEY: {e.msg} at line {e.lineno} col {e.colno}"
-            print(init_error)
-            raise HTTPException(status_code=500, detail=init_error)
-        except Exception as e:
-            init_error = f"Error initializing GCP credentials: {str(e)}"
-            print(init_error)
-            raise HTTPException(status_code=500, detail=init_error)
-    else:
-         init_error = "GCP_SA_KEY environment variable not found."
-         print(init_error)
-         raise HTTPException(status_code=500, detail=init_error)
+    try:
+        with profiler.phase("parse_credentials"):
+            credentials = parse_gcp_sa_key(gcp_sa_key)
+    except CredentialsError as e:
+        init_error = str(e)
+        print(init_error)
+        raise HTTPException(status_code=500, detail=init_error)
 
     # If we reach here, we have credentials
     try:
-        coordinator = TicketCoordinator(project_id, api_key=api_key, credentials=credentials)
+        with profiler.phase("import_coordinator"):
+            from agents.coordinator import TicketCoordinator
+        with profiler.phase("init_coordinator"):
+            # Opt-in until the rules have been measured against labeled tickets
+            fast_path = os.environ.get("CLASSIFIER_FAST_PATH", "").lower() in ("1", "true")
+            store = None
+            local_store_path = os.environ.get("LOCAL_STORE_PATH")
+            if local_store_path:
+                from agents.datastore import SQLiteStore
+                # routing_rules and knowledge_base are read from a local copy kept fresh by scripts/sync_local_store.py
+                store = SQLiteStore(local_store_path)
+            incident_clustering = None
+            if os.environ.get("INCIDENT_CLUSTERING", "").lower() in ("1", "true"):
+                from agents.incidents import IncidentClusterer
+                # Bursts of similar tickets share one classification and one knowledge base lookup
+                incident_clustering = IncidentClusterer(
+                    window_seconds=float(os.environ.get("INCIDENT_WINDOW_SECONDS", "900")),
+                    similarity_threshold=float(os.environ.get("INCIDENT_SIMILARITY_THRESHOLD", "0.7")),
+                )
+            # Return as soon as category and priority have streamed in instead of waiting for the reasoning text
+            stream_classification = os.environ.get("CLASSIFIER_STREAMING", "").lower() in ("1", "true")
+            # "embedding" serves solutions from an in-memory vector index built with EMBEDDER
+            retrieval_mode = os.environ.get("RETRIEVAL_MODE", "llm")
+            embedder = None
+            if retrieval_mode == "embedding":
+                from agents.embeddings import build_embedder
+                # Must match the embedder scripts/backfill_embeddings.py was run with
+                embedder = build_embedder(os.environ.get("EMBEDDER", "hashing"), api_key=api_key)
+            coordinator = TicketCoordinator(
+                project_id, api_key=api_key, credentials=credentials, fast_path=fast_path, store=store,
+                incident_clustering=incident_clustering, stream_classification=stream_classification,
+                retrieval_mode=retrieval_mode, embedder=embedder
+            )
+        cache_path = os.environ.get("CLASSIFICATION_CACHE_PATH")
+        near_duplicates = os.environ.get("CLASSIFICATION_CACHE_NEAR_DUPLICATES", "").lower() in ("1", "true")
+        if cache_path or near_duplicates:
+            from agents.cache import SQLiteCacheBackend
+            # A SQLite file lets all workers on the host share one cache
+            coordinator.classifier.cache = coordinator.classifier.build_cache(
+                backend=SQLiteCacheBackend(cache_path) if cache_path else None,
+                near_duplicates=near_duplicates,
+            )
     except Exception as e:
         init_error = f"Failed to initialize TicketCoordinator: {str(e)}"
         raise HTTPException(status_code=500, detail=init_error)
+
+    # Fill the routing and knowledge base caches off the request path
+    if os.environ.get("WARM_CACHES_ON_START", "true").lower() not in ("0", "false"):
+        threading.Thread(target=warm_caches, args=(coordinator,), name="cache-warmup", daemon=True).start()
         
     return coordinator
 
+def warm_caches(agent):
+    try:
+        with profiler.phase("warmup_caches"):
+            agent.warm()
+    except Exception as e:
+        # Requests still load the caches lazily
+        print(f"Background cache warm-up failed: {e}")
+
+@app.on_event("shutdown")
+def shutdown_coordinator():
+    if ticket_queue:
+        ticket_queue.stop()
+    # Flush buffered telemetry before the worker exits
+    if coordinator:
+        coordinator.close()
+
 # --- Data Models ---
 class TicketRequest(BaseModel):
     description: str
 
+class BulkTicketItem(BaseModel):
+    description: str
+    ticket_id: Optional[str] = None
+
+class BulkTicketRequest(BaseModel):
+    tickets: List[BulkTicketItem]
+
+class QueuedTicketRequest(BaseModel):
+    description: str
+    ticket_id: Optional[str] = None
+    priority: Optional[str] = None
+    callback_url: Optional[str] = None
+
+# --- Queued Processing ---
+TICKET_QUEUE_RETRY_AFTER_SECONDS = int(os.environ.get("TICKET_QUEUE_RETRY_AFTER_SECONDS", "5"))
+
+def get_ticket_queue():
+    """
+    Builds the ticket queue and starts its workers on first use. Set
+    TICKET_QUEUE_PATH to keep pending tickets in a SQLite file instead of memory.
+    """
+    global ticket_queue
+    if ticket_queue:
+        return ticket_queue
+    from agents.ticket_queue import TicketQueue, InMemoryQueueBackend, SQLiteQueueBackend
+    agent = get_coordinator()
+    queue_path = os.environ.get("TICKET_QUEUE_PATH")
+    ticket_queue = TicketQueue(
+        agent,
+        backend=SQLiteQueueBackend(queue_path) if queue_path else InMemoryQueueBackend(),
+        workers=int(os.environ.get("TICKET_QUEUE_WORKERS", "4")),
+        max_depth=int(os.environ.get("TICKET_QUEUE_MAX_DEPTH", "1000")),
+        # callback_url is rejected unless its host is listed here
+        callback_hosts=[h.strip() for h in os.environ.get("TICKET_QUEUE_CALLBACK_HOSTS", "").split(",") if h.strip()],
+    )
+    ticket_queue.start()
+    return ticket_queue
+
+# --- Bulk Processing ---
+BULK_CONCURRENCY = int(os.environ.get("BULK_CONCURRENCY", "8"))
+MAX_BULK_TICKETS = int(os.environ.get("MAX_BULK_TICKETS", "10000"))
+
+def parse_bulk_body(body: bytes, content_type: str) -> list:
+    """
+    Parses a bulk upload into ticket dicts.
+
+    Accepts a JSON list (or {"tickets": [...]}), NDJSON with one ticket per
+    line, or CSV with a `description` column and optional `ticket_id`.
+    """
+    text = body.decode("utf-8-sig")
+    if "csv" in content_type:
+        items = [BulkTicketItem(**row) for row in csv.DictReader(io.StringIO(text))]
+    elif "ndjson" in content_type or "jsonl" in content_type:
+        items = [BulkTicketItem.model_validate_json(line) for line in text.splitlines() if line.strip()]
+    else:
+        payload = json.loads(text)
+        items = BulkTicketRequest.model_validate({"tickets": payload} if isinstance(payload, list) else payload).tickets
+    return [{"description": item.description, "ticket_id": item.ticket_id or None} for item in items]
+
+async def stream_bulk_results(agent, tickets: list, concurrency: int):
+    """
+    Runs tickets through the coordinator with bounded concurrency and yields
+    one NDJSON line per ticket in completion order.
+    """
+    pending = asyncio.Queue()
+    for ticket in tickets:
+        pending.put_nowait(ticket)
+    completed = asyncio.Queue()
+
+    async def worker():
+        while True:
+            try:
+                ticket = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                result = await agent.aprocess_ticket(ticket["description"], ticket.get("ticket_id"))
+            except Exception as e:
+                result = {"ticket_id": ticket.get("ticket_id"), "status": "error", "error": str(e)}
+            await completed.put(result)
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(tickets)))]
+    try:
+        for _ in range(len(tickets)):
+            result = await completed.get()
+            yield json.dumps(result) + "\n"
+    finally:
+        # Client disconnected or we are done; stop handing out new tickets
+        for task in workers:
+            task.cancel()
+
+def sse_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+async def stream_ticket_events(agent, description: str):
+    """
+    Processes one ticket and yields Server-Sent Events: "classification",
+    "solutions" and "routing" as each stage finishes, then "result" with the
+    full response (or "error").
+    """
+    events = asyncio.Queue()
+
+    async def run():
+        try:
+            result = await agent.aprocess_ticket(
+                description, on_stage=lambda event, fields: events.put_nowait((event, fields))
+            )
+            events.put_nowait(("result", result))
+        except Exception as e:
+            events.put_nowait(("error", {"detail": f"Internal Agent Error: {str(e)}"}))
+
+    task = asyncio.create_task(run())
+    try:
+        while True:
+            event, data = await events.get()
+            yield sse_event(event, data)
+            if event in ("result", "error"):
+                return
+    finally:
+        # Client disconnected; don't keep working on a ticket nobody is watching
+        task.cancel()
+
 # --- API Endpoints ---
 from fastapi.responses import JSONResponse
 from starlette.exceptions import HTTPException as StarletteHTTPException
@@ -121,13 +328,186 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
 async def process_ticket_endpoint(ticket: TicketRequest):
     try:
         agent = get_coordinator()
-        result = agent.process_ticket(ticket.description)
+        # Native async path: Gemini is awaited and BigQuery runs on a sized
+        # executor, so a slow ticket no longer stalls the event loop.
+        result = await agent.aprocess_ticket(ticket.description)
         return result
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Internal Agent Error: {str(e)}")
 
+@app.post("/process-ticket/stream") # Alias in case Vercel strips /api prefix
+@app.post("/api/process-ticket/stream")
+async def process_ticket_stream_endpoint(ticket: TicketRequest):
+    """
+    Same as /api/process-ticket, but streams each stage result as a Server-Sent Event as soon as it is ready.
+    """
+    agent = get_coordinator()
+    return StreamingResponse(
+        stream_ticket_events(agent, ticket.description),
+        media_type="text/event-stream",
+        # Proxies must not buffer the stream or the events arrive all at once
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post("/process-tickets") # Alias in case Vercel strips /api prefix
+@app.post("/api/process-tickets")
+async def process_tickets_endpoint(request: Request):
+    """
+    Bulk ticket processing. Results are streamed back as NDJSON as each ticket finishes.
+    """
+    try:
+        tickets = parse_bulk_body(await request.body(), request.headers.get("content-type", ""))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid bulk ticket payload: {str(e)}")
+    if not tickets:
+        raise HTTPException(status_code=400, detail="No tickets provided.")
+    if len(tickets) > MAX_BULK_TICKETS:
+        raise HTTPException(status_code=413, detail=f"Too many tickets: {len(tickets)} > {MAX_BULK_TICKETS}")
+
+    agent = get_coordinator()
+    return StreamingResponse(
+        stream_bulk_results(agent, tickets, BULK_CONCURRENCY),
+        media_type="application/x-ndjson",
+    )
+
+@app.post("/queue/tickets") # Alias in case Vercel strips /api prefix
+@app.post("/api/queue/tickets")
+async def enqueue_ticket_endpoint(ticket: QueuedTicketRequest):
+    """
+    Queues a ticket and returns its id immediately (202). Poll
+    /api/queue/tickets/{ticket_id} or pass callback_url to receive the result.
+    """
+    from agents.ticket_queue import QueueFullError, CallbackNotAllowedError, PRIORITY_LANES
+    if ticket.priority and ticket.priority.lower() not in PRIORITY_LANES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of {list(PRIORITY_LANES)}")
+
+    queue = get_ticket_queue()
+    try:
+        job = queue.enqueue(ticket.description, ticket.ticket_id, ticket.priority, ticket.callback_url)
+    except CallbackNotAllowedError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except QueueFullError as e:
+        return JSONResponse(
+            status_code=429,
+            content={"detail": str(e)},
+            headers={"Retry-After": str(TICKET_QUEUE_RETRY_AFTER_SECONDS)},
+        )
+    return JSONResponse(
+        status_code=202,
+        content={"ticket_id": job["ticket_id"], "status": job["status"], "priority": job["priority"]},
+    )
+
+@app.get("/queue/tickets/{ticket_id}") # Alias in case Vercel strips /api prefix
+@app.get("/api/queue/tickets/{ticket_id}")
+async def queued_ticket_endpoint(ticket_id: str):
+    """
+    Returns the queue record for a ticket, including its result once status is "done".
+    """
+    job = get_ticket_queue().get(ticket_id)
+    if job is None:
+        # Not raised as HTTPException: the handler above rewrites every 404 as a missing route
+        return JSONResponse(status_code=404, content={"detail": f"Unknown ticket_id: {ticket_id}"})
+    return job
+
+@app.get("/queue/stats") # Alias in case Vercel strips /api prefix
+@app.get("/api/queue/stats")
+async def queue_stats_endpoint():
+    """
+    Reports queue depth per priority lane and worker outcomes.
+    """
+    return get_ticket_queue().snapshot()
+
+@app.get("/warmup") # Alias in case Vercel strips /api prefix
+@app.get("/api/warmup")
+async def warmup_endpoint():
+    """
+    Pre-builds the coordinator, the shared clients, the routing table and
+    whatever the retrieval mode reads (candidate cache or vector index) so the
+    first real ticket does not pay for them. Safe to call repeatedly.
+    """
+    agent = get_coordinator()
+
+    def build_clients():
+        with profiler.phase("warmup_clients"):
+            agent.resources.bq_client
+            agent.resources.model
+        with profiler.phase("warmup_data"):
+            return agent.warm()
+
+    try:
+        warmed = await asyncio.get_running_loop().run_in_executor(None, build_clients)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Warm-up failed: {str(e)}")
+    return {"status": "warm", "warmed": warmed, "init_timings_ms": agent.resources.init_timings_ms}
+
+@app.get("/startup-profile") # Alias in case Vercel strips /api prefix
+@app.get("/api/startup-profile")
+async def startup_profile_endpoint():
+    """
+    Reports import and initialization timings for this process.
+    """
+    report = profiler.report()
+    report["api_module_import_ms"] = API_MODULE_IMPORT_MS
+    if coordinator:
+        report["client_init_ms"] = coordinator.resources.init_timings_ms
+    return report
+
+@app.get("/dependencies") # Alias in case Vercel strips /api prefix
+@app.get("/api/dependencies")
+async def dependencies_endpoint():
+    """
+    Reports retry, timeout, hedge and circuit-breaker outcomes per dependency.
+    """
+    coord = get_coordinator()
+    return coord.resilience.stats()
+
+@app.get("/coalescing") # Alias in case Vercel strips /api prefix
+@app.get("/api/coalescing")
+async def coalescing_endpoint():
+    """
+    Reports how many Gemini/BigQuery calls were shared between identical in-flight tickets.
+    """
+    coord = get_coordinator()
+    return coord.coalescing_stats()
+
+@app.get("/incidents") # Alias in case Vercel strips /api prefix
+@app.get("/api/incidents")
+async def incidents_endpoint():
+    """
+    Lists open incidents (bursts of similar tickets) and recently closed ones.
+    """
+    coord = get_coordinator()
+    return coord.incident_summaries()
+
+CACHE_TARGETS = ("knowledge_base", "routing_rules", "all")
+
+@app.post("/admin/invalidate-cache") # Alias in case Vercel strips /api prefix
+@app.post("/api/admin/invalidate-cache")
+async def invalidate_cache_endpoint(request: Request, target: str = "all"):
+    """
+    Drops the in-memory knowledge_base and/or routing_rules copies so they are reloaded now.
+    Requires the X-Admin-Token header to match the ADMIN_TOKEN environment variable.
+    """
+    admin_token = os.environ.get("ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_TOKEN not set)")
+    if not hmac.compare_digest(request.headers.get("x-admin-token", "").encode(), admin_token.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+    if target not in CACHE_TARGETS:
+        raise HTTPException(status_code=400, detail=f"target must be one of {list(CACHE_TARGETS)}")
+
+    agent = get_coordinator()
+    invalidated = []
+    if target in ("knowledge_base", "all"):
+        agent.retriever.invalidate_candidates()
+        invalidated.append("knowledge_base")
+    if target in ("routing_rules", "all"):
+        agent.router.invalidate_rules()
+        invalidated.append("routing_rules")
+    return {"status": "invalidated", "targets": invalidated}
+
 @app.get("/", response_class=HTMLResponse)
 async def read_root():
     return """
@@ -254,6 +634,56 @@ async def read_root():
                 document.getElementById('description').value = examples[type] || "";
             }
 
+            function resetResults() {
+                ['resCategory', 'resPriority', 'resTeam', 'resSLA'].forEach(id => {
+                    document.getElementById(id).textContent = '--';
+                });
+                document.getElementById('resPriority').className = 'font-medium text-slate-800 capitalize bg-slate-100 px-2 py-1 rounded';
+                document.getElementById('resReason').textContent = 'Routing...';
+                document.getElementById('solutionsList').innerHTML = '<p class="text-xs text-slate-400 italic animate-pulse">Searching knowledge base...</p>';
+            }
+
+            function renderClassification(classification) {
+                document.getElementById('resCategory').textContent = classification.category;
+                document.getElementById('resPriority').textContent = classification.priority;
+
+                // Color code priority
+                const p = classification.priority.toLowerCase();
+                const pEl = document.getElementById('resPriority');
+                pEl.className = `font-medium capitalize px-2 py-1 rounded ${
+                    p === 'critical' ? 'bg-red-100 text-red-700' : 
+                    p === 'high' ? 'bg-orange-100 text-orange-700' : 
+                    'bg-blue-100 text-blue-700'
+                }`;
+            }
+
+            function renderRouting(routing) {
+                document.getElementById('resTeam').textContent = routing.assigned_team;
+                document.getElementById('resSLA').textContent = routing.sla_hours;
+                document.getElementById('resReason').textContent = routing.routing_reason;
+            }
+
+            function renderSolutions(solutions) {
+                const solutionsList = document.getElementById('solutionsList');
+                solutionsList.innerHTML = '';
+                if (solutions && solutions.length > 0) {
+                    solutions.forEach(sol => {
+                        const div = document.createElement('div');
+                        div.className = 'p-3 bg-slate-50 rounded border border-slate-100 text-sm hover:border-blue-200 transition-colors cursor-default';
+                        div.innerHTML = `
+                            <div class="flex justify-between mb-1">
+                                <span class="font-medium text-slate-700">${sol.solution_id.substring(0,8)}...</span>
+                                <span class="text-xs text-green-600 bg-green-50 px-1.5 rounded">Success Rate: ${(sol.success_rate * 100).toFixed(0)}%</span>
+                            </div>
+                            <p class="text-slate-600 text-xs">${sol.solution_text}</p>
+                        `;
+                        solutionsList.appendChild(div);
+                    });
+                } else {
+                    solutionsList.innerHTML = '<p class="text-xs text-slate-400 italic">No historical solutions found.</p>';
+                }
+            }
+
             document.getElementById('ticketForm').addEventListener('submit', async (e) => {
                 e.preventDefault();
                 const desc = document.getElementById('description').value;
@@ -267,69 +697,62 @@ async def read_root():
                 loadingIcon.classList.remove('hidden');
                 arrowIcon.classList.add('hidden');
                 
-                // Hide old results
+                // Reset the results card; each section fills in as its stage finishes
+                resetResults();
                 document.getElementById('resultsCard').classList.add('hidden');
                 document.getElementById('emptyState').classList.remove('hidden');
 
                 try {
                     const start = Date.now();
-                    const response = await fetch('/api/process-ticket', {
+                    const response = await fetch('/api/process-ticket/stream', {
                         method: 'POST',
                         headers: { 'Content-Type': 'application/json' },
                         body: JSON.stringify({ description: desc })
                     });
-                    
-                    const data = await response.json();
-                    
+
                     if (!response.ok) {
+                        const data = await response.json().catch(() => ({}));
                         const errorMsg = data.detail || (response.status === 404 ? "API Route Not Found (404)" : "Server Error");
                         throw new Error(errorMsg);
                     }
 
-                    const latency = Date.now() - start;
-
-                    // Populate UI
-                    document.getElementById('latencyTag').textContent = `${latency} ms`;
-                    document.getElementById('resCategory').textContent = data.classification.category;
+                    // Server-Sent Events over fetch (EventSource cannot POST a body)
+                    const reader = response.body.getReader();
+                    const decoder = new TextDecoder();
+                    let buffer = '';
+                    let firstResultMs = null;
+                    while (true) {
+                        const { value, done } = await reader.read();
+                        if (done) break;
+                        buffer += decoder.decode(value, { stream: true });
+                        let boundary;
+                        while ((boundary = buffer.indexOf('\\n\\n')) !== -1) {
+                            const block = buffer.slice(0, boundary);
+                            buffer = buffer.slice(boundary + 2);
+                            let event = 'message';
+                            let data = '';
+                            block.split('\\n').forEach(line => {
+                                if (line.startsWith('event: ')) event = line.slice(7);
+                                else if (line.startsWith('data: ')) data += line.slice(6);
+                            });
+                            const payload = JSON.parse(data);
+                            if (event === 'error') throw new Error(payload.detail || 'Server Error');
 
-                    document.getElementById('resPriority').textContent = data.classification.priority;
-                    
-                    // Color code priority
-                    const p = data.classification.priority.toLowerCase();
-                    const pEl = document.getElementById('resPriority');
-                    pEl.className = `font-medium capitalize px-2 py-1 rounded ${
-                        p === 'critical' ? 'bg-red-100 text-red-700' : 
-                        p === 'high' ? 'bg-orange-100 text-orange-700' : 
-                        'bg-blue-100 text-blue-700'
-                    }`;
-
-                    document.getElementById('resTeam').textContent = data.routing.assigned_team;
-                    document.getElementById('resSLA').textContent = data.routing.sla_hours;
-                    document.getElementById('resReason').textContent = data.routing.routing_reason;
-
-                    const solutionsList = document.getElementById('solutionsList');
-                    solutionsList.innerHTML = '';
-                    if (data.suggested_solutions && data.suggested_solutions.length > 0) {
-                        data.suggested_solutions.forEach(sol => {
-                            const div = document.createElement('div');
-                            div.className = 'p-3 bg-slate-50 rounded border border-slate-100 text-sm hover:border-blue-200 transition-colors cursor-default';
-                            div.innerHTML = `
-                                <div class="flex justify-between mb-1">
-                                    <span class="font-medium text-slate-700">${sol.solution_id.substring(0,8)}...</span>
-                                    <span class="text-xs text-green-600 bg-green-50 px-1.5 rounded">Success Rate: ${(sol.success_rate * 100).toFixed(0)}%</span>
-                                </div>
-                                <p class="text-slate-600 text-xs">${sol.solution_text}</p>
-                            `;
-                            solutionsList.appendChild(div);
-                        });
-                    } else {
-                        solutionsList.innerHTML = '<p class="text-xs text-slate-400 italic">No historical solutions found.</p>';
+                            const elapsed = Date.now() - start;
+                            if (firstResultMs === null) {
+                                firstResultMs = elapsed;
+                                document.getElementById('emptyState').classList.add('hidden');
+                                document.getElementById('resultsCard').classList.remove('hidden');
+                            }
+                            if (event === 'classification') renderClassification(payload.classification);
+                            else if (event === 'solutions') renderSolutions(payload.suggested_solutions);
+                            else if (event === 'routing') renderRouting(payload.routing);
+                            document.getElementById('latencyTag').textContent = event === 'result'
+                                ? `${firstResultMs} ms first / ${elapsed} ms total`
+                                : `${elapsed} ms`;
+                        }
                     }
 
-                    // Show Results
-                    document.getElementById('emptyState').classList.add('hidden');
-                    document.getElementById('resultsCard').classList.remove('hidden');
-
                 } catch (err) {
                     console.error(err);
                     alert(`${err.message}`);
@@ -343,3 +766,5 @@ async def read_root():
     </body>
     </html>
     """
+
+API_MODULE_IMPORT_MS = round((time.perf_counter() - _module_start) * 1000, 2)
@@ -0,0 +1,350 @@
+"""
+Deterministic in-process stand-ins for Gemini and BigQuery.
+
+They implement just enough of `GenerativeModel` and `bigquery.Client` for the
+agents to run unchanged, with configurable injected latency and failure
+rates, and count every call they receive.
+"""
+import re
+import json
+import uuid
+import time
+import random
+import asyncio
+import threading
+from collections import Counter
+
+from scripts.generate_sample_data import build_routing_rules, build_knowledge_base
+
+CLASSIFICATION_KEYWORDS = [
+    ("billing", ("charge", "charged", "payment", "invoice", "refund", "billing", "subscription")),
+    ("account", ("password", "login", "account", "reset", "permission", "2fa")),
+    ("feature_request", ("feature", "would love", "dark mode", "add support", "wish")),
+]
+PRIORITY_KEYWORDS = [
+    ("critical", ("down", "outage", "data loss", "security", "urgent")),
+    ("high", ("crash", "all users", "broken", "immediately")),
+    ("low", ("would love", "cosmetic", "question", "wish")),
+]
+
+
+COMPARISONS = {
+    "=": lambda a, b: a == b,
+    ">": lambda a, b: a > b,
+    "<": lambda a, b: a < b,
+}
+
+
+class FakeServiceError(Exception):
+    """
+    Stands in for a transient 429/503 from a Google API.
+    """
+    code = 503
+
+
+class LatencyModel:
+    """
+    Injects a latency of `mean_ms` +/- `jitter_ms` and fails `failure_rate` of calls.
+    """
+
+    def __init__(self, mean_ms: float = 0.0, jitter_ms: float = 0.0, failure_rate: float = 0.0, seed: int = 7):
+        self.mean_ms = mean_ms
+        self.jitter_ms = jitter_ms
+        self.failure_rate = failure_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self):
+        with self._lock:
+            delay = max(0.0, self.mean_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+            failed = self._rng.random() < self.failure_rate
+        return delay, failed
+
+    def wait(self):
+        delay, failed = self._draw()
+        if delay:
+            time.sleep(delay)
+        if failed:
+            raise FakeServiceError("Injected failure")
+
+    async def await_(self):
+        delay, failed = self._draw()
+        if delay:
+            await asyncio.sleep(delay)
+        if failed:
+            raise FakeServiceError("Injected failure")
+
+
+class CallCounter:
+    def __init__(self):
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+
+class FakeUsageMetadata:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+
+class FakeResponse:
+    def __init__(self, prompt, text):
+        self.text = text
+        self.usage_metadata = FakeUsageMetadata(len(prompt) // 4, len(text) // 4)
+
+
+class FakeStream:
+    """
+    Mimics a `stream=True` response: iterable (sync or async) chunks of the
+    text, `chunk_delay` seconds apart, with cumulative usage metadata.
+    Stops yielding once `cancel()` is called, like a cancelled gRPC stream.
+    """
+
+    def __init__(self, prompt, text, chunk_chars, chunk_delay):
+        self.chunks = []
+        for end in range(chunk_chars, len(text) + chunk_chars, chunk_chars):
+            chunk = FakeResponse(prompt, text[end - chunk_chars:end])
+            chunk.usage_metadata = FakeUsageMetadata(len(prompt) // 4, min(end, len(text)) // 4)
+            self.chunks.append(chunk)
+        self.chunk_delay = chunk_delay
+        self.consumed = 0
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            if self.cancelled:
+                return
+            if self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            self.consumed += 1
+            yield chunk
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            if self.cancelled:
+                return
+            if self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+            self.consumed += 1
+            yield chunk
+
+
+def classify_text(text: str) -> dict:
+    lowered = text.lower()
+    category = next((c for c, words in CLASSIFICATION_KEYWORDS if any(w in lowered for w in words)), "technical")
+    priority = next((p for p, words in PRIORITY_KEYWORDS if any(w in lowered for w in words)), "medium")
+    return {"category": category, "priority": priority, "reasoning": f"Keyword match for {category}/{priority}."}
+
+
+class FakeGenerativeModel:
+    """
+    Answers classification, batch classification and re-rank prompts deterministically.
+    """
+
+    def __init__(self, latency: LatencyModel = None, model_name: str = "gemini-2.0-flash",
+                 chunk_chars: int = 16, chunk_delay_ms: float = 0.0):
+        self.model_name = model_name
+        self.latency = latency or LatencyModel()
+        self.calls = CallCounter()
+        # Output is generated `chunk_chars` at a time; a non-streamed response waits for all of it
+        self.chunk_chars = chunk_chars
+        self.chunk_delay = chunk_delay_ms / 1000
+
+    def _respond(self, prompt):
+        if "Tickets:" in prompt:
+            self.calls.add("classify_batch")
+            tickets = json.loads(re.search(r"Tickets:\s*(\[.*\])", prompt, re.DOTALL).group(1))
+            items = [dict(classify_text(t["description"]), id=t["id"]) for t in tickets]
+            return FakeResponse(prompt, json.dumps(items))
+        if "Candidates (id | problem | solution)" in prompt:
+            self.calls.add("rerank")
+            aliases = re.findall(r"^(\d+) \|", prompt, re.MULTILINE)
+            top_k = int(re.search(r"at most (\d+)", prompt).group(1))
+            return FakeResponse(prompt, json.dumps(aliases[:top_k]))
+        self.calls.add("classify")
+        description = prompt.rsplit("Ticket Description:", 1)[-1]
+        return FakeResponse(prompt, "```json\n" + json.dumps(classify_text(description)) + "\n```")
+
+    def _generation_seconds(self, response):
+        return -(-len(response.text) // self.chunk_chars) * self.chunk_delay
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        try:
+            self.latency.wait()
+        except FakeServiceError:
+            self.calls.add("failed")
+            raise
+        response = self._respond(prompt)
+        if stream:
+            return FakeStream(prompt, response.text, self.chunk_chars, self.chunk_delay)
+        if self.chunk_delay:
+            time.sleep(self._generation_seconds(response))
+        return response
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        try:
+            await self.latency.await_()
+        except FakeServiceError:
+            self.calls.add("failed")
+            raise
+        response = self._respond(prompt)
+        if stream:
+            return FakeStream(prompt, response.text, self.chunk_chars, self.chunk_delay)
+        if self.chunk_delay:
+            await asyncio.sleep(self._generation_seconds(response))
+        return response
+
+
+class FakeRow(dict):
+    """
+    Mimics `bigquery.Row`: supports both item and attribute access.
+    """
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+class FakeQueryJob(list):
+    def __init__(self, rows, total_bytes_processed):
+        super().__init__(rows)
+        self.total_bytes_processed = total_bytes_processed
+
+    def result(self):
+        return self
+
+
+class FakeBigQueryClient:
+    """
+    Serves SELECTs against in-memory copies of the sample tables.
+
+    Understands the subset of SQL the agents send: column projection,
+    equality filters bound via query parameters, ORDER BY ... DESC and LIMIT.
+    """
+
+    def __init__(self, tables: dict = None, latency: LatencyModel = None, project: str = "benchmark-project"):
+        self.project = project
+        self.tables = tables if tables is not None else sample_tables()
+        self.latency = latency or LatencyModel()
+        self.calls = CallCounter()
+        self.inserted = Counter()
+        self.insert_batches = []
+
+    def query(self, query, job_config=None):
+        try:
+            self.latency.wait()
+        except FakeServiceError:
+            self.calls.add("failed")
+            raise
+        self.calls.add("query")
+        if query.lstrip().startswith("MERGE"):
+            return self._merge(query)
+        table = re.search(r"\.(\w+)`", query).group(1)
+        rows = list(self.tables.get(table, []))
+
+        params = getattr(job_config, "query_parameters", None) or []
+        for param in params:
+            condition = re.search(rf"(\w+)\s*(=|>|<)\s*@{param.name}\b", query)
+            if condition is None:
+                continue
+            column, op = condition.groups()
+            compare = COMPARISONS[op]
+            rows = [r for r in rows if r.get(column) is not None and compare(r.get(column), param.value)]
+
+        order = re.search(r"ORDER BY (\w+) DESC", query)
+        if order:
+            rows.sort(key=lambda r: r.get(order.group(1)) or 0, reverse=True)
+        limit = re.search(r"LIMIT (\d+)", query)
+        if limit:
+            rows = rows[:int(limit.group(1))]
+
+        columns = [c.strip() for c in re.search(r"SELECT (.*?)\s+FROM", query, re.DOTALL).group(1).split(",")]
+        if columns != ["*"]:
+            rows = [{c: r.get(c) for c in columns} for r in rows]
+        processed = sum(len(json.dumps(r, default=str)) for r in self.tables.get(table, []))
+        return FakeQueryJob([FakeRow(r) for r in rows], processed)
+
+    def insert_rows_json(self, table_id, rows, **kwargs):
+        self.latency.wait()
+        self.calls.add("insert_rows_json")
+        self.inserted[table_id.rsplit(".", 1)[-1]] += len(rows)
+        self.insert_batches.append(list(rows))
+        return []
+
+    def load_table_from_file(self, file_obj, table_id, job_config=None, **kwargs):
+        self.latency.wait()
+        self.calls.add("load_table_from_file")
+        lines = file_obj.read().decode("utf-8").splitlines()
+        self.tables[table_id.rsplit(".", 1)[-1]] = [json.loads(line) for line in lines if line]
+        return FakeQueryJob([], 0)
+
+    def delete_table(self, table_id, not_found_ok=False):
+        self.calls.add("delete_table")
+        name = table_id.rsplit(".", 1)[-1]
+        if name not in self.tables and not not_found_ok:
+            raise KeyError(table_id)
+        self.tables.pop(name, None)
+
+    def _merge(self, query):
+        # Upserts on ticket_id, the only MERGE the agents send
+        target, source = re.findall(r"`[^`]*\.(\w+)`", query)[:2]
+        rows = {row["ticket_id"]: row for row in self.tables.get(target, [])}
+        for row in self.tables.get(source, []):
+            rows[row["ticket_id"]] = {**rows.get(row["ticket_id"], {}), **row}
+        self.tables[target] = list(rows.values())
+        return FakeQueryJob([], 0)
+
+
+class RecordingSink:
+    """
+    Keeps telemetry (or ticket history) rows in memory instead of streaming them to BigQuery.
+    """
+
+    def __init__(self):
+        self.rows = []
+        self._lock = threading.Lock()
+
+    def emit(self, row):
+        with self._lock:
+            self.rows.append(row)
+        return True
+
+    def close(self):
+        pass
+
+
+class FakeResources:
+    """
+    Drop-in for `agents.resources.SharedResources` backed by the fakes.
+    """
+
+    def __init__(self, model=None, bq_client=None, model_name="gemini-2.0-flash"):
+        self.model = model or FakeGenerativeModel()
+        self.bq_client = bq_client or FakeBigQueryClient()
+        self.model_name = model_name
+        self.init_timings_ms = {}
+
+
+def sample_tables(seed: int = 7) -> dict:
+    """
+    Builds the routing_rules and knowledge_base sample tables reproducibly for `seed`.
+    """
+    state = random.getstate()
+    random.seed(seed)
+    try:
+        knowledge_base = build_knowledge_base()
+        for row in knowledge_base:
+            row["solution_id"] = str(uuid.UUID(int=random.getrandbits(128), version=4))
+        return {"routing_rules": build_routing_rules(), "knowledge_base": knowledge_base}
+    finally:
+        random.setstate(state)
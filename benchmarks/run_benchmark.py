@@ -0,0 +1,319 @@
+"""
+Offline benchmark for the ticket pipeline.
+
+Runs `TicketCoordinator.process_ticket` (or `aprocess_ticket`) and each agent
+against the in-process fakes in `benchmarks.fakes`, so it needs no network or
+credentials and can run in CI. Reports throughput, p50/p95/p99 latency,
+allocations and per-stage call counts.
+
+Usage:
+    python -m benchmarks.run_benchmark --tickets 200 --concurrency 8 \\
+        --gemini-latency-ms 40 --bigquery-latency-ms 25 --failure-rate 0.02
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+import contextlib
+import threading
+import tracemalloc
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from agents.coordinator import TicketCoordinator
+from agents.concurrency import DependencyLimits
+from agents.resilience import CircuitBreaker, Resilience, ResilientCall, RetryPolicy
+from benchmarks.fakes import FakeBigQueryClient, FakeGenerativeModel, FakeResources, LatencyModel, RecordingSink
+
+TICKET_TEMPLATES = [
+    "I was charged twice for my subscription this month and need a refund.",
+    "The app crashes on startup after the latest update.",
+    "I can't reset my password, the reset email never arrives.",
+    "Would love a dark mode option in the dashboard.",
+    "Production API is down for all users, urgent!",
+    "Invoice for last month shows the wrong tax amount.",
+    "Two-factor login keeps failing on my account.",
+    "Please add support for exporting reports to CSV.",
+    "Data sync between the mobile app and web is broken.",
+    "Promo code was not applied to my payment.",
+]
+
+# Ambiguous on purpose, so it escalates past the rule fast path to Gemini
+OUTAGE_TICKET = "Checkout keeps failing with an error and I was charged anyway, is something wrong on your side?"
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile; returns 0.0 for an empty list.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(max(1, math.ceil(pct / 100 * len(ordered))), len(ordered))
+    return float(ordered[rank - 1])
+
+
+def summarize(latencies_ms, wall_seconds):
+    return {
+        "count": len(latencies_ms),
+        "throughput_per_s": round(len(latencies_ms) / wall_seconds, 2) if wall_seconds else 0.0,
+        "p50_ms": round(percentile(latencies_ms, 50), 2),
+        "p95_ms": round(percentile(latencies_ms, 95), 2),
+        "p99_ms": round(percentile(latencies_ms, 99), 2),
+        "max_ms": round(max(latencies_ms), 2) if latencies_ms else 0.0,
+    }
+
+
+def make_tickets(count, seed=7, duplicate_rate=0.0):
+    rng = random.Random(seed)
+    # The suffix keeps descriptions distinct so the classification cache does not hide model calls
+    tickets = [f"{rng.choice(TICKET_TEMPLATES)} (ref {i})" for i in range(count)]
+    # Simulates an outage: a share of customers send the same ticket at once
+    return [OUTAGE_TICKET if rng.random() < duplicate_rate else ticket for ticket in tickets]
+
+
+def build_resilience(args):
+    def build(name):
+        return ResilientCall(
+            name,
+            retry=RetryPolicy(max_attempts=args.retry_attempts, base_delay_seconds=0.01, max_delay_seconds=0.1),
+            breaker=CircuitBreaker(failure_threshold=args.breaker_threshold, reset_timeout_seconds=1.0),
+            deadline_seconds=args.deadline_ms / 1000 if args.deadline_ms else None,
+            hedge_after_seconds=args.hedge_after_ms / 1000 if args.hedge_after_ms else None,
+        )
+
+    return Resilience(gemini=build("gemini"), bigquery=build("bigquery"))
+
+
+def build_coordinator(args):
+    model = FakeGenerativeModel(
+        LatencyModel(args.gemini_latency_ms, args.jitter_ms, args.failure_rate, seed=args.seed),
+        chunk_delay_ms=args.gemini_chunk_ms,
+    )
+    bq_client = FakeBigQueryClient(
+        latency=LatencyModel(args.bigquery_latency_ms, args.jitter_ms, args.failure_rate, seed=args.seed + 1)
+    )
+    coordinator = TicketCoordinator(
+        "benchmark-project",
+        concurrent=not args.sequential,
+        retrieval_mode=args.retrieval_mode,
+        limits=DependencyLimits(
+            gemini_concurrency=args.concurrency * 2,
+            bigquery_concurrency=args.concurrency * 2,
+            executor_workers=args.concurrency * 2,
+        ),
+        max_workers=args.concurrency * 3,
+        cache_classifications=args.cache,
+        fast_path=args.fast_path,
+        resilience=build_resilience(args),
+        cache_candidates=not args.no_candidate_cache,
+        resources=FakeResources(model=model, bq_client=bq_client),
+        stream_classification=args.stream_classification,
+    )
+    default_sink = coordinator.tracer.sink
+    coordinator.tracer.sink = RecordingSink()
+    default_sink.close()
+    coordinator.warm()
+    return coordinator, model, bq_client
+
+
+def run_sync(fn, tickets, concurrency):
+    latencies = []
+    lock = threading.Lock()
+
+    def timed(index, ticket):
+        start = time.perf_counter()
+        fn(ticket, f"bench-{index}")
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(timed, range(len(tickets)), tickets))
+    return latencies, time.perf_counter() - start
+
+
+def run_async(fn, tickets, concurrency):
+    latencies = []
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def timed(index, ticket):
+            async with semaphore:
+                start = time.perf_counter()
+                await fn(ticket, f"bench-{index}")
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        await asyncio.gather(*(timed(i, t) for i, t in enumerate(tickets)))
+
+    start = time.perf_counter()
+    asyncio.run(main())
+    return latencies, time.perf_counter() - start
+
+
+def measure(label, runner, fn, tickets, concurrency, trace_allocations):
+    if trace_allocations:
+        tracemalloc.start()
+    latencies, wall = runner(fn, tickets, concurrency)
+    result = summarize(latencies, wall)
+    if trace_allocations:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["alloc_peak_kb"] = round(peak / 1024, 1)
+        result["alloc_retained_kb_per_ticket"] = round(current / 1024 / max(1, len(tickets)), 2)
+    result["name"] = label
+    return result
+
+
+def stage_breakdown(rows):
+    by_stage = defaultdict(list)
+    errors = defaultdict(int)
+    for row in rows:
+        by_stage[row["agent_name"]].append(row["execution_time_ms"])
+        if row.get("status") not in (None, "ok"):
+            errors[row["agent_name"]] += 1
+    breakdown = {}
+    for name, values in sorted(by_stage.items()):
+        stats = summarize(values, 0)
+        del stats["throughput_per_s"]
+        stats["errors"] = errors[name]
+        breakdown[name] = stats
+    return breakdown
+
+
+def run(args):
+    coordinator, model, bq_client = build_coordinator(args)
+    tickets = make_tickets(args.tickets, seed=args.seed, duplicate_rate=args.duplicate_rate)
+    sink = coordinator.tracer.sink
+    report = {"config": vars(args), "runs": []}
+    try:
+        if args.mode == "async":
+            pipeline = measure(
+                "pipeline", run_async, lambda t, tid: coordinator.aprocess_ticket(t, tid),
+                tickets, args.concurrency, args.trace_allocations
+            )
+        else:
+            pipeline = measure(
+                "pipeline", run_sync, lambda t, tid: coordinator.process_ticket(t, tid),
+                tickets, args.concurrency, args.trace_allocations
+            )
+        report["runs"].append(pipeline)
+        report["stages"] = stage_breakdown(sink.rows)
+        report["calls"] = {
+            "gemini": dict(model.calls.counts),
+            "bigquery": dict(bq_client.calls.counts),
+        }
+        report["resilience"] = coordinator.resilience.stats()
+        report["coalescing"] = coordinator.coalescing_stats()
+        fast_path = coordinator.classifier.fast_path
+        if fast_path is not None:
+            report["fast_path"] = dict(fast_path.stats, escalation_rate=fast_path.escalation_rate)
+
+        if args.agents:
+            def classify(ticket, ticket_id):
+                return coordinator.classifier.classify(ticket, ticket_id)
+
+            def retrieve(ticket, ticket_id):
+                return coordinator.retriever.retrieve(ticket, "technical")
+
+            def route(ticket, ticket_id):
+                return coordinator.router.route_ticket("technical", "medium")
+
+            for label, fn in (("classifier", classify), ("retriever", retrieve), ("router", route)):
+                report["runs"].append(
+                    measure(label, run_sync, fn, tickets, args.concurrency, args.trace_allocations)
+                )
+    finally:
+        coordinator.close()
+    return report
+
+
+def print_report(report):
+    header = f"{'run':<12}{'count':>7}{'tput/s':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'peak KB':>10}"
+    print(header)
+    print("-" * len(header))
+    for result in report["runs"]:
+        print(
+            f"{result['name']:<12}{result['count']:>7}{result['throughput_per_s']:>10}"
+            f"{result['p50_ms']:>9}{result['p95_ms']:>9}{result['p99_ms']:>9}"
+            f"{result.get('alloc_peak_kb', '-'):>10}"
+        )
+    print("\nPer-stage span latency (ms):")
+    for name, stats in report["stages"].items():
+        print(
+            f"  {name:<12} n={stats['count']:<6} p50={stats['p50_ms']:<8} "
+            f"p95={stats['p95_ms']:<8} p99={stats['p99_ms']:<8} errors={stats['errors']}"
+        )
+    print("\nDependency calls:")
+    for service, counts in report["calls"].items():
+        print(f"  {service}: {counts}")
+    print("\nResilience:")
+    for service, stats in report["resilience"].items():
+        print(f"  {service}: {stats}")
+    print("\nCoalescing:")
+    for agent, stats in report["coalescing"].items():
+        print(f"  {agent}: {stats}")
+    if "fast_path" in report:
+        print(f"\nRule fast path: {report['fast_path']}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmark for the ticket pipeline")
+    parser.add_argument("--tickets", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--mode", choices=["sync", "async"], default="sync")
+    parser.add_argument("--sequential", action="store_true", help="Run pipeline stages one after another")
+    parser.add_argument("--retrieval-mode", choices=["llm", "embedding"], default="llm")
+    parser.add_argument("--gemini-latency-ms", type=float, default=40.0)
+    parser.add_argument("--bigquery-latency-ms", type=float, default=25.0)
+    parser.add_argument("--gemini-chunk-ms", type=float, default=0.0,
+                        help="Generation time per 16-character chunk of Gemini output")
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--retry-attempts", type=int, default=3)
+    parser.add_argument("--breaker-threshold", type=int, default=5)
+    parser.add_argument("--deadline-ms", type=float, help="Per-call deadline for Gemini and BigQuery")
+    parser.add_argument("--hedge-after-ms", type=float, help="Send a hedged duplicate after this long")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--stream-classification", action="store_true",
+                        help="Stream classifications and stop once category and priority are in")
+    parser.add_argument("--cache", action="store_true", help="Enable the classification cache")
+    parser.add_argument("--fast-path", action="store_true", help="Classify unambiguous tickets with local rules")
+    parser.add_argument("--no-candidate-cache", action="store_true", help="Query BigQuery for every retrieval")
+    parser.add_argument("--duplicate-rate", type=float, default=0.0,
+                        help="Fraction of tickets replaced by one identical outage ticket")
+    parser.add_argument("--agents", action="store_true", help="Also benchmark each agent on its own")
+    parser.add_argument("--trace-allocations", action="store_true", help="Track allocations with tracemalloc")
+    parser.add_argument("--verbose", action="store_true", help="Show the agents' progress output")
+    parser.add_argument("--json", dest="json_path", help="Write the full report to this file")
+    parser.add_argument("--max-p95-ms", type=float, help="Exit non-zero if pipeline p95 exceeds this")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.verbose:
+        report = run(args)
+    else:
+        # The agents print per-ticket progress; keep the report readable
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            report = run(args)
+    print_report(report)
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+    pipeline_p95 = report["runs"][0]["p95_ms"]
+    if args.max_p95_ms is not None and pipeline_p95 > args.max_p95_ms:
+        print(f"\nFAIL: pipeline p95 {pipeline_p95}ms exceeds budget {args.max_p95_ms}ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+import os
+import sys
+from google.cloud import bigquery
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from agents.embeddings import build_embedder, knowledge_text, serialize_embedding
+
+def backfill_embeddings(project_id, embedder_name="hashing", batch_size=100, overwrite=False):
+    client = bigquery.Client(project=project_id)
+    dataset_id = "support_tickets_staging"
+    kb_table = f"{project_id}.{dataset_id}.knowledge_base"
+
+    # The service must run with the same EMBEDDER, or it refuses the stored vectors
+    embedder = build_embedder(embedder_name, api_key=os.environ.get("GOOGLE_GENAI_API_KEY"))
+
+    where = "" if overwrite else "WHERE embedding IS NULL"
+    rows = [dict(row) for row in client.query(f"""
+        SELECT solution_id, problem_description, solution_text
+        FROM `{kb_table}`
+        {where}
+    """)]
+    print(f"Embedding {len(rows)} knowledge base entries with the {embedder.name} embedder...")
+
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        vectors = embedder.embed([knowledge_text(row) for row in batch])
+        updates = [
+            bigquery.StructQueryParameter(
+                None,
+                bigquery.ScalarQueryParameter("solution_id", "STRING", row["solution_id"]),
+                bigquery.ScalarQueryParameter("embedding", "STRING", serialize_embedding(vector, embedder)),
+            )
+            for row, vector in zip(batch, vectors)
+        ]
+        # One DML statement per batch instead of one UPDATE per row
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ArrayQueryParameter("updates", "STRUCT", updates)]
+        )
+        client.query(f"""
+            UPDATE `{kb_table}` kb
+            SET embedding = u.embedding, last_updated = CURRENT_TIMESTAMP()
+            FROM UNNEST(@updates) u
+            WHERE kb.solution_id = u.solution_id
+        """, job_config=job_config).result()
+        print(f"Updated {start + len(batch)}/{len(rows)} entries.")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python scripts/backfill_embeddings.py <project_id> [hashing|gemini] [--overwrite]")
+        sys.exit(1)
+
+    embedder_name = sys.argv[2] if len(sys.argv) > 2 and not sys.argv[2].startswith("--") else "hashing"
+    backfill_embeddings(sys.argv[1], embedder_name, overwrite="--overwrite" in sys.argv)
@@ -2,6 +2,16 @@ from google.cloud import bigquery
 from google.cloud.exceptions import NotFound
 import sys
 
+def add_missing_columns(client, full_table_id, schema):
+    # New NULLABLE columns can be appended to an existing table in place
+    table = client.get_table(full_table_id)
+    existing = {field.name for field in table.schema}
+    missing = [field for field in schema if field.name not in existing and field.mode == "NULLABLE"]
+    if missing:
+        table.schema = list(table.schema) + missing
+        client.update_table(table, ["schema"])
+        print(f"Added columns {[field.name for field in missing]} to {full_table_id}")
+
 def create_dataset_and_tables(project_id):
     client = bigquery.Client(project=project_id)
     dataset_id = f"{project_id}.support_tickets_staging"
@@ -74,6 +84,11 @@ def create_dataset_and_tables(project_id):
                 bigquery.SchemaField("cost_usd", "FLOAT", mode="REQUIRED"),
                 bigquery.SchemaField("agent_version", "STRING", mode="REQUIRED"),
                 bigquery.SchemaField("timestamp", "TIMESTAMP", mode="REQUIRED"),
+                bigquery.SchemaField("parent_run_id", "STRING", mode="NULLABLE"),
+                bigquery.SchemaField("bytes_processed", "INTEGER", mode="NULLABLE"),
+                bigquery.SchemaField("cache_hit", "BOOLEAN", mode="NULLABLE"),
+                bigquery.SchemaField("status", "STRING", mode="NULLABLE"),
+                bigquery.SchemaField("tokens_saved", "INTEGER", mode="NULLABLE"),
             ],
             "partitioning": bigquery.TimePartitioning(
                 type_=bigquery.TimePartitioningType.DAY,
@@ -94,6 +109,7 @@ def create_dataset_and_tables(project_id):
         except Exception as e:
             if "Already Exists" in str(e) or "already exists" in str(e).lower():
                 print(f"Table {full_table_id} already exists")
+                add_missing_columns(client, full_table_id, table_config["schema"])
             else:
                 print(f"Error creating table {full_table_id}: {e}")
 
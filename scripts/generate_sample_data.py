@@ -6,18 +6,65 @@ from google.cloud import bigquery
 
 from datetime import datetime, timedelta, timezone
 
+categories = ["billing", "technical", "account", "feature_request"]
+priorities = ["low", "medium", "high", "critical"]
+teams = {
+    "billing": "billing_team",
+    "technical": "engineering_team",
+    "account": "account_management",
+    "feature_request": "product_team"
+}
+
+def build_routing_rules():
+    routing_rules = []
+    sla_matrix = {"critical": 2, "high": 8, "medium": 24, "low": 48}
+    for cat in categories:
+        for prio in priorities:
+            routing_rules.append({
+                "category": cat,
+                "priority": prio,
+                "assigned_team": teams[cat],
+                "sla_hours": sla_matrix[prio]
+            })
+    return routing_rules
+
+def build_knowledge_base():
+    kb_data = []
+    problems = {
+        "billing": [
+            "payment declined", "double charged", "invoice issues", "subscription renewal failure", 
+            "refund request", "incorrect tax calculation", "promo code not working", "payment method expired"
+        ],
+        "technical": [
+            "login failure", "feature broken", "API timeout", "data sync error", "performance slowdown",
+            "app crash on startup", "security vulnerability report", "integration sync failed", "UI rendering issue"
+        ],
+        "account": [
+            "password reset", "email change", "account locked", "username update", "delete account request",
+            "2FA setup issue", "permissions mismatch", "profile details not saving", "invited user cant join"
+        ],
+        "feature_request": [
+            "export functionality", "mobile app support", "dark mode", "bulk operations", "reporting dashboard",
+            "webhook support", "custom themes", "offline mode", "AI suggestions", "multi-language support"
+        ]
+    }
+    
+    for cat, issues in problems.items():
+        for issue in issues:
+            kb_data.append({
+                "solution_id": str(uuid.uuid4()),
+                "category": cat,
+                "problem_description": f"User experiencing {issue}",
+                "solution_text": f"Standard operating procedure for {issue}: verify details, check logs, and apply fix.",
+                "success_rate": round(random.uniform(0.75, 0.98), 2),
+                "embedding": None,
+                "last_updated": datetime.now(timezone.utc).isoformat()
+            })
+    return kb_data
+
 def generate_sample_data(project_id, ticket_count=100):
     client = bigquery.Client(project=project_id)
     dataset_id = "support_tickets_staging"
-
-    categories = ["billing", "technical", "account", "feature_request"]
-    priorities = ["low", "medium", "high", "critical"]
-    teams = {
-        "billing": "billing_team",
-        "technical": "engineering_team",
-        "account": "account_management",
-        "feature_request": "product_team"
-    }
     
     # 1. Generate Routing Rules
     print("Checking routing rules...")
@@ -28,16 +75,7 @@ def generate_sample_data(project_id, ticket_count=100):
     
     if rules_check == 0:
         print("Generating routing rules...")
-        routing_rules = []
-        sla_matrix = {"critical": 2, "high": 8, "medium": 24, "low": 48}
-        for cat in categories:
-            for prio in priorities:
-                routing_rules.append({
-                    "category": cat,
-                    "priority": prio,
-                    "assigned_team": teams[cat],
-                    "sla_hours": sla_matrix[prio]
-                })
+        routing_rules = build_routing_rules()
         client.insert_rows_json(rules_table, routing_rules)
         print(f"Inserted {len(routing_rules)} routing rules.")
     else:
@@ -52,37 +90,7 @@ def generate_sample_data(project_id, ticket_count=100):
     if kb_check == 0:
 
         print("Generating knowledge base...")
-        kb_data = []
-        problems = {
-            "billing": [
-                "payment declined", "double charged", "invoice issues", "subscription renewal failure", 
-                "refund request", "incorrect tax calculation", "promo code not working", "payment method expired"
-            ],
-            "technical": [
-                "login failure", "feature broken", "API timeout", "data sync error", "performance slowdown",
-                "app crash on startup", "security vulnerability report", "integration sync failed", "UI rendering issue"
-            ],
-            "account": [
-                "password reset", "email change", "account locked", "username update", "delete account request",
-                "2FA setup issue", "permissions mismatch", "profile details not saving", "invited user cant join"
-            ],
-            "feature_request": [
-                "export functionality", "mobile app support", "dark mode", "bulk operations", "reporting dashboard",
-                "webhook support", "custom themes", "offline mode", "AI suggestions", "multi-language support"
-            ]
-        }
-        
-        for cat, issues in problems.items():
-            for issue in issues:
-                kb_data.append({
-                    "solution_id": str(uuid.uuid4()),
-                    "category": cat,
-                    "problem_description": f"User experiencing {issue}",
-                    "solution_text": f"Standard operating procedure for {issue}: verify details, check logs, and apply fix.",
-                    "success_rate": round(random.uniform(0.75, 0.98), 2),
-                    "embedding": None,
-                    "last_updated": datetime.now(timezone.utc).isoformat()
-                })
+        kb_data = build_knowledge_base()
         client.insert_rows_json(kb_table, kb_data)
         print(f"Inserted {len(kb_data)} knowledge base entries.")
     else:
@@ -123,11 +131,18 @@ def generate_sample_data(project_id, ticket_count=100):
         })
         
     table_id = f"{project_id}.{dataset_id}.ticket_history"
-    errors = client.insert_rows_json(table_id, tickets)
-    if errors:
-        print(f"Errors inserting ticket history: {errors}")
+    # One load job instead of streaming inserts: free, and no streaming buffer blocking later MERGEs
+    job_config = bigquery.LoadJobConfig(
+        source_format=bigquery.SourceFormat.NEWLINE_DELIMITED_JSON,
+        write_disposition=bigquery.WriteDisposition.WRITE_APPEND,
+    )
+    load_job = client.load_table_from_json(tickets, table_id, job_config=job_config)
+    try:
+        load_job.result()
+    except Exception as e:
+        print(f"Errors loading ticket history: {load_job.errors or e}")
     else:
-        print(f"Successfully inserted {len(tickets)} sample tickets.")
+        print(f"Successfully loaded {len(tickets)} sample tickets.")
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
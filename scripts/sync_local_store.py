@@ -0,0 +1,47 @@
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
+from agents.datastore import BigQueryStore, SQLiteStore, sync_from_bigquery
+
+def sync_local_store(project_id, path, interval_seconds=None):
+    """
+    Mirrors routing_rules and knowledge_base from BigQuery into a SQLite file
+    for LOCAL_STORE_PATH. With an interval it keeps re-syncing until stopped.
+    """
+    from google.cloud import bigquery
+
+    source = BigQueryStore(bigquery.Client(project=project_id), project_id)
+    target = SQLiteStore(path)
+    while True:
+        counts = sync_from_bigquery(source, target)
+        print(f"Synced {counts['routing_rules']} routing rules and {counts['knowledge_base']} knowledge base entries to {path}")
+        if not interval_seconds:
+            return counts
+        time.sleep(interval_seconds)
+
+def seed_local_store(path):
+    """
+    Fills the SQLite file with the generated sample data, for running fully offline.
+    """
+    from scripts.generate_sample_data import build_routing_rules, build_knowledge_base
+
+    target = SQLiteStore(path)
+    counts = {
+        "routing_rules": target.replace_table("routing_rules", build_routing_rules()),
+        "knowledge_base": target.replace_table("knowledge_base", build_knowledge_base()),
+    }
+    print(f"Seeded {path} with {counts['routing_rules']} routing rules and {counts['knowledge_base']} knowledge base entries")
+    return counts
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: python scripts/sync_local_store.py <project_id|--sample> <sqlite_path> [--every SECONDS]")
+        sys.exit(1)
+
+    if sys.argv[1] == "--sample":
+        seed_local_store(sys.argv[2])
+    else:
+        interval = float(sys.argv[sys.argv.index("--every") + 1]) if "--every" in sys.argv else None
+        sync_local_store(sys.argv[1], sys.argv[2], interval)
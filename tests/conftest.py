@@ -0,0 +1,22 @@
+"""
+Shared fixtures that run the agents against the in-process fakes in `benchmarks.fakes`.
+
+Override `fake_model` or `fake_bq` in a test module to script other responses or tables.
+"""
+import pytest
+from benchmarks.fakes import FakeBigQueryClient, FakeGenerativeModel, FakeResources
+
+
+@pytest.fixture
+def fake_model():
+    return FakeGenerativeModel()
+
+
+@pytest.fixture
+def fake_bq():
+    return FakeBigQueryClient()
+
+
+@pytest.fixture
+def fake_resources(fake_model, fake_bq):
+    return FakeResources(model=fake_model, bq_client=fake_bq)
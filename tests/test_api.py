@@ -0,0 +1,200 @@
+import json
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from api import index
+from agents.coordinator import TicketCoordinator
+
+
+class StubResources:
+    init_timings_ms = {"bq_client": 1.0, "model": 2.0}
+    bq_client = object()
+    model = object()
+
+
+class StubRouter:
+    def __init__(self):
+        self.loads = 0
+
+    def load_rules(self):
+        self.loads += 1
+        return 16
+
+
+class StubRetriever:
+    def __init__(self, retrieval_mode="llm"):
+        self.retrieval_mode = retrieval_mode
+        self.warmed = 0
+        self.indexed = 0
+        self.invalidated = 0
+
+    def warm_candidates(self):
+        self.warmed += 1
+        return 36
+
+    def load_vector_index(self):
+        self.indexed += 1
+        return 36
+
+    def invalidate_candidates(self):
+        self.invalidated += 1
+
+
+class StubCoordinator:
+    # The real dispatch on retrieval_mode, run against the stub agents
+    warm = TicketCoordinator.warm
+
+    def __init__(self, retrieval_mode="llm"):
+        self.resources = StubResources()
+        self.router = StubRouter()
+        self.retriever = StubRetriever(retrieval_mode)
+
+    async def aprocess_ticket(self, ticket_description, ticket_id=None, on_stage=None):
+        if ticket_description == "slow":
+            await asyncio.sleep(0.2)
+        if ticket_description == "boom":
+            raise RuntimeError("agent failure")
+        if on_stage:
+            on_stage("classification", {"classification": {"category": "billing", "priority": "high"}})
+            on_stage("routing", {"routing": {"assigned_team": "billing_team"}})
+        return {"ticket_id": ticket_id or "generated", "ticket_description": ticket_description, "status": "processed"}
+
+    def process_ticket(self, ticket_description, ticket_id=None):
+        return {"ticket_id": ticket_id, "ticket_description": ticket_description, "status": "processed"}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(index, "coordinator", StubCoordinator())
+    return TestClient(index.app)
+
+
+def read_ndjson(response):
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def read_sse(response):
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+def test_bulk_json_streams_results_in_completion_order(client):
+    payload = {"tickets": [{"description": "slow", "ticket_id": "a"}, {"description": "fast", "ticket_id": "b"}]}
+    response = client.post("/api/process-tickets", json=payload)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert [r["ticket_id"] for r in read_ndjson(response)] == ["b", "a"]
+
+
+def test_bulk_ndjson_and_csv_uploads(client):
+    ndjson = '{"description": "one"}\n{"description": "boom", "ticket_id": "x"}\n'
+    response = client.post("/api/process-tickets", content=ndjson, headers={"content-type": "application/x-ndjson"})
+    results = read_ndjson(response)
+    assert len(results) == 2
+    assert {"ticket_id": "x", "status": "error", "error": "agent failure"} in results
+
+    csv_body = "ticket_id,description\nc1,charged twice\n"
+    response = client.post("/api/process-tickets", content=csv_body, headers={"content-type": "text/csv"})
+    assert read_ndjson(response)[0]["ticket_id"] == "c1"
+
+
+def test_bulk_rejects_invalid_payload(client):
+    response = client.post("/api/process-tickets", content="nope", headers={"content-type": "application/json"})
+    assert response.status_code == 400
+    assert client.post("/api/process-tickets", json={"items": [{"description": "fast"}]}).status_code == 400
+    assert client.post("/api/process-tickets", json={"tickets": [{"ticket_id": "a"}]}).status_code == 400
+
+
+def test_single_ticket_uses_async_path(client):
+    response = client.post("/api/process-ticket", json={"description": "fast"})
+    assert response.status_code == 200
+    assert response.json()["status"] == "processed"
+
+
+def test_single_ticket_stream_sends_stage_events_before_result(client):
+    response = client.post("/api/process-ticket/stream", json={"description": "charged twice"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = read_sse(response)
+    assert [event for event, _ in events] == ["classification", "routing", "result"]
+    assert events[0][1]["classification"]["category"] == "billing"
+    assert events[-1][1]["status"] == "processed"
+
+    response = client.post("/process-ticket/stream", json={"description": "boom"})
+    assert read_sse(response) == [("error", {"detail": "Internal Agent Error: agent failure"})]
+
+
+def test_warmup_and_startup_profile(client):
+    response = client.get("/api/warmup")
+    assert response.status_code == 200
+    assert response.json()["init_timings_ms"] == {"bq_client": 1.0, "model": 2.0}
+    assert response.json()["warmed"] == {"routing_rules": 16, "knowledge_base": 36}
+    assert index.coordinator.router.loads == 1
+    assert index.coordinator.retriever.warmed == 1
+
+    report = client.get("/api/startup-profile").json()
+    assert "warmup_clients" in report["phases_ms"]
+    assert report["api_module_import_ms"] > 0
+
+
+def test_warmup_builds_the_vector_index_in_embedding_mode(client, monkeypatch):
+    monkeypatch.setattr(index, "coordinator", StubCoordinator(retrieval_mode="embedding"))
+    response = client.get("/api/warmup")
+    assert response.json()["warmed"] == {"routing_rules": 16, "vector_index": 36}
+    assert (index.coordinator.retriever.indexed, index.coordinator.retriever.warmed) == (1, 0)
+
+
+def test_credential_parsing_is_cached_and_reports_truncation():
+    index.parse_gcp_sa_key.cache_clear()
+    with pytest.raises(index.CredentialsError, match="truncated"):
+        index.parse_gcp_sa_key('{"type": "service_account"')
+    with pytest.raises(index.CredentialsError, match="JSON Parse Error"):
+        index.parse_gcp_sa_key('{"type": }')
+    with pytest.raises(index.CredentialsError):
+        index.parse_gcp_sa_key('{"type": "service_account"}')
+    assert index.parse_gcp_sa_key.cache_info().currsize == 0
+
+
+def test_cache_invalidation_requires_admin_token(client, monkeypatch):
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    assert client.post("/api/admin/invalidate-cache").status_code == 403
+
+    monkeypatch.setenv("ADMIN_TOKEN", "secret")
+    assert client.post("/api/admin/invalidate-cache", headers={"X-Admin-Token": "wrong"}).status_code == 401
+
+    response = client.post(
+        "/api/admin/invalidate-cache?target=knowledge_base", headers={"X-Admin-Token": "secret"}
+    )
+    assert response.json() == {"status": "invalidated", "targets": ["knowledge_base"]}
+    assert index.coordinator.retriever.invalidated == 1
+
+
+def test_queued_ticket_is_accepted_polled_and_backpressured(client, monkeypatch):
+    from agents.ticket_queue import TicketQueue
+    queue = TicketQueue(index.coordinator, workers=0, max_depth=1)
+    monkeypatch.setattr(index, "ticket_queue", queue)
+
+    response = client.post("/api/queue/tickets", json={"description": "charged twice", "ticket_id": "q1"})
+    assert response.status_code == 202
+    assert response.json()["status"] == "queued"
+
+    full = client.post("/api/queue/tickets", json={"description": "another"})
+    assert full.status_code == 429
+    assert full.headers["retry-after"] == str(index.TICKET_QUEUE_RETRY_AFTER_SECONDS)
+    assert client.get("/api/queue/stats").json()["rejected"] == 1
+
+    queue._process(queue.backend.claim())
+    polled = client.get("/api/queue/tickets/q1").json()
+    assert polled["status"] == "done" and polled["result"]["status"] == "processed"
+    assert client.get("/api/queue/tickets/missing").json() == {"detail": "Unknown ticket_id: missing"}
+
+    bad = client.post("/api/queue/tickets", json={"description": "x", "callback_url": "file:///etc/passwd"})
+    assert bad.status_code == 400
+    # No TICKET_QUEUE_CALLBACK_HOSTS configured: every callback is refused
+    metadata = client.post(
+        "/api/queue/tickets", json={"description": "x", "callback_url": "http://169.254.169.254/latest/meta-data"}
+    )
+    assert metadata.status_code == 400
@@ -0,0 +1,74 @@
+from benchmarks import run_benchmark
+from benchmarks.fakes import FakeBigQueryClient, FakeGenerativeModel, LatencyModel, FakeServiceError
+
+
+def test_fake_bigquery_applies_filters_order_and_limit():
+    client = FakeBigQueryClient()
+
+    class Param:
+        name, value, type_ = "category", "billing", "STRING"
+
+    class Config:
+        query_parameters = [Param()]
+
+    rows = client.query(
+        "SELECT solution_id, success_rate FROM `p.d.knowledge_base` "
+        "WHERE category = @category ORDER BY success_rate DESC LIMIT 3",
+        job_config=Config(),
+    )
+
+    assert len(rows) == 3
+    assert set(rows[0]) == {"solution_id", "success_rate"}
+    assert [r.success_rate for r in rows] == sorted((r.success_rate for r in rows), reverse=True)
+    assert client.calls.counts["query"] == 1
+
+
+def test_percentile_is_nearest_rank():
+    hundred = list(range(100, 0, -1))
+    assert [run_benchmark.percentile(hundred, p) for p in (50, 95, 99, 100)] == [50.0, 95.0, 99.0, 100.0]
+    assert run_benchmark.percentile(list(range(1, 11)), 50) == 5.0
+    assert run_benchmark.percentile([7], 0) == 7.0
+    assert run_benchmark.percentile([], 95) == 0.0
+
+
+def test_fake_model_failure_rate_is_deterministic():
+    def failures():
+        model = FakeGenerativeModel(LatencyModel(failure_rate=0.5, seed=3))
+        outcome = []
+        for _ in range(20):
+            try:
+                model.generate_content("Ticket Description: refund please")
+                outcome.append(True)
+            except FakeServiceError:
+                outcome.append(False)
+        return outcome
+
+    assert failures() == failures()
+    assert not all(failures())
+
+
+def test_benchmark_runs_offline_and_reports_stages(tmp_path):
+    report_path = tmp_path / "report.json"
+    exit_code = run_benchmark.main([
+        "--tickets", "12", "--concurrency", "4", "--gemini-latency-ms", "0",
+        "--bigquery-latency-ms", "0", "--jitter-ms", "0", "--agents", "--fast-path",
+        "--json", str(report_path),
+    ])
+
+    assert exit_code == 0
+    report = run_benchmark.run(run_benchmark.parse_args([
+        "--tickets", "6", "--gemini-latency-ms", "0", "--bigquery-latency-ms", "0", "--jitter-ms", "0",
+    ]))
+    assert report["runs"][0]["count"] == 6
+    assert {"coordinator", "classifier", "retriever", "router"} <= set(report["stages"])
+    assert report["calls"]["gemini"]["classify"] == 6
+    assert report_path.exists()
+
+
+def test_benchmark_fails_when_p95_exceeds_budget():
+    exit_code = run_benchmark.main([
+        "--tickets", "4", "--gemini-latency-ms", "5", "--bigquery-latency-ms", "0",
+        "--jitter-ms", "0", "--max-p95-ms", "0.001",
+    ])
+
+    assert exit_code == 1
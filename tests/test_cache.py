@@ -0,0 +1,62 @@
+import pytest
+from agents.cache import ClassificationCache, InMemoryCacheBackend, SQLiteCacheBackend, normalize_text
+from agents.classifier_agent import TicketClassifierAgent
+from benchmarks.fakes import RecordingSink
+
+RESULT = {"category": "billing", "priority": "high", "reasoning": "charged twice"}
+
+
+def test_normalization_collapses_case_punctuation_and_spacing():
+    assert normalize_text("  Charged   TWICE!!  ") == normalize_text("charged twice")
+
+
+@pytest.mark.parametrize("make_backend", [
+    lambda tmp_path: InMemoryCacheBackend(),
+    lambda tmp_path: SQLiteCacheBackend(str(tmp_path / "cache.db")),
+])
+def test_exact_and_near_duplicate_hits(tmp_path, make_backend):
+    cache = ClassificationCache("v1", backend=make_backend(tmp_path), near_duplicates=True, similarity_threshold=0.5)
+    cache.put("I was charged twice for my monthly subscription this morning", RESULT)
+    assert cache.get("i was CHARGED twice for my monthly subscription this morning.") == (RESULT, "exact")
+    assert cache.get("I was charged twice for my monthly subscription this morning again") == (RESULT, "near")
+    assert cache.get("The export button crashes the app") == (None, None)
+    assert cache.stats == {"exact_hits": 1, "near_hits": 1, "misses": 1, "stores": 1}
+
+
+def test_version_change_and_ttl_invalidate_entries():
+    backend = InMemoryCacheBackend()
+    ClassificationCache("v1", backend=backend).put("charged twice", RESULT)
+    assert ClassificationCache("v2", backend=backend).get("charged twice") == (None, None)
+
+    expiring = ClassificationCache("v1", backend=backend, ttl_seconds=-1)
+    expiring.put("refund please", RESULT)
+    assert expiring.get("refund please") == (None, None)
+
+
+def test_lru_eviction():
+    cache = ClassificationCache("v1", backend=InMemoryCacheBackend(max_entries=2))
+    cache.put("one", RESULT)
+    cache.put("two", RESULT)
+    cache.get("one")
+    cache.put("three", RESULT)
+    assert cache.get("two") == (None, None)
+    assert cache.get("one")[1] == "exact"
+
+
+def test_sqlite_backend_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "shared.db")
+    ClassificationCache("v1", backend=SQLiteCacheBackend(path)).put("charged twice", RESULT)
+    assert ClassificationCache("v1", backend=SQLiteCacheBackend(path)).get("Charged twice!")[0] == RESULT
+
+
+def test_classifier_serves_repeats_from_cache(fake_resources):
+    from agents.instrumentation import Tracer
+    agent = TicketClassifierAgent("test-project", tracer=Tracer(RecordingSink()), resources=fake_resources)
+    agent.cache = agent.build_cache()
+    agent.classify("Charged twice!")
+    agent.classify("charged   twice")
+    assert fake_resources.model.calls.counts["classify"] == 1
+    assert agent.cache.hit_rate() == 0.5
+
+    agent.agent_version = "v1.0.1"
+    assert agent.cache_version != agent.cache.version
@@ -0,0 +1,78 @@
+from agents.candidate_cache import CandidateCache
+
+
+def row(solution_id, category, success_rate, last_updated):
+    return {"solution_id": solution_id, "category": category, "success_rate": success_rate,
+            "last_updated": last_updated}
+
+
+class FakeTable:
+    def __init__(self, rows):
+        self.rows = rows
+        self.full_loads = 0
+        self.changed_since = []
+
+    def load_all(self):
+        self.full_loads += 1
+        return [dict(r) for r in self.rows]
+
+    def load_changed(self, since):
+        self.changed_since.append(since)
+        return [dict(r) for r in self.rows if r["last_updated"] > since]
+
+
+def make_cache(table, **kwargs):
+    kwargs.setdefault("background_refresh", False)
+    return CandidateCache(table.load_all, table.load_changed, **kwargs)
+
+
+def test_candidates_are_presorted_slices_loaded_once():
+    table = FakeTable([row("a", "billing", 0.8, 1), row("b", "billing", 0.95, 1), row("c", "technical", 0.9, 1)])
+    cache = make_cache(table)
+
+    assert [r["solution_id"] for r in cache.get("billing", 5)] == ["b", "a"]
+    assert [r["solution_id"] for r in cache.get("billing", 1)] == ["b"]
+    assert cache.get("account", 3) == []
+    assert table.full_loads == 1
+    assert cache.stats["hits"] == 2
+
+
+def test_returned_rows_are_copies():
+    cache = make_cache(FakeTable([row("a", "billing", 0.8, 1)]))
+    cache.get("billing", 1)[0]["success_rate"] = 0.0
+    assert cache.get("billing", 1)[0]["success_rate"] == 0.8
+
+
+def test_incremental_refresh_merges_changed_rows():
+    table = FakeTable([row("a", "billing", 0.8, 1), row("b", "billing", 0.9, 1)])
+    cache = make_cache(table, refresh_interval_seconds=0)
+    cache.get("billing", 5)
+
+    table.rows = [row("a", "technical", 0.99, 2), row("b", "billing", 0.9, 1), row("n", "billing", 0.5, 3)]
+    billing = cache.get("billing", 5)
+
+    assert table.changed_since == [1]
+    assert [r["solution_id"] for r in billing] == ["b", "n"]
+    assert [r["solution_id"] for r in cache.get("technical", 5)] == ["a"]
+    assert table.full_loads == 1
+    assert cache.stats["rows_changed"] == 2
+
+
+def test_invalidate_forces_full_reload_that_drops_deleted_rows():
+    table = FakeTable([row("a", "billing", 0.8, 1), row("b", "billing", 0.9, 1)])
+    cache = make_cache(table)
+    cache.warm()
+
+    table.rows = [row("a", "billing", 0.8, 1)]
+    cache.invalidate()
+
+    assert [r["solution_id"] for r in cache.get("billing", 5)] == ["a"]
+    assert table.full_loads == 2
+
+
+def test_periodic_full_reload():
+    table = FakeTable([row("a", "billing", 0.8, 1)])
+    cache = make_cache(table, refresh_interval_seconds=0, full_reload_every=2)
+    for _ in range(4):
+        cache.get("billing", 1)
+    assert table.full_loads == 2
@@ -0,0 +1,70 @@
+import json
+import re
+import pytest
+from agents.classifier_agent import TicketClassifierAgent
+from agents.instrumentation import Tracer
+from benchmarks.fakes import FakeGenerativeModel, FakeResponse, RecordingSink
+
+
+class FakeBatchModel(FakeGenerativeModel):
+    """
+    Classifies every ticket as billing unless the batch contains "poison".
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.prompts = []
+        self.responses = []
+
+    def _respond(self, prompt):
+        self.prompts.append(prompt)
+        if "Tickets:" not in prompt:
+            text = json.dumps({"category": "technical", "priority": "low", "reasoning": "single"})
+        else:
+            tickets = json.loads(re.search(r"Tickets:\s*(\[.*\])", prompt, re.DOTALL).group(1))
+            if len(tickets) > 1 and any("poison" in t["description"] for t in tickets):
+                text = "not json"
+            else:
+                text = json.dumps([
+                    {"id": t["id"], "category": "billing", "priority": "high", "reasoning": "batch"} for t in tickets
+                ])
+        self.responses.append(FakeResponse(prompt, text))
+        return self.responses[-1]
+
+
+@pytest.fixture
+def fake_model():
+    return FakeBatchModel()
+
+
+@pytest.fixture
+def classifier(fake_resources):
+    agent = TicketClassifierAgent("test-project", tracer=Tracer(RecordingSink()), resources=fake_resources)
+    agent.telemetry = agent.tracer.sink.rows
+    return agent
+
+
+def test_batch_uses_one_call_and_splits_tokens(classifier):
+    results = classifier.classify_batch(["charged twice", "refund please", "invoice wrong"], ["a", "b", "c"])
+    assert [r["category"] for r in results] == ["billing"] * 3
+    assert len(classifier.model.prompts) == 1
+    tokens = classifier.model.responses[0].usage_metadata.total_token_count
+    assert sum(row["token_count"] for row in classifier.telemetry) == tokens
+    assert [row["ticket_id"] for row in classifier.telemetry] == ["a", "b", "c"]
+
+
+def test_batch_is_split_by_token_budget(classifier):
+    descriptions = ["x" * 400] * 6
+    classifier.classify_batch(descriptions, max_batch_tokens=600)
+    assert len(classifier.model.prompts) == 3
+
+
+def test_failed_batch_is_bisected(classifier):
+    results = classifier.classify_batch(["charged twice", "refund", "poison ticket", "invoice wrong"], list("abcd"))
+    assert [r["category"] for r in results] == ["billing", "billing", "technical", "technical"]
+    # The unparseable batches were paid for too and are charged to their tickets
+    failed = [r for r in classifier.model.responses if r.text == "not json"]
+    assert len(failed) == 2
+    spent = sum(r.usage_metadata.total_token_count for r in classifier.model.responses)
+    assert sum(row["token_count"] for row in classifier.telemetry) == spent
+    assert sorted(row["ticket_id"] for row in classifier.telemetry) == list("aabbcccddd")
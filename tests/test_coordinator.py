@@ -0,0 +1,150 @@
+import time
+import asyncio
+import threading
+import pytest
+import agents.coordinator as coordinator_module
+from agents.coordinator import TicketCoordinator
+from agents.instrumentation import Tracer, traced
+from benchmarks.fakes import RecordingSink
+
+
+class StubClassifier:
+    def __init__(self, *args, **kwargs):
+        self.tracer = Tracer(RecordingSink())
+
+    def build_cache(self):
+        return None
+
+    def classify(self, ticket_description, ticket_id=None):
+        return {"category": "billing", "priority": "high", "reasoning": "stub"}
+
+    async def aclassify(self, ticket_description, ticket_id=None):
+        return self.classify(ticket_description, ticket_id)
+
+
+class StubRetriever:
+    delay = 0.2
+    # Tests set a threading/asyncio Barrier that only concurrent calls can get past
+    barrier = None
+
+    def __init__(self, *args, tracer=None, **kwargs):
+        self.tracer = tracer
+
+    @traced("retriever")
+    def retrieve(self, ticket_description, category, top_k=3):
+        if self.barrier:
+            self.barrier.wait()
+        time.sleep(self.delay)
+        return {"solutions": [{"solution_id": "s1", "category": category}], "retrieval_path": "lexical"}
+
+    @traced("retriever")
+    async def aretrieve(self, ticket_description, category, top_k=3):
+        if self.barrier:
+            await self.barrier.wait()
+        await asyncio.sleep(self.delay)
+        return {"solutions": [{"solution_id": "s1", "category": category}], "retrieval_path": "lexical"}
+
+
+class StubRouter:
+    delay = 0.2
+    barrier = None
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def route_ticket(self, category, priority):
+        if self.barrier:
+            self.barrier.wait()
+        time.sleep(self.delay)
+        return {"assigned_team": "billing_team", "sla_hours": 8, "routing_reason": "stub"}
+
+    async def aroute_ticket(self, category, priority):
+        await asyncio.sleep(self.delay)
+        return {"assigned_team": "billing_team", "sla_hours": 8, "routing_reason": "stub"}
+
+
+@pytest.fixture
+def stub_agents(monkeypatch):
+    monkeypatch.setattr(coordinator_module, "TicketClassifierAgent", StubClassifier)
+    monkeypatch.setattr(coordinator_module, "KnowledgeRetrieverAgent", StubRetriever)
+    monkeypatch.setattr(coordinator_module, "RouterAgent", StubRouter)
+    monkeypatch.setattr(coordinator_module, "TicketHistorySink", lambda *args, **kwargs: RecordingSink())
+
+
+def test_retrieval_and_routing_run_concurrently(stub_agents, monkeypatch):
+    # Both stages must be waiting at the same time to pass; run one after the other they time out
+    barrier = threading.Barrier(2, timeout=5)
+    monkeypatch.setattr(StubRetriever, "barrier", barrier)
+    monkeypatch.setattr(StubRouter, "barrier", barrier)
+    coordinator = TicketCoordinator("test-project")
+    result = coordinator.process_ticket("I was charged twice")
+    assert not barrier.broken
+    assert result["routing"]["assigned_team"] == "billing_team"
+    assert result["suggested_solutions"][0]["category"] == "billing"
+    assert result["retrieval"]["retrieval_path"] == "lexical"
+
+
+def test_sequential_mode_matches_concurrent_result(stub_agents):
+    coordinator = TicketCoordinator("test-project", concurrent=False)
+    result = coordinator.process_ticket("I was charged twice", ticket_id="t-1")
+    assert result["ticket_id"] == "t-1"
+    assert result["classification"]["category"] == "billing"
+    assert result["routing"]["sla_hours"] == 8
+
+
+def test_stage_timeout_uses_fallback(stub_agents):
+    coordinator = TicketCoordinator("test-project", stage_timeouts={"route": 0.05})
+    result = coordinator.process_ticket("I was charged twice")
+    assert result["routing"]["assigned_team"] == "general_support"
+    assert result["suggested_solutions"]
+
+
+def test_async_tickets_share_one_event_loop(stub_agents, monkeypatch):
+    # Retrieval only proceeds once all 20 tickets are in it together; otherwise it times out to the fallback
+    monkeypatch.setattr(StubRetriever, "barrier", asyncio.Barrier(20))
+    coordinator = TicketCoordinator("test-project", stage_timeouts={"route": 0.1, "retrieve": 5})
+
+    async def run_many():
+        return await asyncio.gather(*[coordinator.aprocess_ticket(f"ticket {i}") for i in range(20)])
+
+    results = asyncio.run(run_many())
+    assert len({r["ticket_id"] for r in results}) == 20
+    assert all(r["routing"]["assigned_team"] == "general_support" for r in results)
+    assert all(r["suggested_solutions"] for r in results)
+
+
+def test_stage_spans_are_linked_to_coordinator_span(stub_agents):
+    coordinator = TicketCoordinator("test-project")
+    coordinator.process_ticket("I was charged twice", ticket_id="t-9")
+    asyncio.run(coordinator.aprocess_ticket("I was charged twice", ticket_id="t-10"))
+    rows = coordinator.tracer.sink.rows
+    for ticket_id in ("t-9", "t-10"):
+        root = next(r for r in rows if r["agent_name"] == "coordinator" and r["ticket_id"] == ticket_id)
+        child = next(r for r in rows if r["agent_name"] == "retriever" and r["ticket_id"] == ticket_id)
+        assert root["parent_run_id"] is None
+        assert child["parent_run_id"] == root["run_id"]
+
+
+def test_processed_tickets_are_buffered_for_ticket_history(stub_agents):
+    coordinator = TicketCoordinator("test-project")
+    coordinator.process_ticket("I was charged twice", "t1")
+    asyncio.run(coordinator.aprocess_ticket("I was charged twice", "t2"))
+    rows = coordinator.history.rows
+    assert [row["ticket_id"] for row in rows] == ["t1", "t2"]
+    assert rows[0]["assigned_team"] == "billing_team" and rows[0]["category"] == "billing"
+
+    assert TicketCoordinator("test-project", persist_history=False).history is None
+
+
+def test_async_stages_are_reported_as_they_finish(stub_agents, monkeypatch):
+    monkeypatch.setattr(StubRouter, "delay", 0.05)
+    coordinator = TicketCoordinator("test-project")
+    events = []
+    result = asyncio.run(coordinator.aprocess_ticket(
+        "I was charged twice", on_stage=lambda event, fields: events.append((event, fields))
+    ))
+    assert [event for event, _ in events] == ["classification", "routing", "solutions"]
+    merged = {}
+    for _, fields in events:
+        merged.update(fields)
+    assert merged == {key: result[key] for key in merged}
@@ -0,0 +1,68 @@
+from datetime import datetime, timezone
+import pytest
+from agents.datastore import BigQueryStore, SQLiteStore, sync_from_bigquery, KNOWLEDGE_BASE_COLUMNS
+from agents.router_agent import RouterAgent
+from agents.knowledge_retriever_agent import KnowledgeRetrieverAgent, CANDIDATE_COLUMNS
+from agents.instrumentation import Tracer
+from benchmarks.fakes import FakeBigQueryClient, sample_tables
+
+
+def kb_row(solution_id, category, success_rate, last_updated):
+    return {"solution_id": solution_id, "category": category, "problem_description": f"problem {solution_id}",
+            "solution_text": f"solution {solution_id}", "success_rate": success_rate, "embedding": None,
+            "last_updated": last_updated}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = SQLiteStore(str(tmp_path / "local.db"))
+    store.replace_table("routing_rules", [
+        {"category": "billing", "priority": "high", "assigned_team": "billing_team", "sla_hours": 8},
+    ])
+    store.replace_table("knowledge_base", [
+        kb_row("a", "billing", 0.8, "2026-01-01T00:00:00+00:00"),
+        kb_row("b", "billing", 0.95, datetime(2026, 1, 3, tzinfo=timezone.utc)),
+        kb_row("c", "technical", 0.9, "2026-01-02T00:00:00Z"),
+    ])
+    return store
+
+
+def test_sqlite_store_serves_indexed_reads(store):
+    assert [r["solution_id"] for r in store.top_solutions("billing", 5)] == ["b", "a"]
+    assert store.top_solutions("account", 5) == []
+    changed = store.knowledge_base(CANDIDATE_COLUMNS, since=datetime(2026, 1, 1, 12, tzinfo=timezone.utc))
+    assert sorted(r["solution_id"] for r in changed) == ["b", "c"]
+    # Timestamps come back as UTC datetimes, like BigQuery rows
+    assert changed[0]["last_updated"].tzinfo is not None
+    assert store.sync_state()["knowledge_base"]["row_count"] == 3
+
+
+def test_replace_table_swaps_whole_contents(store):
+    store.replace_table("routing_rules", [])
+    assert store.routing_rules() == []
+
+
+def test_agents_read_from_local_store_without_bigquery(store, fake_resources):
+    router = RouterAgent("test-project", background_refresh=False, tracer=Tracer(), store=store,
+                         resources=fake_resources)
+    assert router.route_ticket("billing", "high")["assigned_team"] == "billing_team"
+
+    retriever = KnowledgeRetrieverAgent("test-project", tracer=Tracer(), store=store, cache_candidates=False,
+                                        resources=fake_resources)
+    assert [c["solution_id"] for c in retriever._fetch_candidates("billing", 1)] == ["b", "a"]
+    retriever = KnowledgeRetrieverAgent("test-project", tracer=Tracer(), store=store, resources=fake_resources)
+    retriever.candidates.background_refresh = False
+    assert retriever.warm_candidates() == 3
+    assert [c["solution_id"] for c in retriever._fetch_candidates("billing", 1)] == ["b", "a"]
+    assert fake_resources.bq_client.calls.counts == {}
+
+
+def test_sync_mirrors_bigquery_tables(tmp_path):
+    tables = sample_tables()
+    source = BigQueryStore(FakeBigQueryClient(tables=tables), "test-project")
+    target = SQLiteStore(str(tmp_path / "mirror.db"))
+    counts = sync_from_bigquery(source, target)
+    assert counts == {"routing_rules": len(tables["routing_rules"]), "knowledge_base": len(tables["knowledge_base"])}
+    best = max((r for r in tables["knowledge_base"] if r["category"] == "billing"), key=lambda r: r["success_rate"])
+    assert target.top_solutions("billing", 1)[0]["solution_id"] == best["solution_id"]
+    assert len(target.knowledge_base(KNOWLEDGE_BASE_COLUMNS)) == len(tables["knowledge_base"])
@@ -0,0 +1,130 @@
+import asyncio
+import numpy as np
+import pytest
+from agents.embeddings import (
+    EmbeddingMismatchError, GeminiEmbedder, HashingEmbedder, VectorIndex, build_category_indexes, build_embedder,
+    serialize_embedding
+)
+from agents.concurrency import DependencyLimits
+from agents.knowledge_retriever_agent import KnowledgeRetrieverAgent
+from benchmarks.fakes import FakeBigQueryClient
+
+KB_ROWS = [
+    {"solution_id": "b1", "category": "billing", "problem_description": "User experiencing double charged",
+     "solution_text": "Refund the duplicate charge.", "success_rate": 0.9, "embedding": None},
+    {"solution_id": "b2", "category": "billing", "problem_description": "User experiencing promo code not working",
+     "solution_text": "Reapply the promo code.", "success_rate": 0.8, "embedding": None},
+    {"solution_id": "a1", "category": "account", "problem_description": "User experiencing password reset",
+     "solution_text": "Send a new reset link.", "success_rate": 0.95, "embedding": None},
+]
+
+
+@pytest.fixture
+def fake_bq():
+    return FakeBigQueryClient(tables={"knowledge_base": KB_ROWS})
+
+
+def test_hashing_embedder_is_deterministic_and_normalized():
+    embedder = HashingEmbedder(dim=64)
+    first = embedder.embed(["charged twice for my order"])
+    second = embedder.embed(["charged twice for my order"])
+    assert np.array_equal(first, second)
+    assert np.isclose(np.linalg.norm(first[0]), 1.0)
+
+
+def test_vector_index_returns_most_similar_first(tmp_path):
+    embedder = HashingEmbedder()
+    indexes = build_category_indexes(KB_ROWS, embedder)
+    results = indexes["billing"].search(embedder.embed_query("I was double charged"), top_k=2)
+    assert [row["solution_id"] for row, _ in results][0] == "b1"
+
+    indexes["billing"].save(str(tmp_path / "billing"))
+    mapped = VectorIndex.load(str(tmp_path / "billing"))
+    assert mapped.search(embedder.embed_query("I was double charged"), top_k=1)[0][0]["solution_id"] == "b1"
+
+
+def test_stored_embeddings_are_used():
+    embedder = HashingEmbedder()
+    rows = [dict(row) for row in KB_ROWS]
+    rows[1]["embedding"] = serialize_embedding(embedder.embed_query("double charged refund"), embedder)
+    indexes = build_category_indexes(rows, embedder)
+    assert indexes["billing"].search(embedder.embed_query("double charged refund"), top_k=1)[0][0]["solution_id"] == "b2"
+    assert indexes["billing"].search(embedder.embed_query("double charged refund"), top_k=0) == []
+
+
+def test_embeddings_from_another_embedder_fail_loudly():
+    gemini_rows = [dict(row) for row in KB_ROWS]
+    gemini_rows[0]["embedding"] = serialize_embedding(np.ones(768), GeminiEmbedder())
+    with pytest.raises(EmbeddingMismatchError, match="gemini/models/text-embedding-004"):
+        build_category_indexes(gemini_rows, HashingEmbedder())
+
+    # Untagged vectors from before the tag existed are checked by dimension
+    legacy_rows = [dict(row) for row in KB_ROWS]
+    legacy_rows[0]["embedding"] = "[" + ", ".join(["0.1"] * 768) + "]"
+    with pytest.raises(EmbeddingMismatchError, match="768-dimensional"):
+        build_category_indexes(legacy_rows, HashingEmbedder())
+
+    assert build_embedder("gemini").identity == "gemini/models/text-embedding-004"
+    with pytest.raises(ValueError):
+        build_embedder("word2vec")
+
+
+def test_retriever_embedding_mode_queries_bigquery_once(fake_resources):
+    retriever = KnowledgeRetrieverAgent("test-project", retrieval_mode="embedding", resources=fake_resources)
+    first = retriever.retrieve_solutions("password reset link", "account", top_k=1)
+    retriever.retrieve_solutions("charged twice", "billing")
+    assert first[0]["solution_id"] == "a1"
+    assert "embedding" not in first[0]
+    assert fake_resources.bq_client.calls.counts["query"] == 1
+
+
+def test_retriever_vector_index_is_rebuilt_after_refresh_interval(fake_resources):
+    retriever = KnowledgeRetrieverAgent(
+        "test-project", retrieval_mode="embedding", embedder=HashingEmbedder(dim=64), candidate_refresh_seconds=0,
+        resources=fake_resources
+    )
+    retriever.retrieve_solutions("password reset link", "account")
+    fake_resources.bq_client.tables["knowledge_base"] = KB_ROWS + [
+        dict(KB_ROWS[2], solution_id="a2", problem_description="User experiencing 2fa lockout")
+    ]
+    results = retriever.retrieve_solutions("2fa lockout", "account", top_k=1)
+    assert fake_resources.bq_client.calls.counts["query"] == 2
+    assert results[0]["solution_id"] == "a2"
+    assert retriever.embedder.dim == 64
+
+
+class RecordingLimits(DependencyLimits):
+    def __init__(self):
+        super().__init__()
+        self.calls = []
+
+    async def run_blocking(self, dependency, fn, *args, **kwargs):
+        self.calls.append((dependency, fn.__name__))
+        return await super().run_blocking(dependency, fn, *args, **kwargs)
+
+
+class RemoteEmbedder(HashingEmbedder):
+    dependency = "gemini"
+
+
+@pytest.mark.parametrize("embedder, expected", [
+    (HashingEmbedder(), [("bigquery", "_ensure_vector_index")]),
+    (RemoteEmbedder(), [("bigquery", "_ensure_vector_index"), ("gemini", "embed_query")]),
+])
+def test_async_query_embedding_uses_the_embedders_limit(fake_resources, embedder, expected):
+    limits = RecordingLimits()
+    retriever = KnowledgeRetrieverAgent("test-project", retrieval_mode="embedding", embedder=embedder,
+                                        limits=limits, resources=fake_resources)
+
+    info = asyncio.run(retriever.aretrieve("password reset link", "account", top_k=1))
+
+    assert info["solutions"][0]["solution_id"] == "a1"
+    assert limits.calls == expected
+
+
+def test_coordinator_passes_the_configured_embedder():
+    from agents.coordinator import TicketCoordinator
+    embedder = HashingEmbedder(dim=32)
+    coordinator = TicketCoordinator("test-project", retrieval_mode="embedding", embedder=embedder,
+                                    persist_history=False)
+    assert coordinator.retriever.embedder is embedder
@@ -0,0 +1,62 @@
+from agents.classifier_agent import TicketClassifierAgent
+from agents.fast_path import RuleBasedClassifier, parse_rules
+from agents.instrumentation import Tracer
+
+
+def test_parse_rules_reads_prompt_sections():
+    from agents.classifier_agent import CLASSIFICATION_RULES
+    categories, priorities = parse_rules(CLASSIFICATION_RULES)
+
+    assert categories["billing"] == ["payment", "charges", "invoices", "refunds"]
+    assert "data loss" in priorities["critical"]
+    assert set(priorities) == {"critical", "high", "medium", "low"}
+
+
+def test_unambiguous_tickets_are_classified_locally():
+    rules = RuleBasedClassifier()
+
+    refund = rules.classify("I was charged twice and need a refund, there is a workaround for now")
+    outage = rules.classify("URGENT: outage, the system is down and all users are affected")
+    idea = rules.classify("Would love a dark mode option")
+
+    assert (refund["category"], refund["priority"]) == ("billing", "medium")
+    assert (outage["category"], outage["priority"]) == ("technical", "critical")
+    assert (idea["category"], idea["priority"]) == ("feature_request", "low")
+
+
+def test_ambiguous_tickets_escalate():
+    rules = RuleBasedClassifier()
+
+    assert rules.classify("Login keeps failing after the refund") is None  # several categories
+    assert rules.classify("Hello there") is None  # no signal
+    assert rules.classify("Urgent question about my invoice and payment") is None  # conflicting priorities
+    assert rules.stats == {"evaluated": 3, "matched": 0, "escalated": 3}
+    assert rules.escalation_rate == 1.0
+
+
+def test_risky_tickets_without_strong_evidence_escalate():
+    rules = RuleBasedClassifier()
+
+    assert rules.classify("My account was hacked and someone changed my password") is None
+    assert rules.classify("We lost all our customer records, the data is gone") is None
+    assert rules.classify("The whole company is locked out") is None
+    assert rules.classify("I need a refund immediately!") is None
+    assert rules.classify("I was charged twice and need a refund") is None  # no priority signal
+    assert rules.best_guess("Someone hacked my password")["priority"] == "critical"
+
+    fraud = rules.classify("There is a fraudulent charge on my credit card, fraud!")
+    assert (fraud["category"], fraud["priority"]) == ("billing", "critical")
+
+
+def test_classifier_only_calls_model_on_escalation(fake_resources):
+    agent = TicketClassifierAgent("test-project", tracer=Tracer(), fast_path=RuleBasedClassifier(),
+                                  resources=fake_resources)
+
+    ruled = agent.classify("My invoice shows a double charge, just a question")
+    escalated = agent.classify("Hello there")
+
+    assert ruled["classification_path"] == "rules"
+    assert escalated["classification_path"] == "llm"
+    assert escalated["category"] == "technical"
+    assert fake_resources.model.calls.counts["classify"] == 1
+    assert agent.fast_path.escalation_rate == 0.5
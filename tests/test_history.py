@@ -0,0 +1,66 @@
+from benchmarks.fakes import FakeBigQueryClient
+from agents.history import TicketHistorySink, history_row
+
+
+def result(ticket_id, category="billing", team="billing_team", timestamp="2026-01-05T10:00:00+00:00"):
+    return {
+        "ticket_id": ticket_id,
+        "timestamp": timestamp,
+        "ticket_description": f"ticket {ticket_id}",
+        "classification": {"category": category, "priority": "high"},
+        "routing": {"assigned_team": team},
+    }
+
+
+def make_sink(client):
+    return TicketHistorySink(client, "p.d.ticket_history", flush_interval_seconds=60)
+
+
+def test_history_row_maps_coordinator_result():
+    row = history_row(result("t1"))
+    assert row == {
+        "ticket_id": "t1", "category": "billing", "priority": "high", "description": "ticket t1",
+        "resolution": None, "assigned_team": "billing_team", "created_at": "2026-01-05T10:00:00+00:00",
+        "resolved_at": None,
+    }
+
+
+def test_batches_are_loaded_and_merged_idempotently():
+    client = FakeBigQueryClient(tables={})
+    sink = make_sink(client)
+    sink._start = lambda: None
+    for item in (result("t1"), result("t2"), result("t1", category="technical", team="tech_team")):
+        sink.emit(history_row(item))
+    sink.flush()
+    # Replaying the same tickets must not add rows
+    sink.emit(history_row(result("t2")))
+    sink.flush()
+
+    rows = {row["ticket_id"]: row for row in client.tables["ticket_history"]}
+    assert len(client.tables["ticket_history"]) == 2
+    assert rows["t1"]["category"] == "technical"
+    assert client.calls.counts["load_table_from_file"] == 2
+    assert client.calls.counts["insert_rows_json"] == 0
+    # Staging tables are dropped after each merge
+    assert list(client.tables) == ["ticket_history"]
+    assert sink.stats["flushed_rows"] == 4 and sink.stats["merged_rows"] == 3
+
+
+def test_merge_prunes_partitions_and_keeps_created_at():
+    sql = make_sink(FakeBigQueryClient(tables={})).merge_sql("p.d.ticket_history_staging_x")
+    assert "T.created_at >= @since" in sql
+    assert "created_at = S.created_at" not in sql
+
+
+def test_failed_load_is_counted_and_staging_dropped():
+    class FailingClient(FakeBigQueryClient):
+        def query(self, query, job_config=None):
+            raise RuntimeError("merge failed")
+
+    client = FailingClient(tables={})
+    sink = make_sink(client)
+    sink._start = lambda: None
+    sink.emit(history_row(result("t1")))
+    sink.flush()
+    assert sink.stats["failed_rows"] == 1
+    assert client.tables == {}
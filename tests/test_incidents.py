@@ -0,0 +1,101 @@
+import asyncio
+import pytest
+import agents.coordinator as coordinator_module
+from agents.coordinator import TicketCoordinator
+from agents.incidents import IncidentClusterer
+from benchmarks.fakes import RecordingSink
+from tests.test_coordinator import StubClassifier, StubRetriever, StubRouter
+
+OUTAGE = "Production is down, the dashboard returns 502 errors for all users since 10am"
+OUTAGE_AGAIN = "Production is down, the dashboard returns 502 errors for all users since 10am!!"
+UNRELATED = "Please add a dark mode option to the mobile app settings page"
+
+CLASSIFICATION = {"category": "technical", "priority": "critical", "reasoning": "outage", "classification_path": "llm"}
+RETRIEVAL = {"solutions": [{"solution_id": "KB-1"}], "retrieval_path": "llm", "llm_called": True, "llm_tokens": 120}
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_similar_tickets_join_an_open_incident():
+    clusterer = IncidentClusterer()
+    assert clusterer.match("t1", OUTAGE) is None
+    opened = clusterer.open("t1", OUTAGE, CLASSIFICATION, RETRIEVAL)
+    assert opened["size"] == 1
+
+    shared = clusterer.match("t2", OUTAGE_AGAIN)
+    assert shared["incident_id"] == opened["incident_id"]
+    assert shared["size"] == 2 and shared["ticket_ids"] == ["t1", "t2"]
+    assert shared["classification"]["priority"] == "critical"
+    assert shared["retrieval"]["solutions"] == [{"solution_id": "KB-1"}]
+    assert clusterer.match("t3", UNRELATED) is None
+    assert clusterer.stats == {"tickets": 3, "clustered": 1, "incidents_opened": 1, "incidents_closed": 0}
+
+
+def test_quiet_incidents_close_and_emit_a_summary():
+    clock = Clock()
+    closed = []
+    clusterer = IncidentClusterer(window_seconds=60, on_close=closed.append, clock=clock)
+    clusterer.open("t1", OUTAGE, CLASSIFICATION, RETRIEVAL)
+    clock.now += 30
+    clusterer.match("t2", OUTAGE_AGAIN)
+    clock.now += 61
+
+    assert clusterer.match("t3", OUTAGE) is None
+    assert [summary["size"] for summary in closed] == [2]
+    assert closed[0]["tickets_reused"] == 1 and closed[0]["tickets_per_minute"] == 4.0
+    assert list(clusterer.closed) == closed
+    assert clusterer.summaries() == []
+
+
+def test_fallback_results_never_open_an_incident():
+    clusterer = IncidentClusterer()
+    assert clusterer.open("t1", OUTAGE, dict(CLASSIFICATION, classification_path="fallback"), RETRIEVAL) is None
+    assert clusterer.open("t2", OUTAGE, CLASSIFICATION, dict(RETRIEVAL, retrieval_path="fallback")) is None
+    assert clusterer.match("t3", OUTAGE_AGAIN) is None
+
+
+class CountingClassifier(StubClassifier):
+    calls = 0
+
+    def classify(self, ticket_description, ticket_id=None):
+        CountingClassifier.calls += 1
+        return super().classify(ticket_description, ticket_id)
+
+
+@pytest.fixture
+def coordinator(monkeypatch):
+    CountingClassifier.calls = 0
+    monkeypatch.setattr(StubRetriever, "delay", 0)
+    monkeypatch.setattr(StubRouter, "delay", 0)
+    monkeypatch.setattr(coordinator_module, "TicketClassifierAgent", CountingClassifier)
+    monkeypatch.setattr(coordinator_module, "KnowledgeRetrieverAgent", StubRetriever)
+    monkeypatch.setattr(coordinator_module, "RouterAgent", StubRouter)
+    monkeypatch.setattr(coordinator_module, "TicketHistorySink", lambda *args, **kwargs: RecordingSink())
+    return TicketCoordinator("test-project", incident_clustering=True)
+
+
+def test_coordinator_reuses_incident_results(coordinator):
+    first = coordinator.process_ticket(OUTAGE, ticket_id="t1")
+    second = coordinator.process_ticket(OUTAGE_AGAIN, ticket_id="t2")
+    third = asyncio.run(coordinator.aprocess_ticket(OUTAGE, ticket_id="t3"))
+
+    assert CountingClassifier.calls == 1
+    assert first["incident"]["joined"] is False
+    assert second["incident"] == {"incident_id": first["incident"]["incident_id"], "size": 2, "joined": True}
+    assert third["incident"]["size"] == 3
+    assert second["classification"]["classification_path"] == "incident"
+    assert second["classification"]["category"] == first["classification"]["category"]
+    assert second["retrieval"]["retrieval_path"] == "incident" and second["retrieval"]["llm_tokens"] == 0
+    assert second["suggested_solutions"] == first["suggested_solutions"]
+    # Routing still runs per ticket
+    assert second["routing"]["assigned_team"] == "billing_team"
+
+    summaries = coordinator.incident_summaries()
+    assert summaries["enabled"] is True and summaries["open"][0]["tickets_reused"] == 2
+
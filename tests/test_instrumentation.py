@@ -0,0 +1,61 @@
+import asyncio
+import pytest
+from agents.instrumentation import Tracer, traced, current_span
+from benchmarks.fakes import RecordingSink
+
+
+class FakeQueryJob(list):
+    total_bytes_processed = 2048
+
+
+class Agent:
+    def __init__(self, tracer):
+        self.tracer = tracer
+
+    @traced("agent")
+    def run(self, fail=False):
+        span = current_span()
+        span.add_tokens(10)
+        span.record_query(FakeQueryJob())
+        span.cache_hit = True
+        if fail:
+            raise RuntimeError("boom")
+        return "done"
+
+    @traced("agent")
+    async def arun(self):
+        current_span().add_tokens(5)
+        return "done"
+
+
+def test_span_records_tokens_bytes_and_cache_hits():
+    tracer = Tracer(RecordingSink())
+    with tracer.span("coordinator", "t-1") as root:
+        Agent(tracer).run()
+    child, parent = tracer.sink.rows
+    assert child["ticket_id"] == "t-1"
+    assert child["parent_run_id"] == root.run_id
+    assert child["token_count"] == 10
+    assert child["bytes_processed"] == 2048
+    assert child["cache_hit"] is True
+    assert child["cost_usd"] == pytest.approx(10 * 0.0001 / 1000)
+    assert parent["agent_name"] == "coordinator"
+
+
+def test_failed_span_is_marked_as_error():
+    tracer = Tracer(RecordingSink())
+    with pytest.raises(RuntimeError):
+        Agent(tracer).run(fail=True)
+    assert tracer.sink.rows[0]["status"] == "error"
+
+
+def test_async_methods_are_traced():
+    tracer = Tracer(RecordingSink())
+    assert asyncio.run(Agent(tracer).arun()) == "done"
+    assert tracer.sink.rows[0]["token_count"] == 5
+
+
+def test_current_span_is_safe_outside_spans():
+    current_span().add_tokens(3)
+    current_span().status = "error"
+    assert current_span().status == "ok"
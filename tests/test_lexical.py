@@ -0,0 +1,74 @@
+import json
+import pytest
+from agents.knowledge_retriever_agent import KnowledgeRetrieverAgent
+from agents.lexical import BM25Scorer, RerankPolicy
+from benchmarks.fakes import FakeBigQueryClient, FakeGenerativeModel, FakeResponse
+
+CANDIDATES = [
+    {"solution_id": "s1", "category": "billing", "problem_description": "User experiencing promo code not working",
+     "solution_text": "Reapply the promo code.", "success_rate": 0.95},
+    {"solution_id": "s2", "category": "billing", "problem_description": "User experiencing double charged",
+     "solution_text": "Refund the duplicate charge.", "success_rate": 0.9},
+    {"solution_id": "s3", "category": "billing", "problem_description": "User experiencing invoice issues",
+     "solution_text": "Regenerate the invoice.", "success_rate": 0.8},
+]
+
+
+class ReversingModel(FakeGenerativeModel):
+    def __init__(self):
+        super().__init__()
+        self.responses = []
+
+    def _respond(self, prompt):
+        # Answer in s3, s2, s1 order using the aliases the prompt assigned
+        aliases = {
+            row["solution_id"]: line.split(" | ")[0]
+            for line in prompt.splitlines() for row in CANDIDATES
+            if " | " in line and row["problem_description"] in line
+        }
+        self.responses.append(FakeResponse(prompt, json.dumps([aliases["s3"], aliases["s2"], aliases["s1"]])))
+        return self.responses[-1]
+
+
+@pytest.fixture
+def fake_model():
+    return ReversingModel()
+
+
+@pytest.fixture
+def fake_bq():
+    return FakeBigQueryClient(tables={"knowledge_base": CANDIDATES})
+
+
+@pytest.fixture
+def retriever(fake_resources):
+    return KnowledgeRetrieverAgent("test-project", resources=fake_resources)
+
+
+def test_bm25_prefers_matching_document():
+    scores = BM25Scorer.from_rows(CANDIDATES).score("I was double charged")
+    assert scores.index(max(scores)) == 1
+
+
+def test_policy_flags_small_margin_as_ambiguous():
+    policy = RerankPolicy(min_margin=0.2)
+    assert policy.needs_llm([1.0, 0.95])
+    assert not policy.needs_llm([2.0, 0.5])
+    assert policy.needs_llm([0.0, 0.0])
+    assert RerankPolicy(mode="never").needs_llm([0.0, 0.0]) is False
+
+
+def test_confident_lexical_ranking_skips_llm(retriever):
+    info = retriever.retrieve("I was double charged for my order", "billing", top_k=2)
+    assert info["retrieval_path"] == "lexical"
+    assert info["solutions"][0]["solution_id"] == "s2"
+    assert info["estimated_tokens_saved"] > 0
+    assert retriever.model.responses == []
+
+
+def test_ambiguous_ranking_calls_llm(retriever):
+    info = retriever.retrieve("something is wrong with my account", "billing")
+    assert info["retrieval_path"] == "llm_rerank"
+    assert [s["solution_id"] for s in info["solutions"]] == ["s3", "s2", "s1"]
+    assert retriever.rerank_stats["llm_calls"] == 1
+    assert retriever.rerank_stats["llm_tokens"] == retriever.model.responses[0].usage_metadata.total_token_count
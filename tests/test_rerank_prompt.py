@@ -0,0 +1,58 @@
+from agents.instrumentation import Tracer
+from agents.rerank_prompt import RerankPromptBuilder, estimate_tokens, truncate
+from benchmarks.fakes import RecordingSink
+
+CANDIDATES = [
+    {
+        "solution_id": f"00000000-0000-4000-8000-00000000000{i}",
+        "problem_description": f"User experiencing issue number {i} with payments",
+        "solution_text": "Standard operating procedure: " + "verify details and check logs. " * 20,
+        "success_rate": 0.9,
+    }
+    for i in range(9)
+]
+
+
+def test_prompt_uses_aliases_and_truncates_text():
+    prompt = RerankPromptBuilder(max_prompt_tokens=10000).build("payment failed", CANDIDATES, top_k=3)
+
+    assert "00000000-0000" not in prompt.text
+    assert "success_rate" not in prompt.text
+    assert "\n  " not in prompt.text
+    assert list(prompt.aliases) == [str(i) for i in range(1, 10)]
+    assert all(len(line) < 320 for line in prompt.text.splitlines())
+    assert prompt.estimated_tokens < prompt.baseline_tokens / 2
+    assert prompt.tokens_saved == prompt.baseline_tokens - prompt.estimated_tokens
+
+
+def test_token_budget_drops_weakest_candidates_but_keeps_top_k():
+    prompt = RerankPromptBuilder(max_prompt_tokens=200).build("payment failed", CANDIDATES, top_k=3)
+
+    assert 3 <= prompt.candidates_sent < len(CANDIDATES)
+    assert prompt.candidates_dropped == len(CANDIDATES) - prompt.candidates_sent
+    assert prompt.aliases["1"] is CANDIDATES[0]
+    assert prompt.estimated_tokens <= 200 or prompt.candidates_sent == 3
+
+
+def test_resolve_maps_aliases_back_and_skips_unknowns():
+    prompt = RerankPromptBuilder().build("payment failed", CANDIDATES[:3], top_k=3)
+
+    rows = prompt.resolve(["3", 1, "9", "3"])
+
+    assert [r["solution_id"] for r in rows] == [CANDIDATES[2]["solution_id"], CANDIDATES[0]["solution_id"]]
+    assert prompt.schema["items"]["enum"] == ["1", "2", "3"]
+
+
+def test_truncate_cuts_on_word_boundary():
+    assert truncate("  a   b  ", 10) == "a b"
+    assert truncate("alpha beta gamma", 12) == "alpha beta…"
+    assert estimate_tokens("abcd" * 10) == 10
+
+
+def test_tokens_saved_is_exported_with_the_span():
+    sink = RecordingSink()
+    tracer = Tracer(sink)
+    with tracer.span("retriever", "t-1") as span:
+        span.tokens_saved = 321
+
+    assert sink.rows[0]["tokens_saved"] == 321
@@ -0,0 +1,175 @@
+import time
+import asyncio
+import threading
+import pytest
+from agents.classifier_agent import TicketClassifierAgent
+from agents.instrumentation import Tracer
+from agents.resilience import (
+    CircuitBreaker, CircuitOpenError, DeadlineExceededError, Resilience, ResilientCall, RetryPolicy
+)
+from agents.knowledge_retriever_agent import KnowledgeRetrieverAgent
+from agents.router_agent import RouterAgent
+from benchmarks.fakes import FakeBigQueryClient, FakeGenerativeModel, FakeResources, LatencyModel
+
+
+class Unavailable(Exception):
+    code = 503
+
+
+class BadRequest(Exception):
+    code = 400
+
+
+def flaky(failures, result="ok", exc=Unavailable):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise exc("boom")
+        return result
+
+    return fn, calls
+
+
+def fast_retry(**kwargs):
+    return RetryPolicy(base_delay_seconds=0.001, max_delay_seconds=0.002, **kwargs)
+
+
+def test_transient_errors_are_retried():
+    caller = ResilientCall("gemini", retry=fast_retry(max_attempts=3))
+    fn, calls = flaky(2)
+
+    assert caller.call(fn) == "ok"
+    assert len(calls) == 3
+    assert caller.stats["retries"] == 2
+    assert caller.stats["successes"] == 1
+
+
+def test_non_transient_errors_are_not_retried():
+    caller = ResilientCall("gemini", retry=fast_retry(max_attempts=3))
+    fn, calls = flaky(1, exc=BadRequest)
+
+    with pytest.raises(BadRequest):
+        caller.call(fn)
+    assert len(calls) == 1
+    assert caller.breaker.state == "closed"
+
+
+def test_retry_stops_at_latency_budget():
+    caller = ResilientCall("gemini", retry=RetryPolicy(max_attempts=10, base_delay_seconds=1.0, budget_seconds=0.0))
+    fn, calls = flaky(5)
+
+    with pytest.raises(Unavailable):
+        caller.call(fn)
+    assert len(calls) == 1
+
+
+def test_breaker_opens_short_circuits_and_recovers():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout_seconds=0.05)
+    caller = ResilientCall("bigquery", retry=fast_retry(max_attempts=1), breaker=breaker)
+    fn, calls = flaky(2)
+
+    for _ in range(2):
+        with pytest.raises(Unavailable):
+            caller.call(fn)
+    with pytest.raises(CircuitOpenError):
+        caller.call(fn)
+    assert len(calls) == 2
+    assert caller.snapshot()["short_circuited"] == 1
+
+    time.sleep(0.06)
+    assert caller.call(fn) == "ok"
+    assert breaker.state == "closed"
+    assert breaker.opened_count == 1
+
+
+def test_deadline_bounds_each_attempt():
+    caller = ResilientCall("bigquery", retry=fast_retry(max_attempts=1), deadline_seconds=0.02)
+
+    with pytest.raises(DeadlineExceededError):
+        caller.call(time.sleep, 0.5)
+    assert caller.stats["timeouts"] == 1
+
+
+def test_hedge_wins_when_primary_is_slow():
+    # The primary is held until the call has returned, so only the hedge can answer
+    release = threading.Event()
+    attempts = []
+
+    def fn():
+        attempts.append(len(attempts))
+        if attempts[-1] == 0:
+            release.wait(5)
+            return "primary"
+        return "hedge"
+
+    caller = ResilientCall("gemini", hedge_after_seconds=0.02, deadline_seconds=5.0)
+    try:
+        assert caller.call(fn) == "hedge"
+    finally:
+        release.set()
+    assert caller.stats["hedges"] == 1
+    assert caller.stats["hedge_wins"] == 1
+
+
+def test_async_calls_retry_and_honor_deadline():
+    attempts = []
+
+    async def fn():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise Unavailable("boom")
+        return "ok"
+
+    async def slow():
+        await asyncio.sleep(0.5)
+
+    caller = ResilientCall("gemini", retry=fast_retry(max_attempts=2), deadline_seconds=0.05)
+    assert asyncio.run(caller.acall(fn)) == "ok"
+    with pytest.raises(DeadlineExceededError):
+        asyncio.run(caller.acall(slow))
+
+
+def test_open_gemini_circuit_uses_local_rule_fallback():
+    resources = FakeResources(model=FakeGenerativeModel(LatencyModel(failure_rate=1.0)))
+    resilience = Resilience(gemini=ResilientCall("gemini", retry=fast_retry(max_attempts=1),
+                                                 breaker=CircuitBreaker(failure_threshold=1)))
+    agent = TicketClassifierAgent("test-project", tracer=Tracer(), resilience=resilience, resources=resources)
+
+    first = agent.classify("Login keeps failing after the refund")
+    second = agent.classify("Invoice charged twice, urgent")
+
+    assert first["classification_path"] == second["classification_path"] == "fallback"
+    assert (second["category"], second["priority"]) == ("billing", "critical")
+    assert resilience.gemini.stats["short_circuited"] == 1
+
+
+def test_router_keeps_last_good_rules_when_reload_fails():
+    client = FakeBigQueryClient(tables={"routing_rules": [
+        {"category": "billing", "priority": "high", "assigned_team": "billing_team", "sla_hours": 8},
+    ]})
+    resilience = Resilience(bigquery=ResilientCall("bigquery", retry=fast_retry(max_attempts=1)))
+    router = RouterAgent("test-project", background_refresh=False, rules_ttl_seconds=0,
+                         tracer=Tracer(), resilience=resilience, resources=FakeResources(bq_client=client))
+
+    assert router.route_ticket("billing", "high")["assigned_team"] == "billing_team"
+    client.latency.failure_rate = 1.0
+    assert router.route_ticket("billing", "high")["assigned_team"] == "billing_team"
+
+
+def test_retrieval_outage_is_not_reported_as_llm(fake_resources):
+    class DownStore:
+        def top_solutions(self, category, limit):
+            raise Unavailable("bigquery down")
+
+    retriever = KnowledgeRetrieverAgent("test-project", tracer=Tracer(), cache_candidates=False, store=DownStore(),
+                                        resources=fake_resources)
+
+    info = retriever.retrieve("I was charged twice", "billing")
+    async_info = asyncio.run(retriever.aretrieve("I was charged twice", "billing"))
+
+    for result in (info, async_info):
+        assert result["solutions"] == []
+        assert (result["retrieval_path"], result["llm_called"]) == ("fallback", False)
+    assert retriever.rerank_stats["llm_calls"] == 0
@@ -0,0 +1,38 @@
+import google.generativeai as genai
+import agents.resources as resources_module
+from agents.resources import SharedResources, get_shared_resources
+from agents.classifier_agent import TicketClassifierAgent
+from agents.knowledge_retriever_agent import KnowledgeRetrieverAgent
+from agents.router_agent import RouterAgent
+
+
+class FakeModel:
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+
+def test_clients_are_created_lazily_and_shared(monkeypatch):
+    built = []
+    monkeypatch.setattr(SharedResources, "_build_bq_client", lambda self: built.append(1) or object())
+    monkeypatch.setattr(genai, "GenerativeModel", FakeModel)
+    configured = []
+    monkeypatch.setattr(genai, "configure", lambda api_key: configured.append(api_key))
+    monkeypatch.setattr(resources_module, "_configured_api_key", None)
+
+    resources = SharedResources("test-project", api_key="key")
+    classifier = TicketClassifierAgent("test-project", resources=resources)
+    retriever = KnowledgeRetrieverAgent("test-project", resources=resources)
+    router = RouterAgent("test-project", resources=resources)
+    assert built == []
+
+    assert classifier.bq_client is retriever.bq_client is router.bq_client
+    assert classifier.model is retriever.model
+    assert built == [1]
+    assert configured == ["key"]
+    assert set(resources.init_timings_ms) == {"bq_client", "model"}
+
+
+def test_shared_resources_are_reused_per_settings():
+    first = get_shared_resources("reuse-project", api_key="a")
+    assert get_shared_resources("reuse-project", api_key="a") is first
+    assert get_shared_resources("reuse-project", api_key="b") is not first
@@ -0,0 +1,46 @@
+import time
+import pytest
+from agents.router_agent import RouterAgent
+from benchmarks.fakes import FakeBigQueryClient
+
+RULES = [
+    {"category": "billing", "priority": "critical", "assigned_team": "billing_team", "sla_hours": 2},
+    {"category": "billing", "priority": "low", "assigned_team": "billing_team", "sla_hours": 48},
+]
+
+
+@pytest.fixture
+def fake_bq():
+    return FakeBigQueryClient(tables={"routing_rules": RULES})
+
+
+def test_rules_are_loaded_once(fake_bq, fake_resources):
+    router = RouterAgent("test-project", background_refresh=False, resources=fake_resources)
+    for _ in range(5):
+        result = router.route_ticket("billing", "critical")
+    assert result["assigned_team"] == "billing_team"
+    assert result["sla_hours"] == 2
+    assert fake_bq.calls.counts["query"] == 1
+
+
+def test_missing_rule_falls_back_to_general_support(fake_resources):
+    router = RouterAgent("test-project", background_refresh=False, resources=fake_resources)
+    result = router.route_ticket("account", "high")
+    assert result["assigned_team"] == "general_support"
+    assert result["sla_hours"] == 24
+
+
+def test_invalidate_triggers_background_reload(fake_bq, fake_resources):
+    router = RouterAgent("test-project", rules_ttl_seconds=60, resources=fake_resources)
+    router.route_ticket("billing", "low")
+    fake_bq.tables["routing_rules"] = RULES + [
+        {"category": "account", "priority": "high", "assigned_team": "account_management", "sla_hours": 8},
+    ]
+    router.invalidate_rules()
+    deadline = time.time() + 2
+    result = router.route_ticket("account", "high")
+    while result["assigned_team"] == "general_support" and time.time() < deadline:
+        time.sleep(0.01)
+        result = router.route_ticket("account", "high")
+    assert result["assigned_team"] == "account_management"
+    assert fake_bq.calls.counts["query"] == 2
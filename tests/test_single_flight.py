@@ -0,0 +1,127 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from agents.single_flight import SingleFlight
+from agents.classifier_agent import TicketClassifierAgent
+from agents.instrumentation import Tracer
+from benchmarks.fakes import FakeGenerativeModel, FakeResources, RecordingSink
+
+
+def test_concurrent_callers_share_one_execution():
+    group = SingleFlight("test")
+    executions = []
+    # Nobody runs until all 8 callers have joined, so the leader is still in flight for every follower
+    joined = threading.Barrier(8, timeout=5)
+
+    def slow(value):
+        executions.append(value)
+        return {"value": value}
+
+    def call(_):
+        flight = group.join("key")
+        joined.wait()
+        return flight.run(slow, 1)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(call, range(8)))
+
+    assert executions == [1]
+    assert all(result is results[0] for result in results)
+    assert group.snapshot() == {"calls": 8, "executions": 1, "collapsed": 7, "in_flight": 0, "collapse_rate": 0.875}
+
+    # Finished calls are not cached
+    group.do("key", slow, 2)
+    assert executions == [1, 2]
+
+
+def test_exceptions_are_shared_and_flight_reports_role():
+    group = SingleFlight("test")
+    flights = [group.join("key"), group.join("key")]
+    errors = []
+
+    def failing():
+        raise RuntimeError("boom")
+
+    def call(flight):
+        try:
+            flight.run(failing)
+        except RuntimeError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call, args=(flight,)) for flight in reversed(flights)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [flight.shared for flight in flights] == [False, True]
+    assert len(errors) == 2 and errors[0] is errors[1]
+
+
+def test_async_callers_share_one_task_and_survive_a_cancelled_leader():
+    group = SingleFlight("test")
+    calls = []
+
+    async def main():
+        release = asyncio.Event()
+
+        async def slow():
+            calls.append(1)
+            await release.wait()
+            return "done"
+
+        leader = asyncio.ensure_future(group.ado("key", slow))
+        await asyncio.sleep(0)
+        followers = [asyncio.ensure_future(group.ado("key", slow)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        release.set()
+        return await asyncio.gather(*followers)
+
+    assert asyncio.run(main()) == ["done"] * 3
+    assert calls == [1]
+
+
+class GatedModel(FakeGenerativeModel):
+    """
+    Holds every call until `ready()` is true, so tickets sent together are all in flight first.
+    """
+
+    def __init__(self, ready):
+        super().__init__()
+        self.ready = ready
+
+    def generate_content(self, prompt, **kwargs):
+        deadline = time.monotonic() + 5
+        while not self.ready() and time.monotonic() < deadline:
+            time.sleep(0.001)
+        return super().generate_content(prompt, **kwargs)
+
+    async def generate_content_async(self, prompt, **kwargs):
+        deadline = time.monotonic() + 5
+        while not self.ready() and time.monotonic() < deadline:
+            await asyncio.sleep(0.001)
+        return await super().generate_content_async(prompt, **kwargs)
+
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_identical_tickets_share_one_gemini_call(mode):
+    tickets = ["Checkout is failing, something is wrong?", "checkout is failing something is wrong"] * 3
+    model = GatedModel(lambda: agent.inflight.snapshot()["calls"] == len(tickets))
+    sink = RecordingSink()
+    agent = TicketClassifierAgent("test-project", tracer=Tracer(sink), resources=FakeResources(model=model))
+
+    if mode == "sync":
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            results = list(pool.map(agent.classify, tickets))
+    else:
+        async def main():
+            return await asyncio.gather(*(agent.aclassify(ticket) for ticket in tickets))
+        results = asyncio.run(main())
+
+    assert model.calls.counts["classify"] == 1
+    assert len({(r["category"], r["priority"]) for r in results}) == 1
+    assert agent.inflight.stats["collapsed"] == 5
+    # Only the leader's span is charged for the tokens
+    assert sum(1 for row in sink.rows if row["token_count"]) == 1
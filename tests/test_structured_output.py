@@ -0,0 +1,185 @@
+import json
+import asyncio
+import pytest
+from agents.cache import InMemoryCacheBackend
+from agents.classifier_agent import TicketClassifierAgent, CLASSIFICATION_SCHEMA
+from agents.instrumentation import Tracer
+from agents.knowledge_retriever_agent import KnowledgeRetrieverAgent
+from agents.structured_output import StructuredOutput, StructuredOutputError, extract_json, string_fields, validate
+from benchmarks.fakes import FakeBigQueryClient, FakeGenerativeModel, FakeResources, FakeResponse
+
+
+class ScriptedModel(FakeGenerativeModel):
+    """
+    Returns the scripted responses in order and records every prompt, config and stream.
+    """
+
+    def __init__(self, *texts):
+        super().__init__(chunk_chars=8)
+        self.texts = list(texts)
+        self.prompts = []
+        self.configs = []
+        self.responses = []
+        self.streams = []
+
+    def _respond(self, prompt):
+        self.prompts.append(prompt)
+        self.responses.append(FakeResponse(prompt, self.texts.pop(0)))
+        return self.responses[-1]
+
+    def generate_content(self, prompt, generation_config=None, stream=False, **kwargs):
+        self.configs.append(generation_config)
+        response = super().generate_content(prompt, stream=stream, **kwargs)
+        if stream:
+            self.streams.append(response)
+        return response
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False, **kwargs):
+        self.configs.append(generation_config)
+        response = await super().generate_content_async(prompt, stream=stream, **kwargs)
+        if stream:
+            self.streams.append(response)
+        return response
+
+    def tokens(self):
+        return sum(response.usage_metadata.total_token_count for response in self.responses)
+
+
+def test_extract_json_tolerates_fences_prose_and_trailing_commas():
+    assert extract_json('Sure:\n```json\n{"a": 1}\n```') == {"a": 1}
+    assert extract_json('ids are ["x", "y",] ok', list) == ["x", "y"]
+    assert extract_json('see [1] then {"a": 2}', dict) == {"a": 2}
+    with pytest.raises(StructuredOutputError):
+        extract_json("no json here")
+
+
+def test_validate_reports_enum_and_missing_fields():
+    errors = validate({"category": "shipping"}, CLASSIFICATION_SCHEMA)
+    assert any("category" in e and "not one of" in e for e in errors)
+    assert any("priority" in e and "missing" in e for e in errors)
+    assert validate({"category": "billing", "priority": "low"}, CLASSIFICATION_SCHEMA) == []
+
+
+def test_invalid_response_gets_one_short_repair_call():
+    model = ScriptedModel(
+        '{"category": "shipping", "priority": "low"}',
+        '{"category": "billing", "priority": "low"}',
+    )
+    output = StructuredOutput(CLASSIFICATION_SCHEMA)
+
+    value, tokens = output.generate(model, "classify this long prompt")
+
+    assert value["category"] == "billing"
+    assert tokens == model.tokens()
+    assert "classify this long prompt" not in model.prompts[1]
+    assert "shipping" in model.prompts[1]
+    assert model.configs[0]["response_mime_type"] == "application/json"
+    assert model.configs[0]["response_schema"] is CLASSIFICATION_SCHEMA
+    assert output.stats == {"calls": 1, "parsed": 0, "repaired": 1, "failed": 0, "repair_calls": 1}
+
+
+def test_failed_repair_raises_with_spent_tokens():
+    output = StructuredOutput(CLASSIFICATION_SCHEMA)
+    model = ScriptedModel("nope", "still nope")
+    with pytest.raises(StructuredOutputError) as exc_info:
+        output.generate(model, "prompt")
+    assert exc_info.value.token_count == model.tokens()
+    assert output.stats["failed"] == 1
+
+
+def test_string_fields_only_returns_completed_values():
+    partial = '```json\n{"category": "bill\\"ing", "priority": "hi'
+    assert string_fields(partial, ["category", "priority"]) == {"category": 'bill"ing'}
+
+
+def test_stream_stops_reading_once_early_fields_are_in():
+    model = ScriptedModel('{"category": "billing", "priority": "high", "reasoning": "' + "x" * 400 + '"}')
+    output = StructuredOutput(CLASSIFICATION_SCHEMA)
+
+    value, tokens, complete = output.stream(model, "prompt", ["category", "priority"])
+
+    assert (value, complete) == ({"category": "billing", "priority": "high"}, False)
+    assert model.streams[0].consumed < len(model.streams[0].chunks) // 4
+    assert model.streams[0].cancelled
+    assert tokens > 0
+
+
+def test_async_stream_is_cancelled_and_read_under_the_limiter():
+    model = ScriptedModel('{"category": "billing", "priority": "high", "reasoning": "' + "x" * 400 + '"}')
+    output = StructuredOutput(CLASSIFICATION_SCHEMA)
+    read_before_release = []
+
+    async def call(fn, *args, **kwargs):
+        result = await fn(*args, **kwargs)
+        read_before_release.append(model.streams[0].consumed)
+        return result
+
+    value, _, complete = asyncio.run(output.astream(call, model, "prompt", ["category", "priority"]))
+
+    assert (value, complete) == ({"category": "billing", "priority": "high"}, False)
+    assert read_before_release[0] == model.streams[0].consumed > 0
+    assert model.streams[0].cancelled
+
+
+def test_stream_falls_back_to_full_parse_and_repair():
+    model = ScriptedModel(
+        '{"category": "shipping", "priority": "low", "reasoning": "r"}',
+        '{"category": "billing", "priority": "low"}',
+    )
+    output = StructuredOutput(CLASSIFICATION_SCHEMA)
+
+    value, _, complete = output.stream(model, "prompt", ["category", "priority"])
+
+    assert (value["category"], complete) == ("billing", True)
+    assert model.streams[0].consumed == len(model.streams[0].chunks)
+    assert output.stats["repaired"] == 1
+
+
+def test_streaming_classifier_skips_reasoning(fake_resources):
+    agent = TicketClassifierAgent("test-project", tracer=Tracer(), stream=True, resources=fake_resources)
+
+    result = agent.classify("I was charged twice for my subscription")
+    async_result = asyncio.run(agent.aclassify("Production is down for all users"))
+
+    assert (result["category"], result["reasoning"], result["classification_path"]) == ("billing", "", "llm")
+    assert (async_result["category"], async_result["priority"]) == ("technical", "critical")
+
+
+def test_streamed_results_are_not_served_to_full_classifiers(fake_resources):
+    backend = InMemoryCacheBackend()
+    streamed = TicketClassifierAgent("test-project", tracer=Tracer(), stream=True, resources=fake_resources)
+    full = TicketClassifierAgent("test-project", tracer=Tracer(), resources=fake_resources)
+    streamed.cache = streamed.build_cache(backend=backend)
+    full.cache = full.build_cache(backend=backend)
+
+    streamed.classify("I was charged twice for my subscription")
+    result = full.classify("I was charged twice for my subscription")
+
+    assert result["classification_path"] == "llm" and result["reasoning"]
+    assert streamed.classify("I was charged twice for my subscription")["classification_path"] == "cache"
+
+
+def test_classifier_repairs_instead_of_falling_back():
+    model = ScriptedModel("I think it's billing.", '{"category": "billing", "priority": "high", "reasoning": "r"}')
+    agent = TicketClassifierAgent("test-project", tracer=Tracer(), resources=FakeResources(model=model))
+
+    result = agent.classify("Charged twice")
+
+    assert (result["category"], result["priority"], result["classification_path"]) == ("billing", "high", "llm")
+    assert len(model.prompts) == 2
+
+
+def test_unusable_rerank_keeps_lexical_order():
+    candidates = [
+        {"solution_id": "s1", "category": "billing", "problem_description": "promo code", "solution_text": "a", "success_rate": 0.9},
+        {"solution_id": "s2", "category": "billing", "problem_description": "invoice", "solution_text": "b", "success_rate": 0.8},
+    ]
+    model = ScriptedModel(json.dumps(["unknown"]), "garbage")
+    resources = FakeResources(model=model, bq_client=FakeBigQueryClient(tables={"knowledge_base": candidates}))
+    retriever = KnowledgeRetrieverAgent("test-project", tracer=Tracer(), resources=resources)
+
+    info = retriever.retrieve("something is wrong", "billing", top_k=2)
+
+    assert info["retrieval_path"] == "lexical_fallback"
+    assert [s["solution_id"] for s in info["solutions"]] == ["s1", "s2"]
+    assert info["llm_tokens"] == model.tokens()
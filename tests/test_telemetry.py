@@ -0,0 +1,56 @@
+import time
+import threading
+from agents.telemetry import TelemetrySink
+from benchmarks.fakes import FakeBigQueryClient
+
+
+def test_rows_are_batched_by_size():
+    client = FakeBigQueryClient()
+    sink = TelemetrySink(client, "p.d.agent_telemetry", batch_size=50, flush_interval_seconds=5)
+    for i in range(120):
+        sink.emit({"run_id": str(i)})
+    sink.close()
+    assert sum(len(batch) for batch in client.insert_batches) == 120
+    assert max(len(batch) for batch in client.insert_batches) <= 50
+    assert len(client.insert_batches) < 10
+    assert sink.stats["flushed_rows"] == 120
+
+
+def test_rows_are_flushed_on_interval():
+    client = FakeBigQueryClient()
+    sink = TelemetrySink(client, "p.d.agent_telemetry", flush_interval_seconds=0.05)
+    sink.emit({"run_id": "1"})
+    deadline = time.time() + 2
+    while not client.insert_batches and time.time() < deadline:
+        time.sleep(0.01)
+    assert client.insert_batches == [[{"run_id": "1"}]]
+    sink.close()
+
+
+class StalledClient(FakeBigQueryClient):
+    """
+    Blocks every insert until `release` is set, so the flusher stops draining the queue.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.stalled = threading.Event()
+        self.release = threading.Event()
+
+    def insert_rows_json(self, table_id, rows, **kwargs):
+        self.stalled.set()
+        self.release.wait(5)
+        return super().insert_rows_json(table_id, rows, **kwargs)
+
+
+def test_full_queue_drops_instead_of_blocking():
+    client = StalledClient()
+    sink = TelemetrySink(client, "p.d.agent_telemetry", max_queue_size=5, batch_size=5, flush_interval_seconds=0.01)
+    first = [sink.emit({"run_id": str(i)}) for i in range(5)]
+    assert client.stalled.wait(5)
+
+    accepted = first + [sink.emit({"run_id": str(i)}) for i in range(5, 50)]
+    assert accepted.count(False) == sink.stats["dropped"] >= 40
+    client.release.set()
+    sink.close()
+    assert sink.stats["flushed_rows"] + sink.stats["dropped"] == 50
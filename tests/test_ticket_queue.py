@@ -0,0 +1,161 @@
+import time
+import threading
+import pytest
+from agents.fast_path import RuleBasedClassifier
+from agents.ticket_queue import (
+    TicketQueue, InMemoryQueueBackend, SQLiteQueueBackend, QueueFullError, CallbackNotAllowedError
+)
+
+
+class FakeClassifier:
+    def __init__(self):
+        self.fast_path = RuleBasedClassifier()
+
+
+class FakeCoordinator:
+    def __init__(self, gate=None):
+        self.classifier = FakeClassifier()
+        self.gate = gate
+        self.processed = []
+
+    def process_ticket(self, ticket_description, ticket_id=None):
+        if self.gate:
+            self.gate.wait(5)
+        if ticket_description == "boom":
+            raise RuntimeError("agent failure")
+        self.processed.append(ticket_id)
+        return {"ticket_id": ticket_id, "status": "processed"}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return InMemoryQueueBackend()
+    return SQLiteQueueBackend(str(tmp_path / "queue.db"))
+
+
+def wait_for(queue, ticket_id, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(ticket_id)
+        if job["status"] in ("done", "error"):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"{ticket_id} did not finish")
+
+
+def test_enqueue_returns_immediately_and_workers_drain(backend):
+    queue = TicketQueue(FakeCoordinator(), backend=backend, workers=2, poll_interval_seconds=0.01)
+    queue.start()
+    try:
+        job = queue.enqueue("I was charged twice", ticket_id="t1")
+        assert job["status"] == "queued"
+        done = wait_for(queue, "t1")
+        assert done["result"] == {"ticket_id": "t1", "status": "processed"}
+        failed = wait_for(queue, queue.enqueue("boom", ticket_id="t2")["ticket_id"])
+        assert failed["status"] == "error" and failed["error"] == "agent failure"
+    finally:
+        queue.stop()
+    assert queue.stats["processed"] == 1 and queue.stats["failed"] == 1
+
+
+def test_critical_lane_skips_ahead(backend):
+    coordinator = FakeCoordinator()
+    queue = TicketQueue(coordinator, backend=backend, workers=1)
+    queue.enqueue("please add dark mode", ticket_id="low", priority="low")
+    queue.enqueue("how do I export a report", ticket_id="normal")
+    # No hint: the rule guess puts an outage in the critical lane
+    queue.enqueue("Production is down, total outage for all users", ticket_id="urgent")
+    assert queue.get("urgent")["priority"] == "critical"
+    assert queue.snapshot()["depth_by_lane"] == {"critical": 1, "high": 0, "medium": 1, "low": 1}
+
+    order = [backend.claim()["ticket_id"] for _ in range(3)]
+    assert order == ["urgent", "normal", "low"]
+    assert backend.claim() is None
+
+
+def test_full_queue_rejects_and_duplicate_ids_are_idempotent(backend):
+    queue = TicketQueue(FakeCoordinator(), backend=backend, max_depth=2)
+    queue.enqueue("one", ticket_id="a")
+    queue.enqueue("two", ticket_id="b")
+    assert queue.enqueue("one again", ticket_id="a")["description"] == "one"
+    with pytest.raises(QueueFullError):
+        queue.enqueue("three", ticket_id="c")
+    assert queue.stats == {**queue.stats, "enqueued": 2, "rejected": 1}
+
+
+def test_concurrent_duplicate_enqueues_store_one_ticket(backend):
+    queue = TicketQueue(FakeCoordinator(), backend=backend)
+    barrier = threading.Barrier(8)
+    records = []
+
+    def submit(index):
+        barrier.wait()
+        records.append(queue.enqueue(f"charged twice {index}", ticket_id="dup"))
+
+    threads = [threading.Thread(target=submit, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({record["description"] for record in records}) == 1
+    assert queue.stats["enqueued"] == 1 and backend.depth() == 1
+    assert backend.claim()["ticket_id"] == "dup" and backend.claim() is None
+
+
+def test_finished_jobs_beyond_retention_are_forgotten():
+    backend = InMemoryQueueBackend(max_finished=2)
+    queue = TicketQueue(FakeCoordinator(), backend=backend)
+    for ticket_id in ("a", "b", "c"):
+        queue.enqueue("charged twice", ticket_id=ticket_id)
+        backend.finish(backend.claim()["ticket_id"], "done")
+    assert queue.get("a") is None
+    assert queue.get("b")["status"] == "done" and queue.get("c")["status"] == "done"
+
+
+def test_callbacks_are_refused_unless_the_host_is_allowed():
+    queue = TicketQueue(FakeCoordinator())
+    for url in ("http://169.254.169.254/latest/meta-data", "http://localhost:8080/hook", "file:///etc/passwd"):
+        with pytest.raises(CallbackNotAllowedError):
+            queue.enqueue("charged twice", callback_url=url)
+
+    allowed = TicketQueue(FakeCoordinator(), callback_hosts=["Example.com"])
+    assert allowed.enqueue("charged twice", callback_url="https://example.com/hook")["status"] == "queued"
+    with pytest.raises(CallbackNotAllowedError):
+        allowed.enqueue("charged twice", callback_url="http://10.0.0.5/hook")
+
+
+def test_callback_receives_finished_record():
+    received = []
+    queue = TicketQueue(FakeCoordinator(), workers=1, poll_interval_seconds=0.01, callback_hosts=["example.com"],
+                        post_callback=lambda url, payload: received.append((url, payload)))
+    queue.start()
+    try:
+        queue.enqueue("charged twice", ticket_id="cb", callback_url="https://example.com/hook")
+        wait_for(queue, "cb")
+        deadline = time.monotonic() + 5
+        while not received and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        queue.stop()
+    url, payload = received[0]
+    assert url == "https://example.com/hook"
+    assert payload["status"] == "done" and payload["result"]["ticket_id"] == "cb"
+
+
+def test_sqlite_queue_recovers_tickets_claimed_by_a_dead_worker(tmp_path):
+    path = str(tmp_path / "queue.db")
+    first = SQLiteQueueBackend(path)
+    TicketQueue(FakeCoordinator(), backend=first).enqueue("charged twice", ticket_id="orphan")
+    assert first.claim()["ticket_id"] == "orphan"
+
+    gate = threading.Event()
+    queue = TicketQueue(FakeCoordinator(gate), backend=SQLiteQueueBackend(path), workers=1,
+                        poll_interval_seconds=0.01)
+    queue.start()
+    gate.set()
+    try:
+        assert wait_for(queue, "orphan")["status"] == "done"
+    finally:
+        queue.stop()